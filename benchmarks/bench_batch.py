@@ -0,0 +1,73 @@
+"""Compare N single-clip jobs with one N-clip batch job on a mock ComfyUI.
+
+Both runs use one worker against a mock that keeps loaded models between
+prompts and charges for the first load, and both use the same clips: one
+prompt per shot, with video_index set to the clip's position. The single jobs
+run one after another, as a client splitting a sequence submits them. The batch queues
+each clip's prompt right behind the previous one, so reading and encoding a
+finished clip overlaps the next clip's generation. Checks that the batch
+returns every clip in order, with a preview for clip 0 only, even though the
+clips carry a stale video_index of their own, as when a client reuses single
+job inputs.
+
+    python -m benchmarks.bench_batch [--clips 4] [--speed 0.01] [--video-mb 24]
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+
+PROMPT = "a red panda on a bamboo stick"
+CLIP = {"prompt": PROMPT, "target_width": 960, "target_height": 544, "num_frames": 49, "num_inference_steps": 15,
+        "result_cache": "bypass"}
+
+
+def run(args, name, batch):
+    output_dir = tempfile.mkdtemp(prefix=f"bench-batch-{name}-")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, cache_models=True,
+                             video_bytes=int(args.video_mb * 1024 * 1024)).start()
+    worker = load_handler(server.address, output_dir, f"bench_batch_{name}")
+    # Models load once per worker either way; keep that out of the comparison
+    worker({"id": "warm", "input": dict(CLIP, video_index=1)})
+    prompts_before = server.comfy.prompt_number
+    busy_before = server.comfy.busy_seconds
+    clips = [{"prompt": f"{PROMPT}, shot {i + 1}", "video_index": i + 1} for i in range(args.clips)]
+    start = time.perf_counter()
+    if batch:
+        output = worker({"id": "batch", "input": dict(CLIP, clips=clips)})
+        if "error" in output:
+            raise SystemExit(f"batch failed: {output['error']}")
+        outputs = output["clips"]
+    else:
+        outputs = [worker({"id": f"single-{i}", "input": {**CLIP, **clip, "video_index": i}})
+                   for i, clip in enumerate(clips)]
+    elapsed = time.perf_counter() - start
+    busy = server.comfy.busy_seconds - busy_before
+    server.stop()
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    failed = [i for i, output in enumerate(outputs) if "error" in output]
+    previews = [i for i, output in enumerate(outputs) if "base64_preview" in output]
+    if failed or previews != [0] or server.comfy.prompt_number - prompts_before != args.clips:
+        raise SystemExit(f"{name}: failed clips {failed}, previews for {previews}")
+    return elapsed, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=0.01, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--video-mb", type=float, default=24.0, help="Size of each mock video")
+    args = parser.parse_args()
+
+    single, single_busy = run(args, "single", batch=False)
+    batch, batch_busy = run(args, "batch", batch=True)
+    print(f"{args.clips} single jobs: {single:6.2f}s, ComfyUI busy {single_busy / single:5.1%}")
+    print(f"1 batch job:   {batch:6.2f}s, ComfyUI busy {batch_busy / batch:5.1%} ({1 - batch / single:.0%} faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Check that timed-out and cancelled jobs free the GPU right away.
+
+Runs against a mock ComfyUI where a job's sampler takes --steps steps, long
+enough that letting it finish would waste most of its run:
+
+- timeout: a job with an execution_timeout well below its run time
+- client gone: a streaming job whose generator is closed after the first
+  sampler progress message, as when RunPod stops consuming it
+- pending: with two jobs in flight, the second is cancelled while its prompt
+  is still queued behind the first; the first must not be interrupted
+- coalesced: with the result cache on, a job waiting for an identical job's
+  entry is cancelled; it must return without waiting for that entry
+- runpod stop: the handler the worker registers with RunPod, with default
+  settings, runs under the SDK's run_job and its task is cancelled, as RunPod
+  does on /cancel
+
+For each, reports how long the GPU stayed busy after the job gave up, and
+checks the job's status and that it left no files behind.
+
+    python -m benchmarks.bench_cancel [--speed 0.05] [--steps 50] [--timeout 2]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from runpod.serverless.modules.rp_job import run_job
+
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from result_cache import LOCK_POLL_INTERVAL_S, ResultCache
+
+JOB = {"prompt": "a red panda", "target_width": 512, "target_height": 288, "num_frames": 17,
+       "result_cache": "bypass"}
+
+
+def gpu_idle_after(comfy, since, limit=30.0):
+    """Seconds from since until the mock has nothing running or pending"""
+    while time.monotonic() - since < limit:
+        state = comfy.queue_state()
+        if not state["queue_running"] and not state["queue_pending"]:
+            return time.monotonic() - since
+        time.sleep(0.01)
+    return float("inf")
+
+
+def check_timeout(args, worker, comfy):
+    start = time.monotonic()
+    output = worker.handler({"id": "timeout", "input": dict(JOB, num_inference_steps=args.steps,
+                                                            execution_timeout=args.timeout)})
+    returned = time.monotonic()
+    idle = gpu_idle_after(comfy, returned)
+    print(f"  timeout:     returned after {returned - start:5.2f}s, GPU idle {idle:5.2f}s later")
+    if output.get("status") != "timeout":
+        return [f"timeout job returned {output}"]
+    return []
+
+
+def check_client_gone(args, worker, comfy):
+    messages = worker.stream_handler({"id": "client-gone", "input": dict(JOB, num_inference_steps=args.steps)})
+    for message in messages:
+        if message.get("stage") == "sampler":
+            break
+    closed = time.monotonic()
+    messages.close()
+    idle = gpu_idle_after(comfy, closed)
+    print(f"  client gone: GPU idle {idle:5.2f}s after the stream was closed")
+    return [] if idle < 2.0 else [f"GPU still busy {idle:.2f}s after the stream was closed"]
+
+
+def check_pending(args, worker, comfy):
+    outputs = {}
+
+    def run(job_id, steps):
+        outputs[job_id] = worker.handler({"id": job_id, "input": dict(JOB, num_inference_steps=steps)})
+
+    interrupts = comfy.interrupts
+    first = threading.Thread(target=run, args=("first", 15))
+    first.start()
+    while not comfy.queue_state()["queue_running"]:
+        time.sleep(0.01)
+    second = threading.Thread(target=run, args=("second", args.steps))
+    second.start()
+    while not comfy.queue_state()["queue_pending"]:
+        time.sleep(0.01)
+    cancelled = time.monotonic()
+    worker.cancel_job("second")
+    second.join()
+    returned = time.monotonic() - cancelled
+    first.join()
+    print(f"  pending:     cancelled job returned after {returned:5.2f}s, first job {'ok' if 'error' not in outputs['first'] else 'FAILED'}")
+    failures = []
+    if outputs["second"].get("status") != "cancelled":
+        failures.append(f"cancelled job returned {outputs['second']}")
+    if "error" in outputs["first"] or comfy.interrupts != interrupts:
+        failures.append(f"cancelling a queued job disturbed the running one: {outputs['first']}")
+    return failures
+
+
+def check_coalesced(args, worker, comfy, cache_dir):
+    outputs = {}
+
+    def run(job_id):
+        outputs[job_id] = worker.handler({"id": job_id, "input": dict(JOB, num_inference_steps=args.steps,
+                                                                      result_cache="use")})
+
+    worker.RESULT_CACHE = ResultCache(cache_dir)
+    try:
+        leader = threading.Thread(target=run, args=("leader",))
+        leader.start()
+        while not comfy.queue_state()["queue_running"]:
+            time.sleep(0.01)
+        follower = threading.Thread(target=run, args=("follower",))
+        follower.start()
+        # Long enough for the follower to find the leader's lock and start waiting on it
+        time.sleep(LOCK_POLL_INTERVAL_S * 2)
+        cancelled = time.monotonic()
+        worker.cancel_job("follower")
+        follower.join()
+        returned = time.monotonic() - cancelled
+        worker.cancel_job("leader")
+        leader.join()
+    finally:
+        worker.RESULT_CACHE = None
+    print(f"  coalesced:   cancelled job returned after {returned:5.2f}s")
+    failures = []
+    if outputs["follower"].get("status") != "cancelled":
+        failures.append(f"cancelled coalesced job was not cancelled: {outputs['follower'].get('error', 'it returned a video')}")
+    if returned > LOCK_POLL_INTERVAL_S * 2:
+        failures.append(f"cancelled coalesced job took {returned:.2f}s to return")
+    return failures
+
+
+def check_runpod_stop(args, worker, comfy):
+    config = worker.serverless_config()
+
+    async def stop():
+        task = asyncio.ensure_future(run_job(config["handler"], {
+            "id": "stopped", "input": dict(JOB, num_inference_steps=args.steps)}))
+        while not comfy.queue_state()["queue_running"]:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return time.monotonic()
+
+    stopped = asyncio.run(stop())
+    idle = gpu_idle_after(comfy, stopped)
+    print(f"  runpod stop: GPU idle {idle:5.2f}s after the task was cancelled")
+    return [] if idle < 2.0 else [f"GPU still busy {idle:.2f}s after RunPod stopped the job"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--speed", type=float, default=0.05, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--steps", type=int, default=50, help="Sampler steps of the long jobs")
+    parser.add_argument("--timeout", type=float, default=2.0, help="execution_timeout of the timeout job")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-cancel-")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, cache_models=True).start()
+    try:
+        worker = load_handler(server.address, output_dir, "bench_cancel", entry=None, env={"MAX_CONCURRENCY": "2"})
+        # Load the models first so every check starts with a warm worker
+        worker.handler({"id": "warm", "input": dict(JOB, num_inference_steps=1)})
+        print(f"long jobs: {args.steps} sampler steps of {4.0 * args.speed:.2f}s")
+        files = set(os.listdir(output_dir))
+        failures = check_timeout(args, worker, server.comfy)
+        failures += check_client_gone(args, worker, server.comfy)
+        failures += check_pending(args, worker, server.comfy)
+        failures += check_coalesced(args, worker, server.comfy, os.path.join(output_dir, "cache"))
+        failures += check_runpod_stop(args, worker, server.comfy)
+        # Only the first job of the pending check finishes and writes a video and preview
+        leftover = set(os.listdir(output_dir)) - files - {"cache"}
+        if len(leftover) > 2:
+            failures.append(f"cancelled jobs left files behind: {sorted(leftover)}")
+    finally:
+        server.stop()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    if failures:
+        raise SystemExit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
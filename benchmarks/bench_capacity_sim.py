@@ -0,0 +1,136 @@
+"""Check the capacity simulator against measured jobs and queueing theory.
+
+Calibration: the real handler runs a grid of sizes against a mock ComfyUI
+whose node times scale with the workload, writing the same timing records a
+worker does. The simulator is calibrated from half of them and predicts the
+execution time of the other half. The mock reports a small GPU, so that the
+longer clips are cut to fit it; the simulator has to plan every job's frame
+count as the handler did.
+
+Queueing: one always-up worker with identical jobs arriving as a Poisson
+process is an M/D/1 queue, whose mean wait is rho * S / (2 * (1 - rho)).
+The simulated mean queue latency has to match it.
+
+Cold starts: with arrivals further apart than the idle timeout, every job
+boots a worker and waits exactly its cold start.
+
+Also reports how long simulating --jobs jobs takes.
+
+    python -m benchmarks.bench_capacity_sim [--speed 0.02] [--jobs 100000]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import stage_timings
+from capacity_sim import Calibration, job_settings, make_jobs, poisson_arrivals, simulate
+from memory_model import frame_limit
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from stage_timings import BOOT_EVENT, read_records
+
+SIZES = ((848, 480), (960, 544), (1280, 720))
+FRAME_COUNTS = (33, 49, 73, 129)
+STEPS = (10, 20)
+# Small enough that the longer clips are cut to what fits
+MOCK_VRAM_GB = 18.0
+
+
+def record_jobs(args, output_dir):
+    """Run the grid through the handler; returns the job inputs, the timing log and the handler's frame limit"""
+    log_path = os.path.join(output_dir, "timings.jsonl")
+    stage_timings.TIMINGS_LOG_PATH = log_path
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, scale_workload=True, vram_gb=MOCK_VRAM_GB).start()
+    try:
+        worker = load_handler(server.address, output_dir, "bench_capacity_sim", entry=None)
+        worker.warm_up()
+        inputs = [{"prompt": f"clip {i}", "target_width": width, "target_height": height, "num_frames": frames,
+                   "num_inference_steps": steps, "video_index": 1, "result_cache": "bypass"}
+                  for i, ((width, height), frames, steps) in enumerate(
+                      (size, frames, steps) for size in SIZES for frames in FRAME_COUNTS for steps in STEPS)]
+        for i, job_input in enumerate(inputs):
+            output = worker.handler({"id": f"job-{i}", "input": job_input})
+            if "error" in output:
+                raise SystemExit(f"Job failed: {output['error']}")
+        limit = frame_limit(worker.PROFILES[-1][1], worker.job_vram_budget(), worker.MAX_GENERATION_FRAMES)
+    finally:
+        server.stop()
+        stage_timings.TIMINGS_LOG_PATH = None
+    return inputs, log_path, limit
+
+
+def check_calibration(args, output_dir):
+    inputs, log_path, limit = record_jobs(args, output_dir)
+    records = list(read_records([log_path]))
+    calibration = Calibration.from_records(records[::2], read_records([log_path], BOOT_EVENT))
+    held_out = list(zip(inputs, records))[1::2]
+    # Far apart, on an always-up worker, so each job's simulated execution is its own
+    jobs = make_jobs([i * 1000.0 for i in range(len(held_out))], [job_input for job_input, _ in held_out],
+                     calibration, bandwidth_mbps=1e9, frame_limit=limit)
+    errors = [abs(job.execution - record["timings"]["total_s"]) / record["timings"]["total_s"]
+              for job, (_, record) in zip(jobs, held_out)]
+    planned = [job_settings(job_input, frame_limit=limit)["num_frames"] == record["timings"]["settings"]["num_frames"]
+               for job_input, record in zip(inputs, records)]
+    capped = sum(1 for job_input, record in zip(inputs, records)
+                 if record["timings"]["settings"]["num_frames"] < job_input["num_frames"])
+    summary = calibration.summary()
+    print(f"  frame counts: {sum(planned)}/{len(planned)} planned as the handler did, {capped} capped by VRAM")
+    print(f"  calibration: {len(records) // 2 + len(records) % 2} jobs, cold start "
+          f"{summary['cold_start_s']}, overhead {summary['overhead_s']}")
+    print(f"  held-out execution time: mean error {statistics.mean(errors) * 100:5.1f}%, "
+          f"max {max(errors) * 100:5.1f}% over {len(errors)} jobs")
+    return statistics.mean(errors) < 0.15 and all(planned) and capped > 0
+
+
+def check_queueing(args):
+    calibration = Calibration(overhead_s=[0.0])
+    job_input = {"target_width": 960, "target_height": 544, "num_frames": 73, "output_mode": "url"}
+    service = make_jobs([0.0], [job_input], calibration)[0].execution
+    rho = 0.7
+    arrivals = poisson_arrivals(args.jobs, rho / service, seed=1)
+    jobs = make_jobs(arrivals, [job_input] * args.jobs, calibration)
+    start = time.perf_counter()
+    summary = simulate(jobs, calibration, max_workers=1, min_workers=1)
+    elapsed = time.perf_counter() - start
+    expected = rho * service / (2 * (1 - rho))
+    simulated = summary["latency_s"]["queue"]["mean"]
+    print(f"  M/D/1 at rho {rho}: mean queue {simulated:7.2f}s, theory {expected:7.2f}s, "
+          f"utilization {summary['utilization']:.3f}")
+    print(f"  simulated {args.jobs} jobs in {elapsed:.2f}s ({args.jobs / elapsed:,.0f} jobs/s)")
+    return abs(simulated - expected) / expected < 0.05
+
+
+def check_cold_starts():
+    calibration = Calibration(cold_start_s=[42.0])
+    job_input = {"target_width": 960, "target_height": 544, "num_frames": 49}
+    jobs = make_jobs([i * 600.0 for i in range(20)], [job_input] * 20, calibration)
+    summary = simulate(jobs, calibration, max_workers=4, idle_timeout=5.0)
+    queue = summary["latency_s"]["queue"]
+    print(f"  sparse arrivals: {summary['cold_starts']} cold starts for {summary['jobs']} jobs, "
+          f"queue p50 {queue['p50']:.1f}s max {queue['max']:.1f}s")
+    return summary["cold_starts"] == 20 and queue["p50"] == queue["max"] == 42.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--speed", type=float, default=0.02, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--jobs", type=int, default=100000, help="Jobs in the M/D/1 run")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-capacity-sim-")
+    try:
+        results = {"calibration": check_calibration(args, output_dir)}
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    results["queueing"] = check_queueing(args)
+    results["cold_starts"] = check_cold_starts()
+    failed = [name for name, ok in results.items() if not ok]
+    if failed:
+        raise SystemExit(f"failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
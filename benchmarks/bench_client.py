@@ -0,0 +1,157 @@
+"""Compare test.py's sequential submit-and-poll loop with the asyncio client.
+
+Both run the same jobs against mock_runpod.py workers backed by mock ComfyUI
+servers. The sequential loop is test.py's: POST /run, then GET /status every
+0.5 s, one job at a time, decoding the whole video in memory. The async client
+keeps --concurrency jobs in flight, polls with jittered backoff and decodes
+to disk. Also checks that /runsync is used for short jobs and that a job
+outliving RunPod's /runsync hold is followed by its id, that every output
+file is written, that cancelling a task cancels its job, and that a job
+still running at the client's timeout fails at that timeout and is
+cancelled.
+
+    python -m benchmarks.bench_client [--jobs 8] [--workers 4] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import time
+
+import requests
+
+import mock_runpod
+from hunyuan_client import HunyuanClient
+from mock_runpod import MockRunpodServer
+
+VIDEO_BYTES = 2 * 1024 * 1024
+
+
+def job_inputs(count):
+    return [{"prompt": f"clip {i} of a red panda", "target_width": 512, "target_height": 288,
+             "num_frames": 17, "num_inference_steps": 4, "video_index": 0, "result_cache": "bypass"}
+            for i in range(count)]
+
+
+def sequential(endpoint, inputs, output_dir):
+    """test.py's loop, minus the cv2 window"""
+    for job_input in inputs:
+        job_id = requests.post(f"{endpoint}/run", json={"input": job_input}).json()["id"]
+        while True:
+            status = requests.get(f"{endpoint}/status/{job_id}").json()
+            if status["status"] == "COMPLETED":
+                break
+            if status["status"] in ("FAILED", "CANCELLED"):
+                raise SystemExit(f"Job {job_id} {status['status']}: {status.get('error')}")
+            time.sleep(0.5)
+        with open(os.path.join(output_dir, f"{job_id}.mp4"), "wb") as f:
+            f.write(base64.b64decode(status["output"]["base64_video"]))
+
+
+async def concurrent(endpoint, inputs, output_dir, concurrency, expected_seconds=None):
+    async with HunyuanClient(endpoint, max_concurrency=concurrency) as client:
+        return await client.run_many(inputs, output_dir=output_dir, expected_seconds=expected_seconds)
+
+
+def check_runsync_hold(endpoint, output_dir):
+    """A /runsync reply still in progress has to be followed to the result by its id"""
+    hold = mock_runpod.RUNSYNC_WAIT_S
+    # The mock answers /runsync long before the job finishes, as RunPod does after its hold
+    mock_runpod.RUNSYNC_WAIT_S = 0.1
+    try:
+        job_input = dict(job_inputs(1)[0], num_inference_steps=30)
+        results = asyncio.run(concurrent(endpoint, [job_input], output_dir, 1, expected_seconds=5))
+    finally:
+        mock_runpod.RUNSYNC_WAIT_S = hold
+    check_results(results, output_dir)
+
+
+async def check_cancel(endpoint):
+    async with HunyuanClient(endpoint, max_concurrency=1) as client:
+        task = asyncio.create_task(client.run(job_inputs(1)[0]))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        health = requests.get(f"{endpoint}/health").json()
+        if not health["jobs"]["cancelled"]:
+            raise SystemExit("Cancelling the task did not cancel the job")
+
+
+async def check_timeout(endpoint, timeout):
+    """Returns how long past timeout the client gave up"""
+    cancelled = requests.get(f"{endpoint}/health").json()["jobs"]["cancelled"]
+    # The job's own execution_timeout is far off, so only the client can stop it in time
+    job_input = dict(job_inputs(1)[0], num_inference_steps=500, execution_timeout=600)
+    async with HunyuanClient(endpoint, max_concurrency=1) as client:
+        start = time.perf_counter()
+        try:
+            await client.run(job_input, timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise SystemExit("A job outliving its timeout returned")
+        late = time.perf_counter() - start - timeout
+    if requests.get(f"{endpoint}/health").json()["jobs"]["cancelled"] == cancelled:
+        raise SystemExit("A job that timed out was not cancelled")
+    if late > 1.0:
+        raise SystemExit(f"The client gave up {late:.2f}s after its timeout")
+    return late
+
+
+def check_results(results, output_dir):
+    for result in results:
+        if isinstance(result, BaseException):
+            raise SystemExit(f"Job raised: {result!r}")
+        if result.status != "COMPLETED":
+            raise SystemExit(f"Job {result.job_id} {result.status}: {result.error}")
+        if os.path.getsize(result.files["video"]) != VIDEO_BYTES or "preview" not in result.files:
+            raise SystemExit(f"Job {result.job_id}: outputs not written correctly")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--speed", type=float, default=0.01, help="Multiplier applied to every simulated delay")
+    args = parser.parse_args()
+
+    inputs = job_inputs(args.jobs)
+    with MockRunpodServer.with_mock_workers(args.workers, speed=args.speed, cold_start_s=0,
+                                            video_bytes=VIDEO_BYTES) as server, \
+            tempfile.TemporaryDirectory() as output_dir:
+        # Warm every worker so neither side pays for cold starts
+        asyncio.run(concurrent(server.url, job_inputs(args.workers), output_dir, args.workers))
+
+        start = time.perf_counter()
+        sequential(server.url, inputs, output_dir)
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = asyncio.run(concurrent(server.url, inputs, output_dir, args.concurrency))
+        concurrent_s = time.perf_counter() - start
+        check_results(results, output_dir)
+
+        start = time.perf_counter()
+        results = asyncio.run(concurrent(server.url, inputs, output_dir, args.concurrency, expected_seconds=5))
+        runsync_s = time.perf_counter() - start
+        check_results(results, output_dir)
+        check_runsync_hold(server.url, output_dir)
+
+        asyncio.run(check_cancel(server.url))
+        late = asyncio.run(check_timeout(server.url, 2.0))
+
+    print(f"{args.jobs} jobs, {args.workers} mock workers")
+    print(f"  sequential loop:          {sequential_s:7.2f}s  ({sequential_s / args.jobs:.2f}s/job)")
+    print(f"  async, backoff polling:   {concurrent_s:7.2f}s  ({sequential_s / concurrent_s:.1f}x)")
+    print(f"  async, /runsync:          {runsync_s:7.2f}s  ({sequential_s / runsync_s:.1f}x), "
+          f"followed by id past the hold")
+    print(f"  timeout: gave up {late:.2f}s after a 2s timeout and cancelled the job")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Measure worker throughput with one job at a time vs overlapping jobs.
+
+Runs the real handler against a mock ComfyUI that simulates per-node stage
+timings, first sequentially (MAX_CONCURRENCY=1) and then through
+async_handler with several jobs in flight, as RunPod does with a
+concurrency_modifier. With overlap, the next job's workflow is already queued
+in ComfyUI while the previous job's outputs are read and encoded, so the
+simulated GPU goes straight from one prompt to the next.
+
+    python -m benchmarks.bench_concurrency [--jobs 8] [--concurrency 2] [--video-mb 96]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from mock_comfy import MockComfyServer
+
+
+def job(i):
+    return {"id": f"bench-{i}", "input": {
+        "prompt": f"clip {i} of a red panda", "target_width": 960, "target_height": 544, "num_frames": 73,
+        "num_inference_steps": 15, "video_index": 0, "result_cache": "bypass"}}
+
+
+async def run_overlapping(handler_module, jobs, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job_input):
+        async with semaphore:
+            return await handler_module.async_handler(job_input)
+
+    return await asyncio.gather(*(run(j) for j in jobs))
+
+
+def report(name, results, wall_s, busy_s):
+    failed = [r for r in results if "error" in r]
+    if failed:
+        raise SystemExit(f"{name}: {len(failed)} jobs failed: {failed[0]['error']}")
+    phases = {}
+    for result in results:
+        for phase, seconds in result["timings"]["phases"].items():
+            phases.setdefault(phase, []).append(seconds)
+    post = {phase: statistics.mean(values) for phase, values in phases.items() if phase not in ("wait", "queue")}
+    print(f"{name:>12}: {wall_s:6.2f}s, {len(results) / wall_s * 60:6.1f} jobs/min, "
+          f"GPU busy {busy_s / wall_s:5.1%}, handler-side {sum(post.values()):.3f}s/job "
+          f"({', '.join(f'{k} {v:.3f}' for k, v in sorted(post.items(), key=lambda x: -x[1])[:3])})")
+    return wall_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--speed", type=float, default=0.02, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--video-mb", type=int, default=96, help="Size of each simulated output video")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-concurrency-")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, video_bytes=args.video_mb * 1024 * 1024).start()
+    os.environ.update({
+        "COMFY_HOST": server.address,
+        "COMFY_OUTPUT_PATH": output_dir,
+        "COMFY_WORKFLOW_DIR": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workflows"),
+        "COMFY_WORKFLOW": "small_model_no_block_swapping",
+    })
+    import handler
+
+    handler.handler(job("warmup"))
+    comfy = server.comfy
+
+    busy = comfy.busy_seconds
+    start = time.perf_counter()
+    results = [handler.handler(job(i)) for i in range(args.jobs)]
+    sequential_s = report("sequential", results, time.perf_counter() - start, comfy.busy_seconds - busy)
+
+    busy = comfy.busy_seconds
+    start = time.perf_counter()
+    results = asyncio.run(run_overlapping(handler, [job(i) for i in range(args.jobs)], args.concurrency))
+    overlapped_s = report(f"overlap x{args.concurrency}", results, time.perf_counter() - start,
+                          comfy.busy_seconds - busy)
+    print(f"throughput gain: {sequential_s / overlapped_s:.2f}x")
+    server.stop()
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Fit the cost model from recorded timings and check deadline-driven settings.
+
+Runs the real handler against a mock ComfyUI whose node times scale with
+resolution, frame count, steps, TeaCache threshold and RIFE multiplier. Jobs
+over a grid of sizes and quality tiers produce the same timing records the
+worker writes; the model is fitted on most of them and its prediction error
+measured on the rest, next to the uncalibrated prior. Then jobs are run with
+deadline_seconds at several budgets and the measured time compared with the
+deadline. All times are mock seconds, i.e. scaled by --speed.
+
+    python -m benchmarks.bench_cost_model [--speed 0.02]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+
+from cost_model import CostModel
+from mock_comfy import MockComfyServer
+from quality_planner import TIERS
+
+SIZES = ((848, 480), (960, 544), (1280, 720))
+FRAME_COUNTS = (49, 73, 97)
+
+
+def job(i, **job_input):
+    return {"id": f"bench-{i}", "input": dict({
+        "prompt": f"clip {i} of a red panda", "video_index": 1, "result_cache": "bypass"}, **job_input)}
+
+
+def record(output):
+    if "error" in output:
+        raise SystemExit(f"Job failed: {output['error']}")
+    return {"status": "success", "cached": False, "timings": output["timings"]}
+
+
+def error_pct(model, records, scale=1.0):
+    errors = []
+    for r in records:
+        predicted = model.predict(r["timings"]["settings"])["total_s"] * scale
+        errors.append(abs(predicted - r["timings"]["total_s"]) / r["timings"]["total_s"])
+    return statistics.mean(errors) * 100, max(errors) * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--speed", type=float, default=0.02, help="Multiplier applied to every simulated delay")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-cost-model-")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, scale_workload=True).start()
+    os.environ.update({
+        "COMFY_HOST": server.address,
+        "COMFY_OUTPUT_PATH": output_dir,
+        "COMFY_WORKFLOW_DIR": os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workflows"),
+        "COMFY_WORKFLOW": "small_model_no_block_swapping",
+    })
+    import handler
+
+    handler.handler(job("warmup", tier="draft"))
+    records = []
+    for width, height in SIZES:
+        for frames in FRAME_COUNTS:
+            for tier in TIERS:
+                output = handler.handler(job(len(records), target_width=width, target_height=height,
+                                             num_frames=frames, tier=tier))
+                records.append(record(output))
+    held_out = records[::4]
+    training = [r for i, r in enumerate(records) if i % 4]
+
+    model = CostModel.fit(training)
+    # The prior is in real seconds, the records in mock seconds
+    prior_mean, prior_max = error_pct(CostModel(), held_out, args.speed)
+    fitted_mean, fitted_max = error_pct(model, held_out)
+    print(f"{len(training)} training jobs, {len(held_out)} held out")
+    print(f"  prior:  mean error {prior_mean:6.1f}%, max {prior_max:6.1f}%")
+    print(f"  fitted: mean error {fitted_mean:6.1f}%, max {fitted_max:6.1f}%")
+
+    handler.COST_MODEL = model
+    size = {"target_width": 1280, "target_height": 720, "num_frames": 73}
+    quality = handler.handler(job("quality", tier="quality", **size))["timings"]["total_s"]
+    missed = 0
+    for fraction in (1.0, 0.7, 0.5, 0.35):
+        deadline = round(quality * fraction, 2)
+        output = handler.handler(job(f"deadline-{fraction}", deadline_seconds=deadline, **size))
+        chosen, measured = output["quality"], record(output)["timings"]["total_s"]
+        settings = chosen["settings"]
+        within = measured <= deadline * 1.1
+        missed += chosen["deadline_met"] and not within
+        verdict = ("ok" if within else "MISSED") if chosen["deadline_met"] else "out of reach, fastest settings"
+        print(f"  deadline {deadline:6.2f}s: steps {settings['steps']:2}, teacache {settings['teacache']:.2f}, "
+              f"rife x{settings['rife_multiplier']}, upscale {'on ' if settings['upscale'] else 'off'} -> "
+              f"predicted {chosen['predicted_seconds']:6.2f}s, measured {measured:6.2f}s "
+              f"{verdict}")
+    server.stop()
+    shutil.rmtree(output_dir, ignore_errors=True)
+    if missed:
+        raise SystemExit(f"{missed} deadlines predicted to fit were missed by more than 10%")
+
+
+if __name__ == "__main__":
+    main()
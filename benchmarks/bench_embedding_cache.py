@@ -0,0 +1,114 @@
+"""Exercise the text-embedding cache with a stub encoder.
+
+The stub stands in for DownloadAndLoadHyVideoTextEncoder + HyVideoTextEncode:
+it sleeps for a configurable load and encode time and returns arrays shaped
+like llava-llama-3 and CLIP embeddings. The script checks that hits never call
+the encoder, that the key covers prompt, template and encoder config, that
+eviction keeps the cache under its byte budget, and that every shipped
+template rewrites cleanly onto the cached node; then it reports miss vs hit
+latency.
+
+    python -m benchmarks.bench_embedding_cache [--load-seconds 2] [--jobs 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from workflow_templates import load_templates, use_cached_text_encoder
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "custom_nodes", "ComfyUI-HunyuanEmbeddingCache"))
+from embedding_cache import EmbeddingCache, embedding_key  # noqa: E402
+
+ENCODER_CONFIG = {"llm_model": "Kijai/llava-llama-3-8b-text-encoder-tokenizer",
+                  "clip_model": "openai/clip-vit-large-patch14", "precision": "bf16", "quantization": "bnb_nf4"}
+ENCODE_ARGS = {"prompt_template": "video"}
+SUFFIX = " The scene appears to be real life footage with a hyper-realistic art style."
+
+
+class StubEncoder:
+    def __init__(self, load_seconds, encode_seconds):
+        self.load_seconds = load_seconds
+        self.encode_seconds = encode_seconds
+        self.calls = 0
+
+    def __call__(self, prompt):
+        self.calls += 1
+        time.sleep(self.load_seconds + self.encode_seconds)
+        seed = int.from_bytes(prompt.encode()[:4].ljust(4, b"\0"), "little")
+        rng = np.random.default_rng(seed)
+        return {"prompt_embeds": rng.standard_normal((1, 256, 4096), dtype=np.float32).astype(np.float16),
+                "prompt_embeds_2": rng.standard_normal((1, 768), dtype=np.float32).astype(np.float16),
+                "attention_mask": np.ones((1, 256), dtype=np.int64), "cfg": None}
+
+
+def lookup(cache, encoder, prompt, encode_args=ENCODE_ARGS, encoder_config=ENCODER_CONFIG):
+    key = embedding_key(prompt, encode_args, encoder_config)
+    start = time.perf_counter()
+    value, hit = cache.get_or_compute(key, lambda: encoder(prompt))
+    return value, hit, time.perf_counter() - start
+
+
+def check_templates():
+    for name, template in load_templates(os.path.join(ROOT, "workflows"), use_cached_text_encoder).items():
+        classes = {node["class_type"] for node in template.workflow.values()}
+        if classes & {"HyVideoTextEncode", "DownloadAndLoadHyVideoTextEncoder"}:
+            raise SystemExit(f"{name}: text encoder nodes left after rewrite")
+        if "prompt" not in template.placeholders:
+            raise SystemExit(f"{name}: prompt placeholder lost in rewrite")
+    print("Every template rewrites onto HyVideoCachedTextEncode")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--load-seconds", type=float, default=2.0, help="Simulated encoder load time")
+    parser.add_argument("--encode-seconds", type=float, default=0.5, help="Simulated encode time")
+    parser.add_argument("--jobs", type=int, default=20, help="Jobs to replay, cycling through 4 prompts")
+    args = parser.parse_args()
+
+    check_templates()
+    with tempfile.TemporaryDirectory() as directory:
+        encoder = StubEncoder(args.load_seconds, args.encode_seconds)
+        cache = EmbeddingCache(directory, max_bytes=64 * 1024 ** 2)
+        prompts = [f"clip {i} of a red panda on a bamboo stick{SUFFIX}" for i in range(4)]
+
+        first, hit, _ = lookup(cache, encoder, prompts[0])
+        again, hit_again, _ = lookup(cache, encoder, prompts[0])
+        if hit or not hit_again or encoder.calls != 1:
+            raise SystemExit("Repeated prompt was not served from the cache")
+        if not np.array_equal(first["prompt_embeds"], again["prompt_embeds"]):
+            raise SystemExit("Cached embeddings differ from the encoder output")
+        for variant in ({"prompt_template": "image"}, dict(ENCODER_CONFIG, precision="fp16")):
+            encode_args = variant if "prompt_template" in variant else ENCODE_ARGS
+            encoder_config = variant if "precision" in variant else ENCODER_CONFIG
+            if lookup(cache, encoder, prompts[0], encode_args, encoder_config)[1]:
+                raise SystemExit(f"Cache key ignores {variant}")
+
+        miss_s, hit_s = [], []
+        for i in range(args.jobs):
+            _, hit, elapsed = lookup(cache, encoder, prompts[i % len(prompts)])
+            (hit_s if hit else miss_s).append(elapsed)
+        print(f"stats: {cache.stats()}")
+        print(f"miss: {statistics.median(miss_s) * 1000:9.1f} ms median over {len(miss_s)}")
+        print(f"hit:  {statistics.median(hit_s) * 1000:9.1f} ms median over {len(hit_s)}")
+
+        entry_size = max(os.path.getsize(os.path.join(directory, name))
+                         for name in os.listdir(directory) if name.endswith(EmbeddingCache.suffix))
+        cache.max_bytes = entry_size * 2
+        cache.evict()
+        remaining = [name for name in os.listdir(directory) if name.endswith(EmbeddingCache.suffix)]
+        if len(remaining) > 2:
+            raise SystemExit(f"Eviction left {len(remaining)} entries over a 2-entry budget")
+        # The most recently used prompt must survive eviction
+        if not lookup(cache, encoder, prompts[(args.jobs - 1) % len(prompts)])[1]:
+            raise SystemExit("Eviction dropped the most recently used entry")
+        print(f"eviction: {len(remaining)} entries kept under a {cache.max_bytes / 1024 ** 2:.1f} MiB budget")
+
+
+if __name__ == "__main__":
+    main()
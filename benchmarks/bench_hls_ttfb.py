@@ -0,0 +1,145 @@
+"""Time to first byte of HLS output against the single-MP4 path.
+
+Encoder: synthetic frames are produced at --produce-fps, standing in for the
+post-processing chain handing frames to the encoder. The MP4 path encodes
+them the way VHS_VideoCombine does (H.265, CRF 30), and its first byte is
+usable only once the file is finished. The HLS path pipes the same frames
+into the HLS writer, and its first byte is the first published segment.
+
+Job: a segmented job runs against a mock ComfyUI that encodes real clips,
+once with output_mode "base64" and once with "hls" through the streaming
+handler, uploading to a local moto S3 server. The MP4 result arrives with
+the final output; the first HLS segment is streamed as soon as the first
+segment is generated. The uploaded playlist has to reference every segment
+by a URL that can be fetched.
+
+    python -m benchmarks.bench_hls_ttfb [--frames 241] [--produce-fps 48] [--width 960] [--height 544]
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+from moto.server import ThreadedMotoServer
+
+from hls_output import encode_hls
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from video_segments import write_frames
+
+
+def synthetic_frames(count, width, height, produce_fps):
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    start = time.perf_counter()
+    for i in range(count):
+        # Post-processing hands over frames no faster than produce_fps
+        delay = start + i / produce_fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + 4 * i) % 256
+        frame[..., 1] = (y + 2 * i) % 256
+        frame[..., 2] = 128
+        yield frame
+
+
+def bench_encoder(args, work_dir):
+    start = time.perf_counter()
+    path = os.path.join(work_dir, "video.mp4")
+    write_frames(path, synthetic_frames(args.frames, args.width, args.height, args.produce_fps),
+                 args.width, args.height, 24)
+    mp4_total = time.perf_counter() - start
+
+    first = []
+    lock = threading.Lock()
+
+    def publish(name, path, seconds):
+        with lock:
+            if seconds is not None and not first:
+                first.append(time.perf_counter() - start)
+        return name
+
+    start = time.perf_counter()
+    hls = encode_hls(synthetic_frames(args.frames, args.width, args.height, args.produce_fps),
+                     os.path.join(work_dir, "hls"), args.width, args.height, 24, publish)
+    hls_total = time.perf_counter() - start
+    print(f"encoder, {args.frames} frames at {args.width}x{args.height} produced at {args.produce_fps} fps:")
+    print(f"  mp4: first byte {mp4_total:6.2f}s, done {mp4_total:6.2f}s")
+    print(f"  hls: first byte {first[0]:6.2f}s, done {hls_total:6.2f}s ({len(hls['segments'])} segments)")
+    return first[0] < mp4_total
+
+
+def check_playlist(hls):
+    """Whether the uploaded playlist's init and segment URIs all resolve"""
+    playlist = requests.get(hls["playlist"]["url"], timeout=10).text.splitlines()
+    uris = [line.split('URI="', 1)[1].split('"', 1)[0] for line in playlist if line.startswith("#EXT-X-MAP:")]
+    uris += [line for line in playlist if line and not line.startswith("#")]
+    fetched = [uri for uri in uris if uri.startswith("http") and requests.get(uri, timeout=10).ok]
+    print(f"  playlist: {len(fetched)}/{len(uris)} URIs fetched ({len(hls['segments'])} segments and init)")
+    return len(fetched) == len(uris) == len(hls["segments"]) + 1
+
+
+def bench_job(args, work_dir):
+    output_dir = os.path.join(work_dir, "comfy")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, encode_videos=True).start()
+    # Keeps moto's request log out of the report
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    s3 = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    s3.start()
+    host, port = s3.get_host_and_port()
+    stream_handler = load_handler(server.address, output_dir, "bench_hls", entry="stream_handler", env={
+        "MAX_GENERATION_FRAMES": "65", "BUCKET_ENDPOINT_URL": f"http://{host}:{port}", "BUCKET_NAME": "outputs",
+        "BUCKET_ACCESS_KEY_ID": "test", "BUCKET_SECRET_ACCESS_KEY": "test", "BUCKET_CREATE": "true"})
+    job_input = {"prompt": "a red panda", "target_width": 960, "target_height": 544, "num_frames": 201,
+                 "segmented": True, "video_index": 1, "result_cache": "bypass"}
+    results = {}
+    try:
+        for mode in ("base64", "hls"):
+            start = time.perf_counter()
+            first = None
+            for message in stream_handler({"id": f"bench-{mode}", "input": dict(job_input, output_mode=mode)}):
+                if message.get("status") == "segment" and first is None:
+                    first = time.perf_counter() - start
+                elif message.get("status") not in ("progress", "segment"):
+                    if "error" in message:
+                        raise SystemExit(f"{mode} job failed: {message['error']}")
+                    output = message
+            total = time.perf_counter() - start
+            results[mode] = (first if first is not None else total, total)
+        print(f"segmented job, {job_input['num_frames']} frames on the mock:")
+        for mode, (first, total) in results.items():
+            print(f"  {mode:6}: first byte {first:6.2f}s, done {total:6.2f}s")
+        playable = check_playlist(output["hls"])
+    finally:
+        server.stop()
+        s3.stop()
+    return results["hls"][0] < results["base64"][0] and playable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=241)
+    parser.add_argument("--produce-fps", type=float, default=48.0, help="Rate post-processing hands over frames")
+    parser.add_argument("--width", type=int, default=960)
+    parser.add_argument("--height", type=int, default=544)
+    parser.add_argument("--speed", type=float, default=0.01, help="Mock ComfyUI delay multiplier")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-hls-")
+    try:
+        ok = bench_encoder(args, work_dir)
+        ok = bench_job(args, work_dir) and ok
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if not ok:
+        raise SystemExit("HLS did not deliver its first byte before the MP4 path, or its playlist does not play")
+
+
+if __name__ == "__main__":
+    main()
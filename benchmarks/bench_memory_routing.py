@@ -0,0 +1,89 @@
+"""Check memory-budget routing between workflow variants and the OOM fallback.
+
+Runs the real handler against a mock ComfyUI reporting --vram-gb of VRAM,
+with the small model's no-swap template as COMFY_WORKFLOW and the same
+pipeline with block swapping as COMFY_LOW_MEMORY_WORKFLOW. Jobs whose generation
+size fits the no-swap variant must run without block swapping and longer
+ones with it. Then the mock is told the real peak is --memory-scale times the
+estimate, so jobs routed close to the limit run out of memory and must
+succeed on the retry.
+
+The default is a 20 GB card: a 960x544 target generates at 680x392, which
+the fp8 model samples without block swapping up to 161 frames on 24 GB, so
+routing only matters there beyond the 129-frame cap.
+
+    python -m benchmarks.bench_memory_routing [--vram-gb 20] [--memory-scale 1.1] [--speed 0.005]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from memory_model import max_frames
+
+WORKFLOW_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workflows")
+FRAME_COUNTS = (49, 89, 93, 97, 129)
+
+
+def job(i, num_frames):
+    return {"id": f"bench-{i}", "input": {
+        "prompt": f"clip {i} of a red panda", "target_width": 960, "target_height": 544,
+        "num_frames": num_frames, "video_index": 1, "result_cache": "bypass"}}
+
+
+def run(args, name, memory_scale):
+    output_dir = tempfile.mkdtemp(prefix=f"bench-memory-{name}-")
+    server = MockComfyServer(output_dir=output_dir, speed=args.speed, vram_gb=args.vram_gb,
+                             memory_scale=memory_scale).start()
+    worker = load_handler(server.address, output_dir, f"bench_memory_{name}", entry=None, env={
+        "COMFY_WORKFLOW_DIR": WORKFLOW_DIR,
+        "COMFY_WORKFLOW": "small_model_no_block_swapping",
+        "COMFY_LOW_MEMORY_WORKFLOW": "small_model_low_memory",
+    })
+    print(f"{name}: budget {worker.job_vram_budget():.2f} GB, variants {worker.VARIANTS}")
+    results = []
+    for i, frames in enumerate(FRAME_COUNTS):
+        output = worker.handler(job(i, frames))
+        if "error" in output:
+            raise SystemExit(f"{name}: {frames} frames failed: {output['error']}")
+        variant = output["variant"]
+        print(f"  {frames:3} frames -> {variant['name']:<30} estimated {variant['estimated_vram_gb']:5.2f} GB, "
+              f"oom retries {variant['oom_retries']}")
+        results.append((frames, output["timings"]["bucket"], variant))
+    server.stop()
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return worker, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vram-gb", type=float, default=20.0, help="VRAM the mock reports")
+    parser.add_argument("--memory-scale", type=float, default=1.1, help="Real peak over estimate for the OOM run")
+    parser.add_argument("--speed", type=float, default=0.005, help="Multiplier applied to every simulated delay")
+    args = parser.parse_args()
+
+    worker, results = run(args, "routing", None)
+    failures = []
+    for frames, bucket, variant in results:
+        no_swap = max_frames(worker.PROFILES[0][1], bucket["width"], bucket["height"], worker.job_vram_budget())
+        expected = worker.VARIANTS[0] if bucket["num_frames"] <= no_swap else worker.VARIANTS[-1]
+        if variant["name"] != expected or variant["oom_retries"]:
+            failures.append(f"{frames} frames ({bucket['label']}, no-swap limit {no_swap}) routed to "
+                            f"{variant['name']}, expected {expected}")
+
+    _, results = run(args, "oom", args.memory_scale)
+    retried = [(frames, variant) for frames, _, variant in results if variant["oom_retries"]]
+    if not retried:
+        failures.append(f"no job ran out of memory at memory scale {args.memory_scale}")
+    for frames, variant in retried:
+        if variant["name"] != worker.VARIANTS[-1]:
+            failures.append(f"{frames} frames finished on {variant['name']} after running out of memory")
+    if failures:
+        raise SystemExit("\n".join(failures))
+    print(f"routing matched the memory model; {len(retried)} jobs recovered from out-of-memory on the retry")
+
+
+if __name__ == "__main__":
+    main()
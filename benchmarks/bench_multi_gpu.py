@@ -0,0 +1,155 @@
+"""Dispatch jobs across several mock ComfyUI instances, one per simulated GPU.
+
+Throughput: the same burst of jobs runs on a worker with one instance and on
+one with --gpus instances, each with as many jobs in flight as instances.
+Prompts should spread evenly and the burst should finish about --gpus times
+faster.
+
+Warmth: with instances equally loaded, a workflow goes to the instance that
+already has its models and not to one holding another workflow's models.
+
+Failover: one instance is stopped, as if its ComfyUI crashed. Jobs must keep
+succeeding on the others. Once it is started again on the same port, the
+health monitor has to bring it back into rotation. Then one instance is
+stopped while it runs a prompt: that job has to be queued again on another
+instance instead of waiting out the timeout.
+
+    python -m benchmarks.bench_multi_gpu [--gpus 2] [--jobs 8] [--speed 0.01]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from comfy_pool import ComfyPool
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+
+JOB = {"prompt": "a red panda", "target_width": 960, "target_height": 544, "num_frames": 49,
+       "num_inference_steps": 15, "video_index": 1, "result_cache": "bypass"}
+
+
+def start_instance(output_dir, index, speed, port=0):
+    return MockComfyServer(port=port, output_dir=os.path.join(output_dir, f"gpu{index}"), speed=speed,
+                           cache_models=True).start()
+
+
+def load_worker(servers, output_dir, name):
+    worker = load_handler(servers[0].address, output_dir, name, entry=None, env={
+        "MULTI_GPU": "true",
+        "COMFY_HOSTS": ",".join(server.address for server in servers),
+        "COMFY_OUTPUT_SUBFOLDERS": ",".join(f"gpu{i}" for i in range(len(servers))),
+    })
+    if not worker.warm_up():
+        raise SystemExit(f"{name}: no instance came up")
+    return worker
+
+
+def run_burst(worker, jobs, prefix):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=worker.MAX_CONCURRENCY) as pool:
+        outputs = list(pool.map(worker.handler, [{"id": f"{prefix}-{i}", "input": dict(JOB, prompt=f"clip {i}")}
+                                                 for i in range(jobs)]))
+    failed = [output["error"] for output in outputs if "error" in output]
+    return time.perf_counter() - start, failed
+
+
+def bench_throughput(args, output_dir):
+    walls = {}
+    for gpus in (1, args.gpus):
+        directory = os.path.join(output_dir, f"throughput-{gpus}")
+        servers = [start_instance(directory, i, args.speed) for i in range(gpus)]
+        worker = load_worker(servers, directory, f"bench_multi_gpu_{gpus}")
+        before = [server.comfy.prompt_number for server in servers]
+        wall, failed = run_burst(worker, args.jobs, f"burst-{gpus}")
+        prompts = [server.comfy.prompt_number - b for server, b in zip(servers, before)]
+        for server in servers:
+            server.stop()
+        if failed:
+            raise SystemExit(f"{gpus} instances: {len(failed)} jobs failed: {failed[0]}")
+        walls[gpus] = wall
+        print(f"  {gpus} instance(s): {wall:6.2f}s, {args.jobs / wall * 60:6.1f} jobs/min, prompts per instance {prompts}")
+    print(f"  speedup {walls[1] / walls[args.gpus]:.2f}x with {args.gpus} instances")
+    return walls[1] / walls[args.gpus] > 1.5
+
+
+def check_warmth():
+    # Nothing is sent to these hosts; acquire only looks at what the pool has dispatched
+    pool = ComfyPool(["127.0.0.1:1", "127.0.0.1:2"])
+    first = {"1": {"class_type": "HyVideoModelLoader", "inputs": {"model": "small.safetensors"}}}
+    second = {"1": {"class_type": "HyVideoModelLoader", "inputs": {"model": "large.safetensors"}}}
+    placed = []
+    for workflow in (first, second, second, first):
+        instance = pool.acquire(workflow)
+        placed.append(instance.index)
+        pool.release(instance)
+    print(f"  warmth: first, second, second, first went to instances {placed}")
+    return placed == [0, 1, 1, 0]
+
+
+def check_failover(args, output_dir):
+    directory = os.path.join(output_dir, "failover")
+    servers = [start_instance(directory, i, args.speed) for i in range(args.gpus)]
+    worker = load_worker(servers, directory, "bench_multi_gpu_failover")
+    worker.COMFY_POOL.start_monitor(interval=0.2)
+
+    port = int(servers[-1].address.rsplit(":", 1)[1])
+    servers[-1].stop()
+    wall, failed = run_burst(worker, args.jobs, "crashed")
+    healthy = len(worker.COMFY_POOL.healthy())
+    print(f"  one instance down: {args.jobs - len(failed)}/{args.jobs} jobs ok in {wall:.2f}s, "
+          f"{healthy}/{args.gpus} instances in rotation")
+    ok = not failed and healthy == args.gpus - 1
+
+    servers[-1] = start_instance(directory, args.gpus - 1, args.speed, port)
+    deadline = time.monotonic() + 5
+    while len(worker.COMFY_POOL.healthy()) < args.gpus and time.monotonic() < deadline:
+        time.sleep(0.05)
+    before = servers[-1].comfy.prompt_number
+    wall, failed = run_burst(worker, args.jobs, "restarted")
+    restarted = servers[-1].comfy.prompt_number - before
+    print(f"  restarted: {args.jobs - len(failed)}/{args.jobs} jobs ok in {wall:.2f}s, "
+          f"{restarted} prompts on the restarted instance")
+    ok = ok and not failed and restarted > 0
+
+    # Crash the instance under a running prompt
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        burst = pool.submit(run_burst, worker, args.jobs, "mid-job")
+        deadline = time.monotonic() + 10
+        while not servers[-1].comfy.queue_state()["queue_running"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        servers[-1].stop()
+        wall, failed = burst.result()
+    healthy = len(worker.COMFY_POOL.healthy())
+    print(f"  crashed mid-job: {args.jobs - len(failed)}/{args.jobs} jobs ok in {wall:.2f}s, "
+          f"{healthy}/{args.gpus} instances in rotation")
+    for server in servers:
+        server.stop()
+    return ok and not failed and healthy == args.gpus - 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gpus", type=int, default=2)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=0.01, help="Multiplier applied to every simulated delay")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-multi-gpu-")
+    try:
+        print("throughput:")
+        results = {"throughput": bench_throughput(args, output_dir)}
+        print("dispatch:")
+        results["warmth"] = check_warmth()
+        results["failover"] = check_failover(args, output_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    failed = [name for name, ok in results.items() if not ok]
+    if failed:
+        raise SystemExit(f"failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Peak RSS of returning a video as the handler does, as the video grows.
+
+Each measurement runs in a fresh interpreter. "legacy" is the old
+f.read() + b64encode + decode path, "inline" is encode_base64_file(), the str
+the handler returns for output_mode "base64", and "url" is
+ObjectStore.upload_file() multipart-uploading the file to a local moto S3
+server, as output_mode "url" does. The inline rows also report the peak once
+the result is serialized the way the RunPod SDK sends it (json.dumps of the
+whole output), which the worker pays on top of the handler.
+
+Fails if the inline path needs more than one transient copy of the payload or
+the url path's peak grows past its multipart buffers.
+
+    python -m benchmarks.bench_output_memory [--sizes-mb 16 64 256]
+"""
+import argparse
+import base64
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+
+from moto.server import ThreadedMotoServer
+
+from object_store import UPLOAD_CONCURRENCY, UPLOAD_PART_SIZE, ObjectStore
+from output_encoding import PeakMemory, base64_encoded_size, encode_base64_file
+
+MB = 1024 * 1024
+# Allowance for allocator noise and the interpreter itself
+FLAT_TOLERANCE_MB = 8
+MODES = ("legacy", "inline", "url")
+
+
+def measure(mode, path):
+    """Runs in the child: return path once and report the peak over the starting RSS"""
+    store = ObjectStore.from_env() if mode == "url" else None
+    memory = PeakMemory().start()
+    if mode == "url":
+        store.upload_file(path, os.path.basename(path), "video/mp4")
+        report = memory.report()
+        return {"mode": mode, "growth_mb": report["peak_rss_mb"] - report["start_rss_mb"], "sent_mb": None}
+    if mode == "legacy":
+        with open(path, "rb") as f:
+            video_bytes = f.read()
+        payload = base64.b64encode(video_bytes).decode("utf-8")
+        del video_bytes
+    else:
+        payload = encode_base64_file(path)
+    report = memory.report()
+    json.dumps({"output": {"video": payload}}, ensure_ascii=False)
+    sent = memory.report()
+    return {"mode": mode, "growth_mb": report["peak_rss_mb"] - report["start_rss_mb"],
+            "sent_mb": sent["peak_rss_mb"] - sent["start_rss_mb"], "payload_mb": len(payload) / MB}
+
+
+def run_child(mode, path, env):
+    output = subprocess.check_output([sys.executable, "-m", "benchmarks.bench_output_memory", "--child", mode, path],
+                                     env=env)
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    # Keeps moto's request log out of the report
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    s3 = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    s3.start()
+    host, port = s3.get_host_and_port()
+    env = dict(os.environ, BUCKET_ENDPOINT_URL=f"http://{host}:{port}", BUCKET_NAME="outputs",
+               BUCKET_ACCESS_KEY_ID="test", BUCKET_SECRET_ACCESS_KEY="test", BUCKET_CREATE="true")
+
+    results = {mode: [] for mode in MODES}
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for size_mb in args.sizes_mb:
+                path = os.path.join(directory, f"video_{size_mb}.mp4")
+                with open(path, "wb") as f:
+                    for _ in range(size_mb):
+                        f.write(os.urandom(MB))
+                print(f"{size_mb:5d} MB video ({base64_encoded_size(size_mb * MB) / MB:.0f} MB payload):")
+                for mode in MODES:
+                    result = run_child(mode, path, env)
+                    results[mode].append(result)
+                    sent = f", serialized +{result['sent_mb']:7.1f} MB" if result["sent_mb"] is not None else ""
+                    print(f"  {mode:>7}: peak +{result['growth_mb']:7.1f} MB{sent}")
+                os.remove(path)
+    finally:
+        s3.stop()
+
+    failures = []
+    buffers_mb = UPLOAD_PART_SIZE * UPLOAD_CONCURRENCY / MB
+    for r in results["url"]:
+        if r["growth_mb"] > buffers_mb + FLAT_TOLERANCE_MB:
+            failures.append(f"url peak {r['growth_mb']:.1f} MB exceeds its {buffers_mb:.0f} MB of multipart buffers")
+    for r in results["inline"]:
+        if r["growth_mb"] > 2 * r["payload_mb"] + FLAT_TOLERANCE_MB:
+            failures.append(f"inline peak {r['growth_mb']:.1f} MB exceeds two payload copies ({r['payload_mb']:.1f} MB)")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Handler output latency with the preview rendered off the critical path.
+
+Times the handler's output step (everything after ComfyUI finishes) for a
+--video-mb video and a preview --scale times the 960x544 target, --runs times
+per case:
+
+- before: the old path. The video is base64-encoded, then the preview PNG is
+  decoded, resized and saved as JPEG on the same thread. For videos other than
+  0 the preview file is still read and encoded, then dropped.
+- after: process_output_files. The preview renders on preview_pool while the
+  video is encoded, with reduced decoding and the preview cache. Videos other
+  than 0 never touch it.
+
+Cases are video 0, video 1, and video 0 served again (a result-cache hit,
+whose preview is in the preview cache). The render overlaps the encode only
+with a second CPU. Fails if any case's p95 got more than 10% worse, or the
+previews differ visibly.
+
+    python -m benchmarks.bench_preview [--runs 20] [--video-mb 24] [--scale 4]
+"""
+import argparse
+import base64
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from PIL import Image, ImageChops
+
+from loadtest import latency_summary
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from output_encoding import encode_base64_file
+from preview_image import PREVIEW_CACHE_SIZE, PreviewCache
+
+TARGET = (960, 544)
+
+
+def legacy_output(video_path, workflow_path, target_width, target_height, video_index):
+    """process_output_files as it was: everything in turn on the handler thread"""
+    video_b64 = encode_base64_file(video_path)
+    if video_index == 0:
+        with open(workflow_path, "rb") as f:
+            img = Image.open(BytesIO(f.read()))
+        img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=85, optimize=True)
+        workflow_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    else:
+        workflow_b64 = encode_base64_file(workflow_path)
+    return {"video": video_b64, "workflow_preview": workflow_b64}
+
+
+def write_inputs(output_dir, args):
+    video_path = os.path.join(output_dir, "clip.mp4")
+    with open(video_path, "wb") as f:
+        f.write(os.urandom(args.video_mb * 1024 * 1024))
+    # Noise over gradients, so the PNG is about as costly to decode as a real frame
+    size = (TARGET[0] * args.scale, TARGET[1] * args.scale)
+    noise = Image.effect_noise(size, 24)
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (ImageChops.add(gradient, noise), noise,
+                                ImageChops.add(gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise)))
+    preview_path = os.path.join(output_dir, "clip.png")
+    image.save(preview_path, compress_level=4)
+    return video_path, preview_path
+
+
+def time_runs(runs, run):
+    values = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        values.append((time.perf_counter() - start) * 1000)
+    return latency_summary(values)
+
+
+def mean_difference(a, b):
+    """Mean absolute per-channel difference of two JPEGs, 0-255"""
+    diff = ImageChops.difference(Image.open(BytesIO(a)).convert("RGB"), Image.open(BytesIO(b)).convert("RGB"))
+    # One 256-bin histogram per channel
+    total = sum((i % 256) * count for i, count in enumerate(diff.histogram()))
+    return total / (diff.width * diff.height * 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--video-mb", type=int, default=24)
+    parser.add_argument("--scale", type=int, default=4, help="Preview PNG size over the target size, e.g. 4 "
+                                                               "for a frame upscaled by RealESRGAN")
+    args = parser.parse_args()
+
+    output_dir = tempfile.mkdtemp(prefix="bench-preview-")
+    server = MockComfyServer(output_dir=output_dir).start()
+    try:
+        worker = load_handler(server.address, output_dir, "bench_preview", entry=None)
+        video_path, preview_path = write_inputs(output_dir, args)
+
+        def after(video_index):
+            return worker.process_output_files(video_path, preview_path, "bench", *TARGET, video_index)
+
+        print(f"{args.video_mb} MB video, {TARGET[0] * args.scale}x{TARGET[1] * args.scale} preview to "
+              f"{TARGET[0]}x{TARGET[1]}, {args.runs} runs on {len(os.sched_getaffinity(0))} CPUs (ms)")
+        cases = {
+            "video 0": (lambda: legacy_output(video_path, preview_path, *TARGET, 0), lambda: after(0), 0),
+            "video 1": (lambda: legacy_output(video_path, preview_path, *TARGET, 1), lambda: after(1), None),
+            "video 0 again": (lambda: legacy_output(video_path, preview_path, *TARGET, 0), lambda: after(0),
+                              PREVIEW_CACHE_SIZE),
+        }
+        worse = []
+        for name, (before_run, after_run, cache_size) in cases.items():
+            # A disabled cache keeps the first case from timing cache hits
+            worker.PREVIEW_CACHE = PreviewCache(cache_size or 0)
+            if cache_size:
+                after_run()
+            before = time_runs(args.runs, before_run)
+            current = time_runs(args.runs, after_run)
+            print(f"  {name:>13}: before p50 {before['p50']:7.1f} p95 {before['p95']:7.1f} p99 {before['p99']:7.1f} | "
+                  f"after p50 {current['p50']:7.1f} p95 {current['p95']:7.1f} p99 {current['p99']:7.1f}")
+            if current["p95"] > before["p95"] * 1.1:
+                worse.append(name)
+
+        legacy = base64.b64decode(legacy_output(video_path, preview_path, *TARGET, 0)["workflow_preview"])
+        rendered = base64.b64decode(after(0)["workflow_preview"])
+        difference = mean_difference(legacy, rendered)
+        print(f"  preview: {len(legacy)} -> {len(rendered)} bytes, mean pixel difference {difference:.2f}/255")
+    finally:
+        server.stop()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    if worse:
+        raise SystemExit(f"p95 got worse for: {', '.join(worse)}")
+    if difference > 2.0:
+        raise SystemExit(f"previews differ by {difference:.2f}/255 on average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Check the result cache's request coalescing and eviction.
+
+Coalescing: --callers identical requests arrive at once. Exactly one of them
+has to generate (--generate-s of simulated work, then put) and the others
+have to be served its entry about as soon as it is stored. This runs once with
+a generation shorter than the lock's stale threshold and once with one
+several times longer, where the holder's heartbeat has to keep its lock
+from being taken for a dead worker's.
+
+Eviction: --entries entries of --entry-kb go into a cache with room for a
+fifth of them, while the first entry is read after every put. The cache has
+to stay within its limit, keep the entry that keeps being read and drop the
+oldest of the others. Also reports how long a put takes, eviction included.
+
+    python -m benchmarks.bench_result_cache [--callers 8] [--generate-s 1.0] [--entries 200] [--entry-kb 64]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from loadtest import latency_summary
+from result_cache import ResultCache
+
+
+def write_files(directory, name, size):
+    video_path = os.path.join(directory, f"{name}.mp4")
+    preview_path = os.path.join(directory, f"{name}.png")
+    with open(video_path, "wb") as f:
+        f.write(os.urandom(size))
+    with open(preview_path, "wb") as f:
+        f.write(os.urandom(1024))
+    return video_path, preview_path
+
+
+def check_coalescing(args, work_dir, lock_stale_s):
+    cache = ResultCache(os.path.join(work_dir, f"coalesce-{lock_stale_s}"), lock_stale_s=lock_stale_s)
+    video_path, preview_path = write_files(work_dir, "generated", 1024)
+    generations = []
+    served = []
+    lock = threading.Lock()
+    start = time.monotonic()
+
+    def request():
+        entry, lease = cache.acquire("key", wait_timeout=args.generate_s * 10)
+        if entry is None:
+            with lock:
+                generations.append(time.monotonic() - start)
+            time.sleep(args.generate_s)
+            entry = cache.put("key", video_path, preview_path)
+            if lease:
+                lease.release()
+        with lock:
+            served.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=request) for _ in range(args.callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    late = max(served) - args.generate_s
+    print(f"  generation {args.generate_s:.1f}s, lock stale after {lock_stale_s:.1f}s: {len(generations)} generation(s) "
+          f"for {args.callers} callers, last served {late:.2f}s after the entry")
+    return len(generations) == 1 and len(served) == args.callers and late < 1.0
+
+
+def check_eviction(args, work_dir):
+    entry_bytes = args.entry_kb * 1024 + 1024
+    cache = ResultCache(os.path.join(work_dir, "evict"), max_bytes=entry_bytes * (args.entries // 5))
+    video_path, preview_path = write_files(work_dir, "clip", args.entry_kb * 1024)
+    puts = []
+    for i in range(args.entries):
+        begin = time.perf_counter()
+        cache.put(f"{i:064x}", video_path, preview_path)
+        puts.append((time.perf_counter() - begin) * 1000)
+        cache.get(f"{0:064x}")
+        # Directory mtimes are the recency order; keep successive puts apart
+        time.sleep(0.002)
+    kept = [i for i in range(args.entries) if cache.get(f"{i:064x}")]
+    size = cache.size()
+    put = latency_summary(puts)
+    print(f"  {len(kept)}/{args.entries} entries kept, {size / 1024:.0f}/{cache.max_bytes / 1024:.0f} KB, "
+          f"put p50 {put['p50']:.2f} ms p99 {put['p99']:.2f} ms")
+    newest = list(range(args.entries - len(kept) + 1, args.entries))
+    return size <= cache.max_bytes and 0 in kept and kept[1:] == newest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=8)
+    parser.add_argument("--generate-s", type=float, default=1.0, help="Simulated generation time")
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--entry-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-result-cache-")
+    try:
+        print("coalescing:")
+        results = {"coalescing": check_coalescing(args, work_dir, args.generate_s * 4),
+                   "heartbeat": check_coalescing(args, work_dir, args.generate_s / 4)}
+        print("eviction:")
+        results["eviction"] = check_eviction(args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    failed = [name for name, ok in results.items() if not ok]
+    if failed:
+        raise SystemExit(f"failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Check segment planning and stitching on synthetic frames, and that memory stays flat with length.
+
+Planning: for every valid length up to --max-total, segments must be valid
+(4k+1) frame counts within the generation limit, neighbours must share the
+overlap, and the plan must cover the requested length. Cross-fading: segments
+of flat frames whose values encode (segment, frame) are joined and every
+output frame compared with the expected blend. Stitching: synthetic segment
+clips are encoded through ffmpeg, then stitched at 2, 4 and 8 segments while
+the peak RSS is recorded; it should not grow with the number of segments.
+Last, a segmented job runs end to end against a mock ComfyUI that encodes
+real clips.
+
+    python -m benchmarks.bench_segments [--width 480] [--height 272] [--frames 57]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from mock_comfy import MockComfyServer
+from mock_runpod import load_handler
+from output_encoding import PeakMemory
+from video_segments import crossfade, plan_segments, read_frames, stitch_videos, write_frames
+
+
+def check_plans(max_total, overlap):
+    failures = []
+    for max_frames in (33, 65, 97, 129):
+        for total in range(1, max_total + 1, 4):
+            segments = plan_segments(total, max_frames, overlap)
+            end = segments[-1].start + segments[-1].num_frames
+            if end < total or end > total + 4 * len(segments):
+                failures.append(f"{total}/{max_frames}: covers {end} frames")
+            for previous, segment in zip(segments, segments[1:]):
+                if previous.start + previous.num_frames - segment.start != overlap:
+                    failures.append(f"{total}/{max_frames}: segments {previous} and {segment} do not share {overlap}")
+            for segment in segments:
+                if segment.num_frames > max_frames or (segment.num_frames - 1) % 4:
+                    failures.append(f"{total}/{max_frames}: invalid segment {segment}")
+    return failures
+
+
+def check_crossfade(overlap):
+    # The third segment is shorter than two overlaps, so its blended frames are blended again
+    lengths = (40, 25, overlap + 1, 40)
+    segments = [[np.full((2, 2, 3), 60 * s + i, dtype=np.uint8) for i in range(n)] for s, n in enumerate(lengths)]
+    expected = []
+    for s, frames in enumerate(segments):
+        values = [int(frame[0, 0, 0]) for frame in frames]
+        if s:
+            tail = expected[-overlap:]
+            del expected[-overlap:]
+            for i, value in enumerate(tail):
+                weight = (i + 1) / (overlap + 1)
+                values[i] = round(value * (1 - weight) + values[i] * weight)
+        expected.extend(values)
+    joined = [int(frame[0, 0, 0]) for frame in crossfade(iter(segments), overlap)]
+    if joined != expected:
+        return [f"crossfade: got {joined}, expected {expected}"]
+    return []
+
+
+def synthetic_clip(path, index, frames, width, height):
+    def generate():
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        for i in range(frames):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            frame[..., 0] = (y + 8 * i) % 256
+            frame[..., 1] = 60 * index % 256
+            frame[..., 2] = 255 - y
+            yield frame
+    write_frames(path, generate(), width, height, 24)
+
+
+def stitch_memory(args, work_dir):
+    overlap = 15
+    clips = []
+    for index in range(8):
+        path = os.path.join(work_dir, f"segment_{index}.mp4")
+        synthetic_clip(path, index, args.frames, args.width, args.height)
+        clips.append(path)
+    failures = []
+    peaks = []
+    for count in (2, 4, 8):
+        output_path = os.path.join(work_dir, f"stitched_{count}.mp4")
+        memory = PeakMemory().start()
+        start = time.perf_counter()
+        written = stitch_videos(clips[:count], output_path, overlap)
+        elapsed = time.perf_counter() - start
+        peak = memory.report()["peak_rss_mb"]
+        peaks.append(peak)
+        decoded = sum(1 for _ in read_frames(output_path))
+        expected = count * args.frames - (count - 1) * overlap
+        print(f"  {count} segments: {written} frames in {elapsed:5.2f}s, peak RSS {peak:6.1f} MB")
+        if written != expected or decoded != expected:
+            failures.append(f"{count} segments: wrote {written}, decoded {decoded}, expected {expected}")
+    frame_mb = args.width * args.height * 3 / 1024 ** 2
+    if peaks[-1] - peaks[0] > 4 * overlap * frame_mb:
+        failures.append(f"peak RSS grew from {peaks[0]} to {peaks[-1]} MB with the number of segments")
+    return failures
+
+
+def check_job(work_dir):
+    output_dir = os.path.join(work_dir, "comfy")
+    server = MockComfyServer(output_dir=output_dir, speed=0.002, encode_videos=True).start()
+    worker = load_handler(server.address, output_dir, "bench_segments", env={"MAX_GENERATION_FRAMES": "65"})
+    output = worker({"id": "bench-segmented", "input": {
+        "prompt": "a red panda", "target_width": 960, "target_height": 544, "num_frames": 201,
+        "segmented": True, "video_index": 1, "result_cache": "bypass"}})
+    server.stop()
+    if "error" in output:
+        return [f"segmented job failed: {output['error']}"]
+    segments = output["segments"]
+    print(f"  segmented job: {segments['count']} segments of {segments['frames']} frames, "
+          f"stitched in {output['timings']['phases']['stitch']:.2f}s")
+    leftover = [name for name in os.listdir(output_dir) if name.endswith(".mp4") and "stitched" not in name]
+    return [f"segment files left behind: {leftover}"] if leftover else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=480)
+    parser.add_argument("--height", type=int, default=272)
+    parser.add_argument("--frames", type=int, default=57, help="Frames per synthetic segment clip")
+    parser.add_argument("--max-total", type=int, default=1025)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-segments-")
+    try:
+        failures = check_plans(args.max_total, 8) + check_crossfade(8)
+        print(f"planning and cross-fade checks: {'ok' if not failures else 'FAILED'}")
+        print("stitching synthetic clips:")
+        failures += stitch_memory(args, work_dir)
+        failures += check_job(work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if failures:
+        raise SystemExit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
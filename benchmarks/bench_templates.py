@@ -0,0 +1,73 @@
+"""Compare per-job workflow render cost: compiled templates vs the old per-job path.
+
+The old path (HunyuanGenerator) re-read the template from disk for every job,
+ran one str.replace pass per placeholder and json.loads'd the result.
+
+    python -m benchmarks.bench_templates [--iterations 20000]
+"""
+import argparse
+import json
+import os
+import timeit
+
+from workflow_templates import WorkflowTemplate
+
+WORKFLOW_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "workflows", "small_model_no_block_swapping.json")
+
+PARAMS = {
+    "prompt": "high quality nature video of a red panda balancing on a bamboo stick. "
+              "The scene appears to be real life footage with a hyper-realistic art style.",
+    "negative_prompt": "",
+    "base_width": 856,
+    "base_height": 488,
+    "target_width": 1280,
+    "target_height": 720,
+    "num_frames": 73,
+    "fps": 24,
+    "num_inference_steps": 15,
+    "guidance_scale": 10,
+    "flow_shift": 8,
+}
+
+
+def legacy_render(params):
+    """The pre-compilation HunyuanGenerator construction plus update_workflow"""
+    with open(WORKFLOW_PATH, 'r') as f:
+        workflow_str = f.read()
+    replacements = {
+        '|prompt|': json.dumps(params.get('prompt')),
+        '|base_width|': str(params.get('base_width')),
+        '|base_height|': str(params.get('base_height')),
+        '|target_width|': str(params.get('target_width')),
+        '|target_height|': str(params.get('target_height')),
+        '|num_frames|': str(params.get('num_frames')),
+        '|num_inference_steps|': str(params.get('num_inference_steps')),
+        '|fps|': str(params.get('fps')),
+        '|guidance_scale|': str(params.get('guidance_scale')),
+        '|flow_shift|': str(params.get('flow_shift'))
+    }
+    for placeholder, value in replacements.items():
+        workflow_str = workflow_str.replace(placeholder, value)
+    return json.loads(workflow_str)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    template = WorkflowTemplate.from_file(WORKFLOW_PATH)
+    if template.render(PARAMS) != legacy_render(PARAMS):
+        raise SystemExit("Compiled render does not match the legacy render")
+
+    results = {}
+    for name, fn in (("legacy", lambda: legacy_render(PARAMS)), ("compiled", lambda: template.render(PARAMS))):
+        best = min(timeit.repeat(fn, number=args.iterations, repeat=5))
+        results[name] = best / args.iterations * 1e6
+        print(f"{name:>9}: {results[name]:8.2f} us/render")
+    print(f"  speedup: {results['legacy'] / results['compiled']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
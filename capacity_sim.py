@@ -0,0 +1,410 @@
+"""Discrete-event simulator for sizing the serverless endpoint.
+
+Replays a job arrival trace, or draws one at a given rate, against simulated
+workers and reports queue latency, utilization and cost. It needs no GPU and
+no endpoint, so worker counts and idle timeouts can be compared in seconds.
+Each job's time on a worker is made of:
+
+- generation: the cost model's prediction for the settings run_job would pick
+  (plan_generation's base size, the frame count the low-memory template fits
+  in --vram-gb up to --max-generation-frames, the template's RIFE and
+  upscaling), scaled by how far recorded jobs ran from their prediction
+- handler overhead: the part of a recorded job's total_s that none of the cost
+  model's stages account for
+- transfer: sending the base64 payload back to RunPod, which the worker does
+  before it takes its next job; none for url and hls jobs
+
+Workers scale the way an endpoint's do. A queued job that no idle or booting
+worker will pick up boots a new worker, up to --workers, and pays its cold
+start: start.sh to the end of warm-up, as in worker_boot records. A worker
+idle for --idle-timeout shuts down. --min-workers stay up throughout, like
+active workers. Every second a worker is up is billed, boot and idle included.
+
+Calibrate from the JSON lines TIMINGS_LOG_PATH collects (worker logs work
+too), and replay a loadtest.py results file for its arrival times, inputs and
+payload sizes. Without records the priors below are used:
+
+    python capacity_sim.py --timings timings.jsonl --rate 0.05 --jobs 500 --workers 1,2,4,8
+    python capacity_sim.py --timings timings.jsonl --trace loadtest_results.json --workers 3 --idle-timeout 30
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import random
+from collections import deque
+
+from cost_model import CostModel, features, stage_seconds
+from dimension_planner import plan_generation
+from loadtest import COST_PER_SECOND, DEFAULT_MATRIX, expand_matrix, latency_summary
+from memory_model import DEFAULT_MAX_GENERATION_FRAMES, DEFAULT_VRAM_GB, frame_limit, variant_profile
+from stage_timings import BOOT_EVENT, read_records
+from workflow_templates import WorkflowTemplate
+
+# Priors used until records are given
+DEFAULT_COLD_START_S = 60.0
+DEFAULT_OVERHEAD_S = 0.5
+# h265 at about 0.1 bits per pixel, base64 encoded
+DEFAULT_PAYLOAD_BYTES_PER_MPF = 17000
+DEFAULT_BANDWIDTH_MBPS = 100.0
+DEFAULT_IDLE_TIMEOUT_S = 5.0
+# What the shipped templates run with when a job sets neither a tier nor a deadline
+DEFAULT_RIFE_MULTIPLIER = 2
+DEFAULT_UPSCALE = True
+NO_PAYLOAD_OUTPUT_MODES = ("url", "hls")
+# The image's default COMFY_LOW_MEMORY_WORKFLOW (dockerfile), whose profile caps the frame count
+DEFAULT_LOW_MEMORY_WORKFLOW = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflows",
+                                           "small_model_low_memory.json")
+
+
+def generation_frame_limit(workflow_path=DEFAULT_LOW_MEMORY_WORKFLOW, vram_gb=DEFAULT_VRAM_GB,
+                           max_generation_frames=DEFAULT_MAX_GENERATION_FRAMES):
+    """run_job's frame_limit for a worker whose lowest-memory template is workflow_path"""
+    profile = variant_profile(WorkflowTemplate.from_file(workflow_path).workflow)
+    return frame_limit(profile, vram_gb, max_generation_frames)
+
+
+DEFAULT_FRAME_LIMIT = generation_frame_limit()
+
+
+def job_settings(job_input, rife_multiplier=DEFAULT_RIFE_MULTIPLIER, upscale=DEFAULT_UPSCALE,
+                 frame_limit=DEFAULT_FRAME_LIMIT):
+    """Cost model settings for one job input, as run_job would plan them"""
+    target_width = job_input.get("target_width", 512)
+    target_height = job_input.get("target_height", 288)
+    plan = plan_generation(target_width, target_height, job_input.get("num_frames", 17), frame_limit=frame_limit)
+    return {"base_width": plan.base_width, "base_height": plan.base_height, "num_frames": plan.num_frames,
+            "target_width": target_width, "target_height": target_height,
+            "steps": job_input.get("num_inference_steps", 15), "teacache": 0.0,
+            "rife_multiplier": rife_multiplier, "upscale": upscale}
+
+
+class Calibration:
+    """The cost model plus the samples the simulator draws from; empty samples fall back to the priors"""
+
+    def __init__(self, model=None, cold_start_s=(), overhead_s=(), generation_ratio=(), payload_bytes_per_mpf=()):
+        self.model = model or CostModel()
+        self.cold_start_s = list(cold_start_s)
+        self.overhead_s = list(overhead_s)
+        # Recorded generation time over the model's prediction, one per job
+        self.generation_ratio = list(generation_ratio)
+        self.payload_bytes_per_mpf = list(payload_bytes_per_mpf)
+
+    @classmethod
+    def from_records(cls, records, boots=(), loadtest_jobs=(), model=None, frame_limit=DEFAULT_FRAME_LIMIT):
+        """Calibrate from job_timings and worker_boot records and loadtest.py job records.
+
+        Without a model, one is fitted from the records (the prior if there are too few).
+        frame_limit is that of the workers the loadtest jobs ran on.
+        """
+        records = list(records)
+        model = model or CostModel.fit(records)
+        overhead, ratios = [], []
+        for record in records:
+            timings = record.get("timings") or {}
+            settings = timings.get("settings")
+            # The same jobs the cost model is fitted from
+            if record.get("status") != "success" or record.get("cached") or not settings or not timings.get("by_class"):
+                continue
+            if settings.get("segments", 1) > 1:
+                continue
+            generation = sum(stage_seconds(timings).values())
+            overhead.append(max(0.0, timings["total_s"] - generation))
+            predicted = model.predict(settings)["total_s"]
+            if predicted > 0:
+                ratios.append(generation / predicted)
+        cold_starts = [boot["cold_start_s"] for boot in boots if boot.get("warmup_ok") and boot.get("cold_start_s")]
+        payloads = []
+        for job in loadtest_jobs:
+            if job.get("status") != "COMPLETED" or not job.get("output_bytes"):
+                continue
+            if job["params"].get("output_mode") in NO_PAYLOAD_OUTPUT_MODES:
+                continue
+            payloads.append(job["output_bytes"] / features(job_settings(job["params"], frame_limit=frame_limit))["output_mpf"])
+        return cls(model, cold_starts, overhead, ratios, payloads)
+
+    def summary(self):
+        def describe(samples, prior):
+            if not samples:
+                return {"prior": prior}
+            return {"samples": len(samples), "mean": round(sum(samples) / len(samples), 3)}
+
+        return {
+            "cost_model_samples": self.model.samples,
+            "cold_start_s": describe(self.cold_start_s, DEFAULT_COLD_START_S),
+            "overhead_s": describe(self.overhead_s, DEFAULT_OVERHEAD_S),
+            "generation_ratio": describe(self.generation_ratio, 1.0),
+            "payload_bytes_per_mpf": describe(self.payload_bytes_per_mpf, DEFAULT_PAYLOAD_BYTES_PER_MPF),
+        }
+
+
+class SimJob:
+    def __init__(self, index, arrival, execution, transfer):
+        self.index = index
+        self.arrival = arrival
+        # Seconds in the handler, then returning the output
+        self.execution = execution
+        self.transfer = transfer
+        self.start = None
+        self.worker = None
+        self.cold = False
+
+
+def make_jobs(arrivals, inputs, calibration, bandwidth_mbps=DEFAULT_BANDWIDTH_MBPS, seed=0,
+              frame_limit=DEFAULT_FRAME_LIMIT):
+    """SimJobs for job inputs arriving at the given offsets in seconds.
+
+    Each job's times are drawn here, so simulations with different worker
+    counts see exactly the same jobs. frame_limit is the simulated workers'
+    (generation_frame_limit).
+    """
+    rng = random.Random(seed)
+    predictions = {}
+    jobs = []
+    for index, (arrival, job_input) in enumerate(zip(arrivals, inputs)):
+        settings = job_settings(job_input, frame_limit=frame_limit)
+        key = json.dumps(settings, sort_keys=True)
+        if key not in predictions:
+            predictions[key] = calibration.model.predict(settings)["total_s"]
+        generation = predictions[key] * (rng.choice(calibration.generation_ratio) if calibration.generation_ratio else 1.0)
+        overhead = rng.choice(calibration.overhead_s) if calibration.overhead_s else DEFAULT_OVERHEAD_S
+        transfer = 0.0
+        if job_input.get("output_mode") not in NO_PAYLOAD_OUTPUT_MODES:
+            rate = rng.choice(calibration.payload_bytes_per_mpf) if calibration.payload_bytes_per_mpf \
+                else DEFAULT_PAYLOAD_BYTES_PER_MPF
+            transfer = rate * features(settings)["output_mpf"] * 8 / (bandwidth_mbps * 1e6)
+        jobs.append(SimJob(index, arrival, generation + overhead, transfer))
+    return jobs
+
+
+def poisson_arrivals(count, rate, arrival="poisson", seed=0):
+    """Offsets in seconds of count jobs arriving at rate jobs/second"""
+    rng = random.Random(seed)
+    offsets, now = [], 0.0
+    for _ in range(count):
+        offsets.append(now)
+        now += rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+    return offsets
+
+
+def load_trace(path):
+    """Arrival offsets and job inputs from a loadtest.py results file, plus its job records"""
+    with open(path) as f:
+        jobs = sorted(json.load(f)["jobs"], key=lambda job: job["submitted_at"])
+    start = jobs[0]["submitted_at"] if jobs else 0.0
+    return [job["submitted_at"] - start for job in jobs], [job["params"] for job in jobs], jobs
+
+
+class SimWorker:
+    def __init__(self, index):
+        self.index = index
+        self.state = "off"
+        self.up_since = None
+        self.idle_since = None
+        self.busy_s = 0.0
+        self.billed_s = 0.0
+        self.boots = 0
+        # Booted since its last job, so the next job waited for the cold start
+        self.cold = False
+
+
+class Simulation:
+    """One run of jobs through an endpoint with up to max_workers workers"""
+
+    def __init__(self, calibration, max_workers, idle_timeout=DEFAULT_IDLE_TIMEOUT_S, min_workers=0, seed=0):
+        if not 0 <= min_workers <= max_workers or max_workers < 1:
+            raise ValueError(f"Need 0 <= min_workers ({min_workers}) <= max_workers ({max_workers}) and at least one worker")
+        self.calibration = calibration
+        self.idle_timeout = idle_timeout
+        self.min_workers = min_workers
+        self.rng = random.Random(seed)
+        self.workers = [SimWorker(index) for index in range(max_workers)]
+        self.queue = deque()
+        self.events = []
+        self.sequence = itertools.count()
+        self.now = 0.0
+        self.peak_up = 0
+        # Active workers are up and warm before the first job
+        for worker in self.workers[:min_workers]:
+            worker.state, worker.up_since, worker.idle_since = "idle", 0.0, 0.0
+
+    def _schedule(self, at, action, *args):
+        heapq.heappush(self.events, (at, next(self.sequence), action, args))
+
+    def _up(self):
+        return [worker for worker in self.workers if worker.state != "off"]
+
+    def _cold_start(self):
+        samples = self.calibration.cold_start_s
+        return self.rng.choice(samples) if samples else DEFAULT_COLD_START_S
+
+    def _dispatch(self):
+        idle = [worker for worker in self.workers if worker.state == "idle"]
+        while self.queue and idle:
+            self._start(idle.pop(0), self.queue.popleft())
+        # Boot a worker for every queued job no booting worker will take
+        booting = sum(1 for worker in self.workers if worker.state == "booting")
+        for worker in self.workers:
+            if len(self.queue) <= booting:
+                break
+            if worker.state == "off":
+                worker.state, worker.up_since, worker.cold = "booting", self.now, True
+                worker.boots += 1
+                booting += 1
+                self._schedule(self.now + self._cold_start(), self._booted, worker)
+        self.peak_up = max(self.peak_up, len(self._up()))
+
+    def _start(self, worker, job):
+        job.start, job.worker, job.cold = self.now, worker.index, worker.cold
+        worker.state, worker.cold = "busy", False
+        worker.busy_s += job.execution + job.transfer
+        self._schedule(self.now + job.execution + job.transfer, self._finished, worker)
+
+    def _idle(self, worker):
+        worker.state, worker.idle_since = "idle", self.now
+        self._dispatch()
+        if worker.state == "idle":
+            self._schedule(self.now + self.idle_timeout, self._idle_check, worker, self.now)
+
+    def _booted(self, worker):
+        self._idle(worker)
+
+    def _finished(self, worker):
+        self._idle(worker)
+
+    def _idle_check(self, worker, since):
+        if worker.state == "idle" and worker.idle_since == since and len(self._up()) > self.min_workers:
+            worker.state = "off"
+            worker.billed_s += self.now - worker.up_since
+
+    def _arrive(self, job):
+        self.queue.append(job)
+        self._dispatch()
+
+    def run(self, jobs):
+        for job in jobs:
+            self._schedule(job.arrival, self._arrive, job)
+        while self.events:
+            self.now, _, action, args = heapq.heappop(self.events)
+            action(*args)
+        # Workers still up are the active ones; bill them until the last job finished
+        end = max((job.start + job.execution + job.transfer for job in jobs), default=0.0)
+        for worker in self._up():
+            worker.billed_s += max(end, self.now) - worker.up_since
+        return jobs
+
+
+def summarize(jobs, workers, cost_per_second=COST_PER_SECOND):
+    queue = [job.start - job.arrival for job in jobs]
+    execution = [job.execution for job in jobs]
+    end_to_end = [job.start - job.arrival + job.execution + job.transfer for job in jobs]
+    billed = sum(worker.billed_s for worker in workers)
+    busy = sum(worker.busy_s for worker in workers)
+    span = max((job.start + job.execution + job.transfer for job in jobs), default=0.0)
+    return {
+        "jobs": len(jobs),
+        "span_s": round(span, 3),
+        "throughput_jobs_per_min": round(len(jobs) / span * 60, 3) if span else None,
+        "latency_s": {
+            "queue": latency_summary(queue),
+            "execution": latency_summary(execution),
+            "end_to_end": latency_summary(end_to_end),
+        },
+        "cold_starts": sum(worker.boots for worker in workers),
+        "cold_start_jobs": sum(1 for job in jobs if job.cold),
+        "workers_used": sum(1 for worker in workers if worker.billed_s),
+        "utilization": round(busy / billed, 4) if billed else None,
+        "cost": {
+            "cost_per_second": cost_per_second,
+            "billed_worker_s": round(billed, 3),
+            "busy_worker_s": round(busy, 3),
+            "usd": round(billed * cost_per_second, 4),
+            "usd_per_job": round(billed * cost_per_second / len(jobs), 4) if jobs else None,
+        },
+    }
+
+
+def simulate(jobs, calibration, max_workers, idle_timeout=DEFAULT_IDLE_TIMEOUT_S, min_workers=0,
+             cost_per_second=COST_PER_SECOND, seed=0):
+    """Run fresh copies of jobs through one endpoint configuration and summarize it"""
+    jobs = [SimJob(job.index, job.arrival, job.execution, job.transfer) for job in jobs]
+    simulation = Simulation(calibration, max_workers, idle_timeout, min_workers, seed)
+    simulation.run(jobs)
+    summary = summarize(jobs, simulation.workers, cost_per_second)
+    summary["peak_workers_up"] = simulation.peak_up
+    return summary
+
+
+def print_summary(workers, summary):
+    queue, end_to_end, cost = summary["latency_s"]["queue"], summary["latency_s"]["end_to_end"], summary["cost"]
+    print(f"  {workers:>3} workers: queue p50 {queue['p50']:8.2f}s  p95 {queue['p95']:8.2f}s  "
+          f"p99 {queue['p99']:8.2f}s | end-to-end p95 {end_to_end['p95']:8.2f}s | "
+          f"util {summary['utilization'] * 100:5.1f}% | {summary['cold_starts']:4} cold starts | "
+          f"${cost['usd']:.2f} (${cost['usd_per_job']:.4f}/job)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate endpoint capacity from recorded job timings")
+    parser.add_argument("--timings", nargs="*", default=[], help="JSON-lines job timing files (worker logs work too)")
+    parser.add_argument("--model", help="Fitted cost model JSON; fitted from --timings if omitted")
+    arrivals = parser.add_mutually_exclusive_group(required=True)
+    arrivals.add_argument("--trace", help="loadtest.py results file to replay")
+    arrivals.add_argument("--rate", type=float, help="Arrival rate in jobs/second")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--jobs", type=int, default=1000, help="Jobs to draw with --rate")
+    parser.add_argument("--matrix", help="JSON file with base, prompts and matrix keys for --rate jobs "
+                                         "(default: bestSettings sweeps)")
+    parser.add_argument("--workers", default="1", help="Max workers, or a comma-separated list to compare")
+    parser.add_argument("--min-workers", type=int, default=0, help="Workers kept up throughout (active workers)")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT_S)
+    parser.add_argument("--bandwidth-mbps", type=float, default=DEFAULT_BANDWIDTH_MBPS,
+                        help="Worker upload bandwidth for returning payloads")
+    parser.add_argument("--cost-per-second", type=float, default=COST_PER_SECOND)
+    parser.add_argument("--workflow", default=DEFAULT_LOW_MEMORY_WORKFLOW,
+                        help="The workers' lowest-memory workflow template, which bounds the frame count")
+    parser.add_argument("--vram-gb", type=float, default=DEFAULT_VRAM_GB, help="VRAM a job may use")
+    parser.add_argument("--max-generation-frames", type=int, default=DEFAULT_MAX_GENERATION_FRAMES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the calibration and every summary to this JSON file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    records = list(read_records(args.timings))
+    boots = list(read_records(args.timings, BOOT_EVENT))
+    loadtest_jobs = []
+    if args.trace:
+        arrivals, inputs, loadtest_jobs = load_trace(args.trace)
+    else:
+        spec = DEFAULT_MATRIX
+        if args.matrix:
+            with open(args.matrix) as f:
+                spec = json.load(f)
+        inputs = list(itertools.islice(itertools.cycle(expand_matrix(spec)), args.jobs))
+        arrivals = poisson_arrivals(len(inputs), args.rate, args.arrival, args.seed)
+    limit = generation_frame_limit(args.workflow, args.vram_gb, args.max_generation_frames)
+    calibration = Calibration.from_records(records, boots, loadtest_jobs,
+                                           CostModel.load(args.model) if args.model else None, limit)
+    jobs = make_jobs(arrivals, inputs, calibration, args.bandwidth_mbps, args.seed, limit)
+
+    print(f"Simulating {len(jobs)} jobs over {arrivals[-1] if arrivals else 0:.0f}s, idle timeout "
+          f"{args.idle_timeout:g}s, {args.min_workers} active workers")
+    print(f"  calibration: {json.dumps(calibration.summary())}")
+    results = {}
+    for workers in (int(value) for value in args.workers.split(",")):
+        results[workers] = simulate(jobs, calibration, workers, args.idle_timeout, args.min_workers,
+                                    args.cost_per_second, args.seed)
+        print_summary(workers, results[workers])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"calibration": calibration.summary(), "load": {"trace": args.trace, "rate": args.rate,
+                                                                      "arrival": args.arrival, "jobs": len(jobs)},
+                       "idle_timeout": args.idle_timeout, "min_workers": args.min_workers,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
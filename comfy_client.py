@@ -0,0 +1,416 @@
+"""Pooled, keep-alive client for the ComfyUI HTTP and websocket API.
+
+One ComfyClient is created per worker process and reused across jobs, so every
+control-plane call rides the same pooled `requests.Session` connection instead
+of opening a fresh TCP connection. Each method has its own timeout and retry
+policy, and per-method latency counters make the control-plane overhead of a
+job visible. Execution events arrive over one shared websocket and are routed
+to the waiting job by prompt_id, so several jobs can be in flight at once.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import requests
+import websocket
+from requests.adapters import HTTPAdapter
+
+# timeout is (connect, read) seconds; retry_on lists the exceptions worth retrying.
+# POST /prompt is not idempotent, so it only retries when the connection was never made.
+CallPolicy = namedtuple("CallPolicy", "timeout retries backoff retry_on")
+
+RETRY_CONNECT = (requests.ConnectionError, requests.Timeout)
+RETRY_CONNECT_ONLY = (requests.ConnectTimeout,)
+
+DEFAULT_POLICIES = {
+    "root": CallPolicy(timeout=(0.5, 2), retries=0, backoff=0, retry_on=RETRY_CONNECT),
+    "system_stats": CallPolicy(timeout=(1, 5), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+    "prompt": CallPolicy(timeout=(1, 30), retries=2, backoff=0.25, retry_on=RETRY_CONNECT_ONLY),
+    "history": CallPolicy(timeout=(1, 30), retries=3, backoff=0.25, retry_on=RETRY_CONNECT),
+    "history_post": CallPolicy(timeout=(1, 10), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+    "queue": CallPolicy(timeout=(1, 10), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+    "queue_post": CallPolicy(timeout=(1, 10), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+    "interrupt": CallPolicy(timeout=(1, 10), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+    "view": CallPolicy(timeout=(1, 120), retries=2, backoff=0.25, retry_on=RETRY_CONNECT),
+    "free": CallPolicy(timeout=(1, 30), retries=2, backoff=0.1, retry_on=RETRY_CONNECT),
+}
+
+WS_RECV_TIMEOUT_S = 30
+POLLING_INTERVAL_S = 0.25
+POLLING_MAX_INTERVAL_S = 2.0
+# How often a wait checks its stop event while no events arrive
+STOP_CHECK_INTERVAL_S = 0.1
+# Checks on a prompt that may fail in a row, each after its own retries, before ComfyUI is given up on
+MAX_FAILED_CHECKS = 3
+
+
+class PromptLost(Exception):
+    """ComfyUI stopped answering, or restarted and forgot the prompt; waiting longer cannot finish it"""
+
+
+def is_terminal_event(event, prompt_id):
+    """Check whether a websocket event marks the end of prompt_id's execution"""
+    data = event.get("data") or {}
+    if data.get("prompt_id") != prompt_id:
+        return False
+    event_type = event.get("type")
+    if event_type in ("execution_success", "execution_error", "execution_interrupted"):
+        return True
+    return event_type == "executing" and data.get("node") is None
+
+
+def execution_error_message(entry):
+    """Pull a readable error out of a finished history entry's status messages"""
+    for message_type, data in entry.get("status", {}).get("messages", []):
+        if message_type == "execution_error":
+            return f"{data.get('node_type')} ({data.get('node_id')}): {data.get('exception_message', '').strip()}"
+        if message_type == "execution_interrupted":
+            return "Execution interrupted"
+    return "Workflow produced no outputs"
+
+
+def is_out_of_memory(entry):
+    """Check whether a finished history entry failed with a CUDA out-of-memory error"""
+    for message_type, data in entry.get("status", {}).get("messages", []):
+        if message_type == "execution_error":
+            text = f"{data.get('exception_type', '')} {data.get('exception_message', '')}"
+            return "OutOfMemoryError" in text or "out of memory" in text.lower()
+    return False
+
+
+class EventDispatcher:
+    """One websocket per client id, with events routed to waiters by prompt_id.
+
+    ComfyUI keeps a single socket per client id (a second connection replaces
+    the first), so jobs running side by side in one worker share this socket
+    instead of opening their own. Events can arrive before the job that queued
+    the prompt starts watching it; they are buffered until it does. The socket
+    reconnects with backoff if it drops.
+    """
+
+    # Buffers for prompts nobody claimed (e.g. the /prompt response was lost) are dropped after this
+    UNCLAIMED_TTL_S = 600
+
+    def __init__(self, client, reconnect_delay=0.5, max_reconnect_delay=30.0):
+        self.client = client
+        self.url = f"ws://{client.host}/ws?clientId={client.client_id}"
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._connected = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def start(self, wait=2.0):
+        """Start the reader thread; returns whether the socket connected within wait seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="comfy-events")
+            self._thread.start()
+        return self._connected.wait(wait)
+
+    def watch(self, prompt_id):
+        """The event queue for prompt_id, including anything that arrived before this call"""
+        with self._lock:
+            entry = self._watches.get(prompt_id)
+            if entry is None:
+                entry = self._watches[prompt_id] = [queue.Queue(), time.monotonic(), True]
+            entry[2] = True
+            return entry[0]
+
+    def release(self, prompt_id):
+        with self._lock:
+            self._watches.pop(prompt_id, None)
+
+    def _dispatch(self, event):
+        prompt_id = (event.get("data") or {}).get("prompt_id")
+        if prompt_id is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            entry = self._watches.get(prompt_id)
+            if entry is None:
+                entry = self._watches[prompt_id] = [queue.Queue(), now, False]
+                for stale in [key for key, (_, created, claimed) in self._watches.items()
+                              if not claimed and now - created > self.UNCLAIMED_TTL_S]:
+                    del self._watches[stale]
+        entry[0].put(event)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            start = time.perf_counter()
+            try:
+                ws = websocket.create_connection(self.url, timeout=WS_RECV_TIMEOUT_S)
+            except (websocket.WebSocketException, OSError) as e:
+                self.client._record("ws_connect", time.perf_counter() - start, True)
+                print(f"runpod-worker-comfy - Websocket unavailable, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            self.client._record("ws_connect", time.perf_counter() - start, False)
+            self._connected.set()
+            delay = self.reconnect_delay
+            try:
+                while True:
+                    try:
+                        message = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    # Binary messages are latent previews
+                    if isinstance(message, str):
+                        try:
+                            event = json.loads(message)
+                        except ValueError:
+                            continue
+                        self._dispatch(event)
+            except (websocket.WebSocketException, OSError) as e:
+                print(f"runpod-worker-comfy - Websocket dropped, reconnecting: {e}")
+            finally:
+                self._connected.clear()
+                ws.close()
+
+
+class ComfyClient:
+    """Typed wrapper around one ComfyUI instance"""
+
+    def __init__(self, host, client_id=None, policies=None, pool_size=4):
+        self.host = host
+        self.base_url = f"http://{host}"
+        self.client_id = client_id or str(uuid.uuid4())
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._events_lock = threading.Lock()
+        self._events = None
+
+    # -- latency counters ---------------------------------------------------
+
+    def _record(self, name, seconds, failed):
+        with self._stats_lock:
+            stats = self._stats.setdefault(name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total_ms"] += seconds * 1000
+            stats["max_ms"] = max(stats["max_ms"], seconds * 1000)
+
+    def stats(self):
+        """Snapshot of the per-method latency counters"""
+        with self._stats_lock:
+            return {name: dict(values) for name, values in self._stats.items()}
+
+    def stats_since(self, snapshot):
+        """Counters accumulated since an earlier stats() snapshot (max_ms is lifetime)"""
+        delta = {}
+        for name, values in self.stats().items():
+            before = snapshot.get(name, {"calls": 0, "errors": 0, "total_ms": 0.0})
+            if values["calls"] == before["calls"]:
+                continue
+            delta[name] = {
+                "calls": values["calls"] - before["calls"],
+                "errors": values["errors"] - before["errors"],
+                "total_ms": round(values["total_ms"] - before["total_ms"], 3),
+                "max_ms": round(values["max_ms"], 3),
+            }
+        return delta
+
+    # -- HTTP plumbing ------------------------------------------------------
+
+    def _call(self, name, method, path, **kwargs):
+        policy = self.policies[name]
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.base_url + path, timeout=policy.timeout, **kwargs)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self._record(name, time.perf_counter() - start, True)
+                if attempt >= policy.retries or not isinstance(e, policy.retry_on):
+                    raise
+                attempt += 1
+                time.sleep(policy.backoff * attempt)
+                continue
+            self._record(name, time.perf_counter() - start, False)
+            return response
+
+    def is_reachable(self):
+        """Single cheap probe of the ComfyUI web root"""
+        try:
+            self._call("root", "GET", "/")
+            return True
+        except requests.RequestException:
+            return False
+
+    def wait_until_ready(self, retries=500, delay=50):
+        """Probe the server until it answers, sleeping delay ms between attempts"""
+        for i in range(retries):
+            if self.is_reachable():
+                return True
+            time.sleep(delay / 1000)
+        return False
+
+    def system_stats(self):
+        return self._call("system_stats", "GET", "/system_stats").json()
+
+    def prompt(self, workflow):
+        """Queue a workflow; returns ComfyUI's {"prompt_id", "number", "node_errors"}"""
+        return self._call("prompt", "POST", "/prompt", json={"prompt": workflow, "client_id": self.client_id}).json()
+
+    def history(self, prompt_id=None):
+        path = f"/history/{prompt_id}" if prompt_id else "/history"
+        return self._call("history", "GET", path).json()
+
+    def clear_history(self):
+        self._call("history_post", "POST", "/history", json={"clear": True})
+
+    def delete_history(self, prompt_ids):
+        self._call("history_post", "POST", "/history", json={"delete": list(prompt_ids)})
+
+    def queue(self):
+        """Running and pending prompts: {"queue_running": [...], "queue_pending": [...]}"""
+        return self._call("queue", "GET", "/queue").json()
+
+    def delete_from_queue(self, prompt_ids):
+        self._call("queue_post", "POST", "/queue", json={"delete": list(prompt_ids)})
+
+    def interrupt(self, prompt_id=None):
+        """Stop the running prompt; with prompt_id, only if that prompt is the one running.
+
+        ComfyUI versions without per-prompt interrupts ignore prompt_id, so check
+        /queue first when other jobs may be running.
+        """
+        self._call("interrupt", "POST", "/interrupt", json={"prompt_id": prompt_id} if prompt_id else {})
+
+    def free_memory(self):
+        """Ask ComfyUI to unload models and release cached VRAM"""
+        self._call("free", "POST", "/free", json={"unload_models": True, "free_memory": True})
+
+    def view(self, filename, subfolder="", folder_type="output"):
+        """Download an output file's bytes"""
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        return self._call("view", "GET", "/view", params=params).content
+
+    # -- completion ---------------------------------------------------------
+
+    def events(self):
+        """The shared event dispatcher for this client id, connected on first use"""
+        with self._events_lock:
+            if self._events is None:
+                self._events = EventDispatcher(self)
+                self._events.start()
+        return self._events
+
+    def _wait_for_events(self, events, prompt_id, deadline, on_event=None, stop=None):
+        """Consume prompt_id's events until it finishes; False if time ran out or stop was set"""
+        watch = events.watch(prompt_id)
+        failed = 0
+        try:
+            quiet_since = time.monotonic()
+            connected = events.connected
+            while time.monotonic() < deadline:
+                if stop is not None and stop.is_set():
+                    return False
+                # Once the socket (re)connects, check /history straight away rather than after a
+                # quiet stretch, as the prompt may have finished while it was down
+                reconnected = events.connected and not connected
+                connected = events.connected
+                # Without a socket, fall back to checking /history at the polling cadence
+                timeout = WS_RECV_TIMEOUT_S if connected else POLLING_MAX_INTERVAL_S
+                wait = 0.01 if reconnected else timeout if stop is None else STOP_CHECK_INTERVAL_S
+                try:
+                    event = watch.get(timeout=min(wait, max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    if time.monotonic() - quiet_since < timeout and not reconnected:
+                        continue
+                    quiet_since = time.monotonic()
+                    # Quiet stretches (tiled VAE decode, h265 encode) are expected, and events
+                    # sent while the socket was reconnecting are lost; check the completion
+                    # was not missed and ComfyUI still has the prompt, then keep listening
+                    try:
+                        if self._check_prompt(prompt_id) is not None:
+                            return True
+                        failed = 0
+                    except requests.RequestException as e:
+                        failed = self._failed_check(failed, e)
+                    continue
+                quiet_since = time.monotonic()
+                if on_event is not None:
+                    on_event(event)
+                if is_terminal_event(event, prompt_id):
+                    return True
+            return False
+        finally:
+            events.release(prompt_id)
+
+    def _check_prompt(self, prompt_id):
+        """prompt_id's history entry once it finished, None while it is queued or running.
+
+        Raises PromptLost if ComfyUI has it in neither its history nor its queue,
+        as after a restart.
+        """
+        history = self.history(prompt_id)
+        if prompt_id in history:
+            return history[prompt_id]
+        state = self.queue()
+        if any(item[1] == prompt_id for item in state.get("queue_running", []) + state.get("queue_pending", [])):
+            return None
+        # It may have finished between the two calls
+        history = self.history(prompt_id)
+        if prompt_id in history:
+            return history[prompt_id]
+        raise PromptLost(f"{self.host} has no record of prompt {prompt_id}; ComfyUI restarted")
+
+    def _failed_check(self, failed, error):
+        """Count a failed check; raises PromptLost once MAX_FAILED_CHECKS have failed in a row"""
+        print(f"runpod-worker-comfy - Error polling history: {error}")
+        failed += 1
+        if failed >= MAX_FAILED_CHECKS:
+            raise PromptLost(f"{self.host} stopped answering: {error}") from error
+        return failed
+
+    def _poll_history(self, prompt_id, deadline, stop=None):
+        """Poll /history with exponential backoff until prompt_id shows up, the deadline passes or stop is set"""
+        delay = POLLING_INTERVAL_S
+        failed = 0
+        while True:
+            try:
+                entry = self._check_prompt(prompt_id)
+                if entry is not None:
+                    return entry
+                failed = 0
+            except requests.RequestException as e:
+                failed = self._failed_check(failed, e)
+            if time.monotonic() + delay > deadline:
+                return None
+            if stop is None:
+                time.sleep(delay)
+            elif stop.wait(delay):
+                return None
+            delay = min(delay * 2, POLLING_MAX_INTERVAL_S)
+
+    def wait_for_prompt(self, prompt_id, events=None, timeout=None, on_event=None, stop=None):
+        """Wait for prompt_id to finish and return its history entry, or None on timeout.
+
+        With an EventDispatcher, completion is detected from websocket events and
+        on_event, if given, is called with each of this prompt's events; without
+        one, /history is polled. Setting the stop event (a threading.Event) ends
+        the wait early with None; the prompt itself keeps running. Raises
+        PromptLost if ComfyUI stops answering or no longer has the prompt.
+        """
+        deadline = time.monotonic() + timeout if timeout else float("inf")
+        if events is not None:
+            finished = self._wait_for_events(events, prompt_id, deadline, on_event, stop)
+            if not finished and stop is not None and stop.is_set():
+                return None
+        # Fetches the entry of a finished prompt, with the same error handling as polling
+        return self._poll_history(prompt_id, deadline, stop)
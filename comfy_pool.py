@@ -0,0 +1,150 @@
+"""One ComfyUI instance per GPU behind a least-loaded dispatcher.
+
+In multi-GPU mode start.sh runs one ComfyUI per visible GPU, each on its own
+port with its own output folder, and lists them in COMFY_HOSTS and
+COMFY_OUTPUT_SUBFOLDERS. The handler keeps one ComfyClient per instance and
+sends each workflow to the healthy instance with the fewest prompts in
+flight. Among equally loaded instances, the one whose last workflow used the
+same models wins, as ComfyUI keeps those loaded, and an idle instance with no
+models is preferred over evicting another workflow's. The worker is the only
+client of its instances, so the prompts it has in flight are each instance's
+queue depth, and dispatching needs no /queue calls.
+
+An instance whose API stops answering is marked down and gets no new work. A
+monitor thread probes it and brings it back once start.sh has restarted it.
+"""
+import json
+import os
+import threading
+import time
+
+from comfy_client import ComfyClient
+
+HEALTH_CHECK_INTERVAL_S = float(os.environ.get("HEALTH_CHECK_INTERVAL_S", "5"))
+# Nodes whose outputs ComfyUI keeps loaded between prompts
+LOADER_CLASSES = {"HyVideoModelLoader", "HyVideoVAELoader", "DownloadAndLoadHyVideoTextEncoder", "UpscaleModelLoader"}
+
+
+def model_key(workflow):
+    """The models a workflow loads; equal keys share loaded models"""
+    return tuple(sorted(json.dumps([node["class_type"], node.get("inputs", {})], sort_keys=True)
+                        for node in workflow.values() if node.get("class_type") in LOADER_CLASSES))
+
+
+class ComfyInstance:
+    """One ComfyUI process and what the dispatcher knows about it"""
+
+    def __init__(self, index, client, subfolder=""):
+        self.index = index
+        self.client = client
+        # Where this instance's outputs live, relative to the shared output path
+        self.subfolder = subfolder
+        self.in_flight = 0
+        # Models of the last workflow queued here, loaded by the time the next one runs
+        self.models = None
+        self.healthy = True
+        # Set once the instance answered at boot, after which jobs skip the readiness probe
+        self.ready = threading.Event()
+
+    def __repr__(self):
+        return f"ComfyInstance({self.index}, {self.client.host})"
+
+    def localize(self, outputs):
+        """outputs with file subfolders made relative to the shared output path"""
+        if not self.subfolder:
+            return outputs
+        localized = {}
+        for node_id, node_output in outputs.items():
+            localized[node_id] = {
+                key: [dict(item, subfolder=os.path.join(self.subfolder, item.get("subfolder", "")))
+                      if isinstance(item, dict) and "filename" in item else item for item in items]
+                if isinstance(items, list) else items
+                for key, items in node_output.items()
+            }
+        return localized
+
+
+class ComfyPool:
+    """Dispatches workflows across ComfyInstances"""
+
+    def __init__(self, hosts, subfolders=None):
+        if not hosts:
+            raise ValueError("At least one ComfyUI host is required")
+        subfolders = list(subfolders or [])
+        if subfolders and len(subfolders) != len(hosts):
+            raise ValueError(f"{len(subfolders)} output subfolders for {len(hosts)} ComfyUI hosts")
+        self.instances = [ComfyInstance(index, ComfyClient(host), subfolders[index] if subfolders else "")
+                          for index, host in enumerate(hosts)]
+        self.lock = threading.Lock()
+        self._monitor = None
+
+    def acquire(self, workflow, instance=None):
+        """Pick an instance for workflow and count it as in flight there; release() it when done.
+
+        With instance given, that one is used whatever its load, e.g. to warm it up.
+        """
+        key = model_key(workflow)
+        with self.lock:
+            if instance is None:
+                # With every instance down, still pick one; the caller waits for it to come back
+                candidates = [i for i in self.instances if i.healthy] or self.instances
+                # Least loaded first; then one with these models loaded, then one with none, so
+                # another workflow's models stay loaded for the next job that needs them
+                instance = min(candidates, key=lambda i: (i.in_flight, 0 if i.models == key else 2 if i.models else 1,
+                                                          i.index))
+            instance.in_flight += 1
+            instance.models = key
+        return instance
+
+    def release(self, instance):
+        with self.lock:
+            instance.in_flight -= 1
+
+    def forget_models(self, instance):
+        """The instance unloaded its models, e.g. after /free"""
+        with self.lock:
+            instance.models = None
+
+    def mark_down(self, instance):
+        with self.lock:
+            if not instance.healthy:
+                return
+            instance.healthy = False
+            instance.models = None
+        print(f"runpod-worker-comfy - ComfyUI at {instance.client.host} is down; dispatching around it")
+
+    def healthy(self):
+        with self.lock:
+            return [instance for instance in self.instances if instance.healthy]
+
+    def start_monitor(self, interval=HEALTH_CHECK_INTERVAL_S):
+        """Probe instances that are down until they answer again"""
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._watch, args=(interval,), daemon=True, name="comfy-health")
+            self._monitor.start()
+        return self
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            for instance in self.instances:
+                if not instance.healthy and instance.client.is_reachable():
+                    with self.lock:
+                        instance.healthy = True
+                    print(f"runpod-worker-comfy - ComfyUI at {instance.client.host} is back")
+
+    # -- latency counters, summed over instances ----------------------------
+
+    def stats(self):
+        return [instance.client.stats() for instance in self.instances]
+
+    def stats_since(self, snapshots):
+        total = {}
+        for instance, snapshot in zip(self.instances, snapshots):
+            for name, values in instance.client.stats_since(snapshot).items():
+                merged = total.setdefault(name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+                merged["calls"] += values["calls"]
+                merged["errors"] += values["errors"]
+                merged["total_ms"] = round(merged["total_ms"] + values["total_ms"], 3)
+                merged["max_ms"] = max(merged["max_ms"], values["max_ms"])
+        return total
@@ -0,0 +1,221 @@
+"""Runtime model of a job's execution time, fitted from recorded stage timings.
+
+A job is split into stages whose time grows with a known workload:
+
+- sampler: steps x generation megapixel-frames, divided by the TeaCache speedup
+- decode: VAE decode, Lucy sharpen and the final resize, per generation megapixel-frame
+- upscale: RealESRGAN, per generation megapixel-frame, only when upscaling is on
+- interpolate: RIFE, per target megapixel-frame for each inserted frame
+- encode: h265 VHS_VideoCombine, per output megapixel-frame
+- post: handler output read, base64/upload and preview, per output megapixel-frame
+- fixed: model loaders, text encoding and control-plane calls
+
+Each stage is linear in its features, so fitting is a least-squares solve per
+stage over the JSON timing records stage_timings writes (see
+JobTimer.set_settings). Stages without enough records keep the prior below,
+derived from the mock ComfyUI's 960x544x73 node table, so the model is usable
+before any calibration:
+
+    python cost_model.py fit timings.jsonl -o cost_model.json
+    COST_MODEL_PATH=cost_model.json python handler.py
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from stage_timings import read_records
+
+COST_MODEL_PATH = os.environ.get("COST_MODEL_PATH")
+
+# Sampler speedup per TeaCache rel_l1_thresh, measured at 960x544x73 (bestSettings)
+TEACACHE_SPEEDUPS = {0.0: 1.0, 0.05: 1.0, 0.1: 1.0, 0.12: 1.1, 0.15: 1.38, 0.2: 1.68, 0.25: 1.89, 0.3: 2.15}
+
+STAGE_FEATURES = {
+    "sampler": ("steps", "steps_mpf"),
+    "decode": ("const", "mpf"),
+    "upscale": ("upscale", "upscale_mpf"),
+    "interpolate": ("interpolated_mpf",),
+    "encode": ("const", "output_mpf"),
+    "post": ("const", "output_mpf"),
+    "fixed": ("const",),
+}
+
+DEFAULT_COEFFICIENTS = {
+    "sampler": [0.0, 0.1049],
+    "decode": [1.0, 0.63],
+    "upscale": [0.5, 0.393],
+    "interpolate": [0.1486],
+    "encode": [1.0, 0.0371],
+    "post": [0.2, 0.005],
+    "fixed": [3.0],
+}
+
+NODE_STAGES = {
+    "HyVideoSampler": "sampler",
+    "HyVideoDecode": "decode",
+    "Image Lucy Sharpen": "decode",
+    "Image Resize": "decode",
+    "UpscaleModelLoader": "upscale",
+    "ImageUpscaleWithModel": "upscale",
+    "RIFE VFI": "interpolate",
+    "VHS_VideoCombine": "encode",
+}
+POST_PHASES = ("output_read", "base64", "preview_resize", "preview_upload", "video_upload", "cache_store")
+FIXED_PHASES = ("server_check", "queue", "template_render")
+
+
+def teacache_speedup(threshold):
+    """Speedup for a TeaCache threshold, interpolated between measured points"""
+    if not threshold:
+        return 1.0
+    points = sorted(TEACACHE_SPEEDUPS.items())
+    return float(np.interp(threshold, [t for t, _ in points], [s for _, s in points]))
+
+
+def features(settings):
+    """Feature values for one job's settings.
+
+    settings needs base_width, base_height, num_frames, steps, target_width,
+    target_height and optionally teacache (threshold), rife_multiplier and upscale.
+    """
+    mpf = settings["base_width"] * settings["base_height"] * settings["num_frames"] / 1e6
+    target_mpf = settings["target_width"] * settings["target_height"] * settings["num_frames"] / 1e6
+    multiplier = settings.get("rife_multiplier", 1) or 1
+    upscale = 1.0 if settings.get("upscale") else 0.0
+    speedup = teacache_speedup(settings.get("teacache"))
+    return {
+        "const": 1.0,
+        "mpf": mpf,
+        "steps": settings["steps"] / speedup,
+        "steps_mpf": settings["steps"] * mpf / speedup,
+        "upscale": upscale,
+        "upscale_mpf": upscale * mpf,
+        "interpolated_mpf": (multiplier - 1) * target_mpf,
+        "output_mpf": multiplier * target_mpf,
+    }
+
+
+def stage_seconds(timings):
+    """Split a job's recorded timings into the model's stages"""
+    stages = dict.fromkeys(STAGE_FEATURES, 0.0)
+    for class_type, seconds in timings.get("by_class", {}).items():
+        stages[NODE_STAGES.get(class_type, "fixed")] += seconds
+    for phase, seconds in timings.get("phases", {}).items():
+        if phase in POST_PHASES:
+            stages["post"] += seconds
+        elif phase in FIXED_PHASES:
+            stages["fixed"] += seconds
+    return stages
+
+
+class CostModel:
+    def __init__(self, coefficients=None, samples=None):
+        self.coefficients = {stage: list(values) for stage, values in (coefficients or DEFAULT_COEFFICIENTS).items()}
+        # Records each stage was fitted from; 0 means the prior is in use
+        self.samples = samples or dict.fromkeys(STAGE_FEATURES, 0)
+
+    @classmethod
+    def from_env(cls):
+        """The fitted model at COST_MODEL_PATH, or the prior if none is configured"""
+        if COST_MODEL_PATH and os.path.exists(COST_MODEL_PATH):
+            return cls.load(COST_MODEL_PATH)
+        return cls()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(dict(DEFAULT_COEFFICIENTS, **data["coefficients"]), data.get("samples"))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"coefficients": self.coefficients, "samples": self.samples}, f, indent=2)
+
+    def predict(self, settings):
+        """Predicted seconds per stage and in total for one job"""
+        values = features(settings)
+        stages = {
+            stage: max(0.0, sum(c * values[name] for c, name in zip(self.coefficients[stage], names)))
+            for stage, names in STAGE_FEATURES.items()
+        }
+        return {"total_s": round(sum(stages.values()), 2), "stages": {k: round(v, 2) for k, v in stages.items()}}
+
+    @classmethod
+    def fit(cls, records, min_samples=None):
+        """Fit every stage with enough successful, uncached records; keep the prior for the rest"""
+        rows = []
+        for record in records:
+            timings = record.get("timings") or {}
+            if record.get("status") != "success" or record.get("cached") or not timings.get("settings"):
+                continue
+            # Segmented jobs time several generations against one set of settings
+            if timings["settings"].get("segments", 1) > 1:
+                continue
+            # Node timings are only known when the websocket was up
+            if not timings.get("by_class"):
+                continue
+            rows.append((features(timings["settings"]), stage_seconds(timings)))
+
+        model = cls()
+        for stage, names in STAGE_FEATURES.items():
+            needed = min_samples or len(names) + 2
+            X = np.array([[values[name] for name in names] for values, _ in rows], dtype=float).reshape(-1, len(names))
+            y = np.array([stages[stage] for _, stages in rows], dtype=float)
+            # Columns that never vary (e.g. upscale always on) cannot be told apart from the constant
+            usable = [i for i in range(len(names)) if names[i] == "const" or (len(X) and np.ptp(X[:, i]) > 0)]
+            if len(rows) < needed or not usable:
+                continue
+            coefficients = _nonnegative_lstsq(X[:, usable], y)
+            fitted = [0.0] * len(names)
+            for i, value in zip(usable, coefficients):
+                fitted[i] = value
+            if not any(fitted) and y.any():
+                continue
+            model.coefficients[stage] = [round(value, 6) for value in fitted]
+            model.samples[stage] = len(rows)
+        return model
+
+
+def _nonnegative_lstsq(X, y):
+    """Least squares with negative coefficients dropped and the rest refitted"""
+    active = list(range(X.shape[1]))
+    while active:
+        solution, *_ = np.linalg.lstsq(X[:, active], y, rcond=None)
+        negative = [column for column, value in zip(active, solution) if value < 0]
+        if not negative:
+            coefficients = np.zeros(X.shape[1])
+            coefficients[active] = solution
+            return coefficients.tolist()
+        active = [column for column in active if column not in negative]
+    return [0.0] * X.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or query the job cost model")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit = commands.add_parser("fit", help="Fit from job timing JSON lines")
+    fit.add_argument("paths", nargs="+")
+    fit.add_argument("-o", "--output", default="cost_model.json")
+    predict = commands.add_parser("predict", help="Predict one job's time")
+    predict.add_argument("settings", help='JSON, e.g. {"base_width": 960, "base_height": 544, "num_frames": 73, '
+                                          '"steps": 15, "target_width": 1280, "target_height": 720}')
+    predict.add_argument("--model", default=COST_MODEL_PATH)
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        records = list(read_records(args.paths))
+        model = CostModel.fit(records)
+        model.save(args.output)
+        print(f"Fitted from {len(records)} records: {json.dumps(model.samples)}")
+        print(f"Wrote {args.output}")
+    else:
+        model = CostModel.load(args.model) if args.model else CostModel()
+        json.dump(model.predict(json.loads(args.settings)), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
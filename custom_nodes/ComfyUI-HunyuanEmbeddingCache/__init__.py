@@ -0,0 +1,8 @@
+from .cached_text_encode import HyVideoCachedTextEncode
+
+NODE_CLASS_MAPPINGS = {
+    "HyVideoCachedTextEncode": HyVideoCachedTextEncode,
+}
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "HyVideoCachedTextEncode": "HunyuanVideo TextEncode (cached)",
+}
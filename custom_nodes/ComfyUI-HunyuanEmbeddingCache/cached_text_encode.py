@@ -0,0 +1,119 @@
+"""HyVideoCachedTextEncode: HyVideoTextEncode behind a persistent embedding cache.
+
+Takes the text encoder configuration as plain inputs instead of a loaded
+HYVIDTEXTENCODER, so the llava-llama-3 and CLIP encoders are only loaded (through
+the wrapper's own DownloadAndLoadHyVideoTextEncoder) when a prompt misses the
+cache. On a hit the embeddings are read from disk and nothing else runs.
+
+The loaded encoder is held by this module rather than in ComfyUI's output
+cache, so ComfyUI's unload_all_models (run for /free) is wrapped to drop it too.
+"""
+import json
+import os
+
+import comfy.model_management as model_management
+import folder_paths
+import nodes as comfy_nodes
+import torch
+
+from .embedding_cache import EmbeddingCache, embedding_key
+
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR") or os.path.join(folder_paths.base_path, "embedding_cache")
+EMBEDDING_CACHE_MAX_BYTES = int(float(os.environ.get("EMBEDDING_CACHE_MAX_GB", "2")) * 1024 ** 3)
+
+# DownloadAndLoadHyVideoTextEncoder inputs; everything else goes to HyVideoTextEncode
+ENCODER_INPUTS = ("llm_model", "clip_model", "precision", "apply_final_norm", "hidden_state_skip_layer", "quantization")
+
+_cache = None
+# The most recently loaded encoder stays resident, as ComfyUI would keep the loader's output,
+# until ComfyUI unloads its models
+_encoder = {}
+
+
+def _torch_save(value, path):
+    torch.save(value, path)
+
+
+def _torch_load(path):
+    return torch.load(path, map_location="cpu", weights_only=True)
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MAX_BYTES, save=_torch_save, load=_torch_load)
+    return _cache
+
+
+def _load_encoder(encoder_config):
+    config_key = json.dumps(encoder_config, sort_keys=True)
+    if config_key not in _encoder:
+        _encoder.clear()
+        loader = comfy_nodes.NODE_CLASS_MAPPINGS["DownloadAndLoadHyVideoTextEncoder"]()
+        _encoder[config_key] = getattr(loader, loader.FUNCTION)(**encoder_config)[0]
+    return _encoder[config_key]
+
+
+def unload_encoder():
+    """Drop the resident encoder and return its memory to the device"""
+    if _encoder:
+        _encoder.clear()
+        model_management.soft_empty_cache()
+
+
+_unload_all_models = model_management.unload_all_models
+
+
+def _unload_all_models_and_encoder(*args, **kwargs):
+    unload_encoder()
+    return _unload_all_models(*args, **kwargs)
+
+
+# /free with unload_models or free_memory ends in unload_all_models; without this the
+# encoder would stay resident through the handler's out-of-memory recovery
+model_management.unload_all_models = _unload_all_models_and_encoder
+
+
+def _encode(prompt, encode_args, encoder_config):
+    encoder = comfy_nodes.NODE_CLASS_MAPPINGS["HyVideoTextEncode"]()
+    text_encoders = _load_encoder(encoder_config)
+    return getattr(encoder, encoder.FUNCTION)(text_encoders=text_encoders, prompt=prompt, **encode_args)[0]
+
+
+class HyVideoCachedTextEncode:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "prompt": ("STRING", {"default": "", "multiline": True}),
+                "llm_model": ("STRING", {"default": "Kijai/llava-llama-3-8b-text-encoder-tokenizer"}),
+                "clip_model": ("STRING", {"default": "openai/clip-vit-large-patch14"}),
+                "precision": ("STRING", {"default": "bf16"}),
+                "quantization": ("STRING", {"default": "disabled"}),
+            },
+            "optional": {
+                "apply_final_norm": ("BOOLEAN", {"default": False}),
+                "hidden_state_skip_layer": ("INT", {"default": 2}),
+                "negative": ("STRING", {"default": "", "multiline": True}),
+                "force_offload": ("BOOLEAN", {"default": True}),
+                "prompt_template": ("STRING", {"default": "video"}),
+                "custom_prompt_template": ("STRING", {"default": "", "multiline": True}),
+            },
+        }
+
+    RETURN_TYPES = ("HYVIDEMBEDS",)
+    RETURN_NAMES = ("hyvid_embeds",)
+    FUNCTION = "process"
+    CATEGORY = "HunyuanVideoWrapper"
+
+    def process(self, prompt, **kwargs):
+        encoder_config = {name: kwargs.pop(name) for name in ENCODER_INPUTS if name in kwargs}
+        # Offloading only affects where the encoder lives, not the embeddings
+        key_args = {name: value for name, value in kwargs.items() if name != "force_offload"}
+        key = embedding_key(prompt, key_args, encoder_config)
+        cache = get_cache()
+        embeds, hit = cache.get_or_compute(key, lambda: _encode(prompt, kwargs, encoder_config))
+        stats = cache.stats()
+        print(f"hunyuan-embedding-cache - {'hit' if hit else 'miss'} {key[:12]} "
+              f"({stats['hits']} hits, {stats['misses']} misses)")
+        return {"ui": {"embedding_cache": [dict(stats, hit=hit, key=key)]}, "result": (embeds,)}
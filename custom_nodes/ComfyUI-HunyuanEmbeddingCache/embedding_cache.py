@@ -0,0 +1,122 @@
+"""Disk cache for prompt embeddings, independent of ComfyUI and torch.
+
+Entries are keyed by a hash of everything that determines the embedding (the
+prompt, the text-encode settings such as the prompt template, and the text
+encoder configuration). The encoder itself is passed in as a callable, so the
+cache can be exercised with a stub encoder; ComfyUI supplies torch-based
+save/load functions, tests can rely on the pickle defaults.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+
+def _pickle_save(value, path):
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _pickle_load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def embedding_key(prompt, encode_args, encoder_config):
+    payload = json.dumps({"prompt": prompt, "encode": encode_args, "encoder": encoder_config},
+                         sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Size-bounded LRU cache of encoder outputs on disk, with hit/miss counters"""
+
+    suffix = ".emb"
+
+    def __init__(self, directory, max_bytes, save=_pickle_save, load=_pickle_load):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.save = save
+        self.load = load
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get_or_compute(self, key, compute):
+        """Return (value, hit). compute() runs only on a miss"""
+        path = self._path(key)
+        try:
+            value = self.load(path)
+            os.utime(path)
+            hit = True
+        except FileNotFoundError:
+            value = compute()
+            self._store(path, value)
+            hit = False
+        except Exception as e:
+            # A truncated or incompatible entry is a miss, not a failure
+            print(f"hunyuan-embedding-cache - discarding unreadable entry {key}: {e}")
+            value = compute()
+            self._store(path, value)
+            hit = False
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._write_stats()
+        return value, hit
+
+    def _store(self, path, value):
+        fd, staging = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            self.save(value, staging)
+            os.replace(staging, path)
+        except BaseException:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return evicted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else None}
+
+    def _write_stats(self):
+        path = os.path.join(self.directory, f"stats.{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(self.stats(), f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
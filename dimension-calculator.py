@@ -1,8 +1,31 @@
+"""Regression and benchmark suite for dimension_planner.
+
+Checks the closed-form planner against the original step-by-8 walk (kept here
+as the reference) for the hand-picked cases below, for both pixel floors the
+two historical copies used, and for a random sweep of target resolutions
+through the scalar and vectorized APIs, then times both implementations.
+
+    python dimension-calculator.py [--sweep 20000] [--verbose]
+"""
+import argparse
+import random
+import sys
+import time
 from typing import Tuple
 
-MIN_GENERATION_PIXELS = 512 * 320  # 163,840 pixels minimum
+from dimension_planner import (
+    MIN_GENERATION_PIXELS,
+    _dimensions_for_ratio,
+    calculate_generation_dimensions,
+    max_frame_count,
+    plan_dimensions_batch,
+)
+
+# handler.py used 640x416; this script historically used 512x320
+PIXEL_FLOORS = (MIN_GENERATION_PIXELS, 512 * 320)
 
-def calculate_generation_dimensions(target_width: int, target_height: int) -> Tuple[int, int]:
+
+def reference_generation_dimensions(target_width: int, target_height: int, min_pixels: int) -> Tuple[int, int]:
     """
     Calculate dimensions by incrementing either width or height in steps of 8
     until minimum pixel count is reached. Choose which dimension to increment
@@ -12,7 +35,7 @@ def calculate_generation_dimensions(target_width: int, target_height: int) -> Tu
     width = 8
     height = 8
 
-    while width * height < MIN_GENERATION_PIXELS:
+    while width * height < min_pixels:
         current_ratio = width / height
 
         # If current ratio is smaller than target, increase width
@@ -25,39 +48,121 @@ def calculate_generation_dimensions(target_width: int, target_height: int) -> Tu
     return width, height
 
 
+test_cases = [
+    (16, 9),         # Standard widescreen
+    (4, 3),          # Standard monitor
+    (1920, 1080),    # Full HD
+    (7680, 4320),    # 8K
+    (1, 1),          # Square
+    (1000, 7),       # Extreme ratio
+    (3, 1000),       # Another extreme ratio
+    (15360, 8640),   # 16K
+    (1, 2),          # Simple ratio
+    (2560, 1440),    # 2K
+    # Edge cases
+    (8, 8),          # Already divisible by 8
+    (7, 7),          # Prime numbers
+    (23, 37),        # Prime numbers
+    (99, 151),       # More odd numbers
+    (1001, 1001),    # Large odd numbers
+]
+
+
+def print_case(w, h, output_width, output_height, min_pixels):
+    aspect_ratio_original = w / h
+    aspect_ratio_final = output_width / output_height
+    ratio_diff_percent = abs(aspect_ratio_final - aspect_ratio_original) / aspect_ratio_original * 100
+
+    print(f"\nInput: {w}x{h}")
+    print("Overshoot:", (output_width * output_height) / min_pixels)
+    print(f"Output: {output_width}x{output_height}")
+    print(f"Pixels: {output_width * output_height:,} (min: {min_pixels:,})")
+    print(f"Original ratio: {w}/{h} = {aspect_ratio_original:.4f}")
+    print(f"Final ratio: {output_width}/{output_height} = {aspect_ratio_final:.4f}")
+    print(f"Ratio difference: {ratio_diff_percent:.2f}%")
+    print(f"Width multiple of 8: {output_width % 8 == 0}")
+    print(f"Height multiple of 8: {output_height % 8 == 0}")
+    print(f"Max frames: {max_frame_count(output_width, output_height)}")
+    print("---")
+
+
+def sweep_cases(count, seed=0):
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        # Mix ordinary resolutions with extreme ratios
+        if rng.random() < 0.8:
+            cases.append((rng.randint(16, 7680), rng.randint(16, 4320)))
+        else:
+            cases.append((rng.randint(1, 2000), rng.randint(1, 2000)))
+    return cases
+
+
+def check(cases, min_pixels, verbose=False):
+    failures = 0
+    expected = [reference_generation_dimensions(w, h, min_pixels) for w, h in cases]
+    for (w, h), want in zip(cases, expected):
+        got = calculate_generation_dimensions(w, h, min_pixels)
+        if got != want:
+            failures += 1
+            print(f"MISMATCH {w}x{h} (min {min_pixels:,}): planner {got}, reference {want}")
+        elif verbose:
+            print_case(w, h, got[0], got[1], min_pixels)
+    widths, heights, _ = plan_dimensions_batch([w for w, _ in cases], [h for _, h in cases], min_pixels)
+    for (w, h), want, got in zip(cases, expected, zip(widths.tolist(), heights.tolist())):
+        if tuple(got) != want:
+            failures += 1
+            print(f"BATCH MISMATCH {w}x{h} (min {min_pixels:,}): planner {tuple(got)}, reference {want}")
+    return failures
+
+
+def benchmark(cases, min_pixels):
+    start = time.perf_counter()
+    for w, h in cases:
+        reference_generation_dimensions(w, h, min_pixels)
+    reference_s = time.perf_counter() - start
+
+    _dimensions_for_ratio.cache_clear()
+    start = time.perf_counter()
+    for w, h in cases:
+        calculate_generation_dimensions(w, h, min_pixels)
+    cold_s = time.perf_counter() - start
+
+    # Production traffic repeats a handful of aspect ratios; time memo hits on those
+    repeated = test_cases * (len(cases) // len(test_cases))
+    start = time.perf_counter()
+    for w, h in repeated:
+        calculate_generation_dimensions(w, h, min_pixels)
+    warm_s = (time.perf_counter() - start) * len(cases) / len(repeated)
+
+    widths, heights = [w for w, _ in cases], [h for _, h in cases]
+    start = time.perf_counter()
+    plan_dimensions_batch(widths, heights, min_pixels)
+    batch_s = time.perf_counter() - start
+
+    per_case = 1e6 / len(cases)
+    print(f"min {min_pixels:,} px, {len(cases)} targets:")
+    print(f"  reference walk:   {reference_s * per_case:9.2f} us/target")
+    print(f"  planner (cold):   {cold_s * per_case:9.2f} us/target")
+    print(f"  planner (memo):   {warm_s * per_case:9.2f} us/target")
+    print(f"  planner (batch):  {batch_s * per_case:9.2f} us/target")
+
+
 if __name__ == "__main__":
-    test_cases = [
-        (16, 9),         # Standard widescreen
-        (4, 3),          # Standard monitor
-        (1920, 1080),    # Full HD
-        (7680, 4320),    # 8K
-        (1, 1),          # Square
-        (1000, 7),       # Extreme ratio
-        (3, 1000),       # Another extreme ratio
-        (15360, 8640),   # 16K
-        (1, 2),          # Simple ratio
-        (2560, 1440),    # 2K
-        # Edge cases
-        (8, 8),          # Already divisible by 8
-        (7, 7),          # Prime numbers
-        (23, 37),        # Prime numbers
-        (99, 151),       # More odd numbers
-        (1001, 1001),    # Large odd numbers
-    ]
-
-    for w, h in test_cases:
-        output_width, output_height = calculate_generation_dimensions(w, h)
-        aspect_ratio_original = w / h
-        aspect_ratio_final = output_width / output_height
-        ratio_diff_percent = abs(aspect_ratio_final - aspect_ratio_original) / aspect_ratio_original * 100
-
-        print(f"\nInput: {w}x{h}")
-        print("Overshoot:", (output_width * output_height) / MIN_GENERATION_PIXELS)
-        print(f"Output: {output_width}x{output_height}")
-        print(f"Pixels: {output_width * output_height:,} (min: {MIN_GENERATION_PIXELS:,})")
-        print(f"Original ratio: {w}/{h} = {aspect_ratio_original:.4f}")
-        print(f"Final ratio: {output_width}/{output_height} = {aspect_ratio_final:.4f}")
-        print(f"Ratio difference: {ratio_diff_percent:.2f}%")
-        print(f"Width multiple of 8: {output_width % 8 == 0}")
-        print(f"Height multiple of 8: {output_height % 8 == 0}")
-        print("---")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Check dimension_planner against the reference walk")
+    parser.add_argument("--sweep", type=int, default=20000, help="Random target resolutions to check")
+    parser.add_argument("--verbose", action="store_true", help="Print details for the hand-picked cases")
+    args = parser.parse_args()
+
+    sweep = sweep_cases(args.sweep)
+    failures = 0
+    for min_pixels in PIXEL_FLOORS:
+        failures += check(test_cases, min_pixels, verbose=args.verbose)
+        failures += check(sweep, min_pixels)
+    if failures:
+        print(f"{failures} mismatches against the reference walk")
+        sys.exit(1)
+    print(f"Planner matches the reference walk on {len(test_cases) + len(sweep)} targets x {len(PIXEL_FLOORS)} pixel floors\n")
+
+    for min_pixels in PIXEL_FLOORS:
+        benchmark(test_cases + sweep, min_pixels)
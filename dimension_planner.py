@@ -0,0 +1,142 @@
+"""Generation dimension and frame-count planning.
+
+HunyuanVideo is sampled at a small base resolution (width and height multiples
+of 8, at least MIN_GENERATION_PIXELS) that keeps the target aspect ratio as
+closely as the 8px grid allows; the result is upscaled to the target afterwards.
+
+The original planner walked up from 8x8, growing whichever side kept the
+ratio closer, one 8px step at a time. That walk is a lattice path hugging the
+line width = ratio * height, so its end point can be computed directly: the
+walk leaves row h (in 8px units) at the smallest width w with w / h >= ratio,
+which makes the row it stops in the first one whose final width times h
+reaches the pixel floor. That row is bracketed in closed form (the final width
+of row h lies in [ratio * h, ratio * h + 1)), so the search between the bounds
+takes a few iterations, and the width inside the row is closed-form. Results
+are identical to the walk, including its float comparisons, and are memoized
+per aspect ratio.
+"""
+import functools
+import math
+from collections import namedtuple
+from typing import Tuple
+
+MIN_GENERATION_PIXELS = 640 * 416
+MAX_GENERATION_TOTAL = 496 * 512 * 117
+DIMENSION_STEP = 8
+
+GenerationPlan = namedtuple("GenerationPlan", "base_width base_height num_frames max_frames requested_frames")
+
+
+def _width_units(height_units, target_ratio):
+    """Smallest width (in steps, at least 1) the walk reaches before leaving row height_units"""
+    width_units = max(1, math.ceil(target_ratio * height_units))
+    # ceil() works on a rounded product; settle the boundary with the walk's own comparison
+    while width_units > 1 and (width_units - 1) / height_units >= target_ratio:
+        width_units -= 1
+    while width_units / height_units < target_ratio:
+        width_units += 1
+    return width_units
+
+
+def _row_bounds(target_ratio, min_units):
+    """Bracket the first row whose last cell reaches min_units.
+
+    Row h ends at a width in [max(1, ratio * h), ratio * h + 1), so the row lies
+    between the roots of ratio * h^2 + h = min_units and max(h, ratio * h^2) = min_units.
+    One row of slack on each side absorbs float error in the roots.
+    """
+    low = int((math.sqrt(1 + 4 * target_ratio * min_units) - 1) / (2 * target_ratio)) - 1
+    high = math.ceil(math.sqrt(min_units / target_ratio)) + 1
+    return max(1, low), max(1, min(min_units, high))
+
+
+@functools.lru_cache(maxsize=4096)
+def _dimensions_for_ratio(target_ratio, min_pixels, step):
+    min_units = -(-min_pixels // (step * step))
+    # First row whose last cell reaches the pixel floor
+    low, high = _row_bounds(target_ratio, min_units)
+    while low < high:
+        middle = (low + high) // 2
+        if _width_units(middle, target_ratio) * middle >= min_units:
+            high = middle
+        else:
+            low = middle + 1
+    height_units = low
+    entry_width = _width_units(height_units - 1, target_ratio) if height_units > 1 else 1
+    width_units = max(entry_width, -(-min_units // height_units))
+    return width_units * step, height_units * step
+
+
+def calculate_generation_dimensions(target_width, target_height, min_pixels=MIN_GENERATION_PIXELS) -> Tuple[int, int]:
+    """Base generation width and height for a target resolution"""
+    if target_width <= 0 or target_height <= 0:
+        raise ValueError(f"Invalid target dimensions: {target_width}x{target_height}")
+    return _dimensions_for_ratio(target_width / target_height, min_pixels, DIMENSION_STEP)
+
+
+def validate_frame_count(num_frames):
+    """Ensure frame count follows HunyuanVideo requirements"""
+    if (num_frames - 1) % 4 != 0:
+        # Round up to next valid frame count
+        num_frames = ((num_frames - 1) // 4 * 4) + 5
+    return num_frames
+
+
+def max_frame_count(base_width, base_height, max_total=MAX_GENERATION_TOTAL):
+    """Largest 4k+1 frame count whose total pixel volume fits max_total"""
+    max_possible_frames = max_total // (base_width * base_height)
+    return ((max_possible_frames - 1) // 4 * 4) + 1
+
+
+def plan_generation(target_width, target_height, num_frames, min_pixels=MIN_GENERATION_PIXELS,
+                    max_total=MAX_GENERATION_TOTAL, frame_limit=None) -> GenerationPlan:
+    """Base dimensions plus the valid frame count that fits the generation budget.
+
+    frame_limit(base_width, base_height), if given, returns the largest frame
+    count allowed instead of the static max_total pixel volume.
+    """
+    base_width, base_height = calculate_generation_dimensions(target_width, target_height, min_pixels)
+    if frame_limit is not None:
+        max_frames = frame_limit(base_width, base_height)
+    else:
+        max_frames = max_frame_count(base_width, base_height, max_total)
+    frames = validate_frame_count(num_frames)
+    if frames > max_frames:
+        frames = max_frames
+    return GenerationPlan(base_width, base_height, frames, max_frames, num_frames)
+
+
+def plan_dimensions_batch(target_widths, target_heights, min_pixels=MIN_GENERATION_PIXELS,
+                          max_total=MAX_GENERATION_TOTAL):
+    """Vectorized calculate_generation_dimensions plus max_frame_count over arrays of targets.
+
+    Returns numpy arrays (base_widths, base_heights, max_frames). The row search
+    runs on all elements at once and converges in a few iterations, so thousands
+    of resolutions cost a handful of array operations.
+    """
+    import numpy as np
+
+    widths = np.asarray(target_widths, dtype=np.float64)
+    heights = np.asarray(target_heights, dtype=np.float64)
+    if np.any(widths <= 0) or np.any(heights <= 0):
+        raise ValueError("Invalid target dimensions: all widths and heights must be positive")
+    ratios = widths / heights
+    min_units = -(-min_pixels // (DIMENSION_STEP * DIMENSION_STEP))
+
+    def width_units(height_units):
+        units = np.maximum(1, np.ceil(ratios * height_units)).astype(np.int64)
+        units = np.where((units > 1) & ((units - 1) / height_units >= ratios), units - 1, units)
+        return np.where(units / height_units < ratios, units + 1, units)
+
+    low = np.maximum(1, ((np.sqrt(1 + 4 * ratios * min_units) - 1) / (2 * ratios)).astype(np.int64) - 1)
+    high = np.clip(np.ceil(np.sqrt(min_units / ratios)).astype(np.int64) + 1, 1, min_units)
+    while np.any(low < high):
+        middle = (low + high) // 2
+        reached = width_units(middle) * middle >= min_units
+        high = np.where(reached, middle, high)
+        low = np.where(reached, low, middle + 1)
+    entry_width = np.where(low > 1, width_units(np.maximum(low - 1, 1)), 1)
+    base_widths = np.maximum(entry_width, -(-min_units // low)) * DIMENSION_STEP
+    base_heights = low * DIMENSION_STEP
+    max_frames = (max_total // (base_widths * base_heights) - 1) // 4 * 4 + 1
+    return base_widths, base_heights, max_frames
@@ -1,112 +1,163 @@
 import runpod
+import asyncio
 import json
-import urllib.request
-import urllib.parse
 import time
 import os
-import requests
+import sys
 import base64
-from PIL import Image
-from io import BytesIO
+import requests
+import threading
+import queue
+import itertools
+import shutil
+from comfy_client import PromptLost, execution_error_message, is_out_of_memory
+from comfy_pool import ComfyPool
+from workflow_templates import TemplateError, load_templates, use_cached_text_encoder
+from dimension_planner import plan_generation, validate_frame_count
+from output_encoding import PeakMemory, encode_base64_file
+from preview_image import PreviewCache
+from stage_timings import BOOT_EVENT, JobTimer, write_record
+from cost_model import CostModel
+from quality_planner import TIERS, apply_settings, choose_settings, template_capabilities
+from job_progress import ProgressTracker
+from job_cancel import CancelToken
+from memory_model import (DEFAULT_MAX_GENERATION_FRAMES, DEFAULT_VRAM_GB, choose_variant, estimate_gb, frame_limit,
+                          variant_profile, vram_budget_gb)
+from video_segments import (SEGMENT_OVERLAP_FRAMES, crossfade, output_overlap, plan_segments, read_frames,
+                            segment_workflow, video_info, write_frames)
+from hls_output import PLAYLIST_NAME, content_type, encode_hls, rewrite_playlist
+from object_store import ObjectStore
+from result_cache import CACHE_MODES, ResultCache, workflow_key
+from concurrent.futures import ThreadPoolExecutor
 
 # Constants for ComfyUI interaction
 COMFY_API_AVAILABLE_INTERVAL_MS = 100
 COMFY_API_AVAILABLE_MAX_RETRIES = 1000
 COMFY_POLLING_INTERVAL_MS = 250
 COMFY_POLLING_MAX_RETRIES = 50000
-COMFY_HOST = "127.0.0.1:8188"
+COMFY_JOB_TIMEOUT_S = COMFY_POLLING_INTERVAL_MS * COMFY_POLLING_MAX_RETRIES / 1000
+# execution_timeout for jobs that do not set one; 0 leaves only COMFY_JOB_TIMEOUT_S per workflow
+EXECUTION_TIMEOUT_S = float(os.environ.get("EXECUTION_TIMEOUT_S", "0"))
+# How long an interrupted prompt gets to stop before the job gives up on its history entry
+INTERRUPT_GRACE_S = 10
+COMFY_HOST = os.environ.get("COMFY_HOST", "127.0.0.1:8188")
+# Opt-in: start.sh runs one ComfyUI per GPU and lists them in COMFY_HOSTS. Off, the worker
+# uses the single ComfyUI on COMFY_HOST as before
+MULTI_GPU = os.environ.get("MULTI_GPU", "false").lower() == "true"
+COMFY_HOSTS = [COMFY_HOST]
+# Each instance's output folder under COMFY_OUTPUT_PATH, in COMFY_HOSTS order
+COMFY_OUTPUT_SUBFOLDERS = []
+if MULTI_GPU:
+    COMFY_HOSTS = [host for host in os.environ.get("COMFY_HOSTS", COMFY_HOST).split(",") if host]
+    COMFY_OUTPUT_SUBFOLDERS = [folder for folder in os.environ.get("COMFY_OUTPUT_SUBFOLDERS", "").split(",") if folder]
+COMFY_OUTPUT_PATH = os.environ.get("COMFY_OUTPUT_PATH", "/comfyui/output")
+COMFY_WORKFLOW_DIR = os.environ.get("COMFY_WORKFLOW_DIR", "/comfyui/workflows")
+COMFY_WORKFLOW = os.environ.get("COMFY_WORKFLOW", "workflow")
+# Used instead of COMFY_WORKFLOW when the memory model says a job will not fit, or after it runs out of memory
+COMFY_LOW_MEMORY_WORKFLOW = os.environ.get("COMFY_LOW_MEMORY_WORKFLOW", "")
+MAX_GENERATION_FRAMES = int(os.environ.get("MAX_GENERATION_FRAMES", str(DEFAULT_MAX_GENERATION_FRAMES)))
+OUT_OF_MEMORY_ERROR = "ComfyUI ran out of GPU memory"
+COMFY_UNREACHABLE_ERROR = "ComfyUI unreachable"
+# Longest segmented job, in segments of up to MAX_GENERATION_FRAMES
+MAX_SEGMENTS = int(os.environ.get("MAX_SEGMENTS", "8"))
+# Most clips one batch job may hold
+MAX_BATCH_CLIPS = int(os.environ.get("MAX_BATCH_CLIPS", "16"))
 REFRESH_WORKER = os.environ.get("REFRESH_WORKER", "false").lower() == "true"
-MIN_GENERATION_PIXELS = 640 * 416
-MAX_GENERATION_TOTAL = 496 * 512 * 117
-
-def resize_and_compress_image(image_bytes, target_width, target_height):
-    """Resize and compress the preview image"""
-    # Open the image from bytes
-    img = Image.open(BytesIO(image_bytes))
-    # Resize the image
-    img = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-
-    # Save the compressed image to bytes
-    output_buffer = BytesIO()
-    img.save(output_buffer, format='JPEG', quality=85, optimize=True)
-    return output_buffer.getvalue()
-
-def calculate_generation_dimensions(target_width, target_height):
-    target_ratio = target_width / target_height
-    width = 8
-    height = 8
-
-    while width * height < MIN_GENERATION_PIXELS:
-        current_ratio = width / height
-
-        if current_ratio < target_ratio:
-            width += 8
-        else:
-            height += 8
-
-    return width, height
-
-class HunyuanGenerator:
-    def __init__(self):
-        self.workflow_path = '/comfyui/workflows/workflow.json'
-        self.load_default_workflow()
-
-    def load_default_workflow(self):
-        """Load the default workflow template"""
-        with open(self.workflow_path, 'r') as f:
-            self.workflow_template = f.read()
-
-    def update_workflow(self, params: dict) -> dict:
-        """Update workflow template with new parameters using string replacement"""
-        workflow_str = self.workflow_template
-
-        # Replace all placeholders
-        replacements = {
-            '|prompt|': json.dumps(params.get('prompt')),
-            '|base_width|': str(params.get('base_width')),
-            '|base_height|': str(params.get('base_height')),
-            '|target_width|': str(params.get('target_width')),
-            '|target_height|': str(params.get('target_height')),
-            '|num_frames|': str(params.get('num_frames')),
-            '|num_inference_steps|': str(params.get('num_inference_steps')),
-            '|fps|': str(params.get('fps')),
-            '|guidance_scale|': str(params.get('guidance_scale')),
-            '|flow_shift|': str(params.get('flow_shift'))
-        }
-
-        for placeholder, value in replacements.items():
-            workflow_str = workflow_str.replace(placeholder, value)
-
-        return json.loads(workflow_str)
-
-def check_server(url, retries=500, delay=50):
-    """Check if ComfyUI server is reachable"""
-    for i in range(retries):
-        try:
-            response = requests.get(url)
-            if response.status_code == 200:
-                print(f"runpod-worker-comfy - API is reachable")
-                return True
-        except requests.RequestException:
-            pass
-        time.sleep(delay / 1000)
-
-    print(f"runpod-worker-comfy - Failed to connect to server at {url} after {retries} attempts.")
-    return False
-
-def queue_workflow(workflow):
-    """Queue a workflow to be processed by ComfyUI"""
-    data = json.dumps({"prompt": workflow}).encode("utf-8")
-    req = urllib.request.Request(f"http://{COMFY_HOST}/prompt", data=data)
-    return json.loads(urllib.request.urlopen(req).read())
-
-def get_history(prompt_id):
-    """Get workflow execution history"""
-    with urllib.request.urlopen(f"http://{COMFY_HOST}/history/{prompt_id}") as response:
-        return json.loads(response.read())
-
-def process_output_video(outputs, job_id, target_width, target_height, video_index=None):
-    """Process video outputs from ComfyUI"""
+# "base64" returns outputs inline; "url" uploads them and returns presigned URLs; "hls"
+# uploads fMP4 segments as they are encoded, with a playlist of their presigned URLs. Both
+# need the object store; a segment on the worker's disk is no use to the client
+OUTPUT_MODES = ("base64", "url", "hls")
+OUTPUT_MODE = os.environ.get("OUTPUT_MODE", "base64")
+# Jobs one worker runs at once, by default one (one per ComfyUI instance with MULTI_GPU). Above that
+# the next job's workflow is already queued in ComfyUI while the current job's outputs are read,
+# encoded and uploaded
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", str(len(COMFY_HOSTS)) if MULTI_GPU else "1"))
+# Requires the HyVideoCachedTextEncode custom node (custom_nodes/ComfyUI-HunyuanEmbeddingCache)
+EMBEDDING_CACHE = os.environ.get("EMBEDDING_CACHE", "false").lower() == "true"
+# Stream progress messages while a job runs; the final result is the last message. Opt-in,
+# as /run and /runsync then return the aggregated list of messages instead of the result dict
+STREAM_PROGRESS = os.environ.get("STREAM_PROGRESS", "false").lower() == "true"
+# Run a tiny workflow at boot so the first job does not pay for loading every model
+WARMUP = os.environ.get("WARMUP", "true").lower() == "true"
+WARMUP_READY_TIMEOUT_S = float(os.environ.get("WARMUP_READY_TIMEOUT_S", "600"))
+# start.sh exports the time the container started, before ComfyUI is launched
+BOOT_TIME = float(os.environ.get("WORKER_BOOT_TIME", time.time()))
+WARMUP_PARAMS = {
+    "prompt": "warm-up",
+    "negative_prompt": "",
+    "base_width": 256,
+    "base_height": 144,
+    "target_width": 256,
+    "target_height": 144,
+    "num_frames": 5,
+    "fps": 24,
+    "num_inference_steps": 2,
+    "guidance_scale": 6,
+    "flow_shift": 9,
+}
+
+# One pooled keep-alive client per ComfyUI instance, reused across jobs
+COMFY_POOL = ComfyPool(COMFY_HOSTS, COMFY_OUTPUT_SUBFOLDERS)
+
+# Templates are parsed and validated once at startup; a bad template fails the worker
+# at boot instead of the first job that uses it
+TEMPLATES = load_templates(COMFY_WORKFLOW_DIR, use_cached_text_encoder if EMBEDDING_CACHE else None)
+
+# Workflow variants with their memory profiles, fastest first; a variant with the same
+# profile as an earlier one (e.g. both block swapping) adds nothing
+PROFILES = []
+for name in filter(None, (COMFY_WORKFLOW, COMFY_LOW_MEMORY_WORKFLOW)):
+    if name not in TEMPLATES:
+        raise TemplateError(f"Workflow template {name} not found in {COMFY_WORKFLOW_DIR}")
+    profile = variant_profile(TEMPLATES[name].workflow)
+    if profile not in (p for _, p in PROFILES):
+        PROFILES.append((name, profile))
+VARIANTS = [name for name, _ in PROFILES]
+vram_budget = None
+
+# Only set up when BUCKET_ENDPOINT_URL is configured
+OBJECT_STORE = ObjectStore.from_env()
+upload_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="upload")
+# Previews render here while the handler thread encodes or uploads the video
+preview_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preview")
+PREVIEW_CACHE = PreviewCache()
+
+# Only set up when RESULT_CACHE_DIR is configured
+RESULT_CACHE = ResultCache.from_env()
+
+# Fitted from recorded timings when COST_MODEL_PATH is set, otherwise the built-in prior
+COST_MODEL = CostModel.from_env()
+
+def start_preview(workflow_path, target_width, target_height):
+    """Render the preview JPEG on preview_pool; returns a future of its bytes"""
+    return preview_pool.submit(PREVIEW_CACHE.render, workflow_path, target_width, target_height)
+
+def upload_outputs(video_path, workflow_path, job_id, target_width, target_height, video_index, timer, preview=None):
+    """Upload the video and preview, rendering the preview while the video uploads"""
+    if video_index == 0 and preview is None:
+        preview = start_preview(workflow_path, target_width, target_height)
+    video_upload = upload_pool.submit(OBJECT_STORE.upload_file, video_path,
+                                      f"{job_id}/{os.path.basename(video_path)}", "video/mp4")
+    preview_upload = None
+    if preview is not None:
+        # Only the time the handler waits on the render is on its critical path
+        with timer.phase("preview_resize"):
+            workflow_bytes = preview.result()
+        with timer.phase("preview_upload"):
+            preview_upload = OBJECT_STORE.upload_bytes(workflow_bytes, f"{job_id}/preview.jpg", "image/jpeg")
+    with timer.phase("video_upload"):
+        video = video_upload.result()
+
+    print("runpod-worker-comfy - Video and workflow preview uploaded successfully")
+    return {"status": "success", "video_upload": video, "preview_upload": preview_upload}
+
+def embedding_cache_hits(outputs):
+    """Hit/miss reported by each cached text encode node, keyed by node id"""
+    return {node_id: node_output["embedding_cache"][0]["hit"]
+            for node_id, node_output in outputs.items() if node_output.get("embedding_cache")}
+
+def find_output_files(outputs):
+    """Locate the video and workflow preview written by the VHS_VideoCombine node"""
     # Find gif outputs which contain video and workflow preview
     video_info = None
     for node_id, node_output in outputs.items():
@@ -116,65 +167,509 @@ def process_output_video(outputs, job_id, target_width, target_height, video_ind
 
     if not video_info:
         print(f"runpod-worker-comfy - Available outputs: {outputs}")
-        return {"status": "error", "message": "No video found in outputs"}
+        return None, None, "No video found in outputs"
 
     # Construct paths directly to known locations
-    video_path = f"/comfyui/output/{video_info['filename']}"
-    workflow_path = f"/comfyui/output/{video_info['workflow']}"
+    video_path = os.path.join(COMFY_OUTPUT_PATH, video_info.get("subfolder", ""), video_info["filename"])
+    workflow_path = os.path.join(COMFY_OUTPUT_PATH, video_info.get("subfolder", ""), video_info["workflow"])
 
     print(f"runpod-worker-comfy - Looking for files:")
     print(f"Video: {video_path}")
     print(f"Workflow: {workflow_path}")
 
-    if os.path.exists(video_path) and os.path.exists(workflow_path):
-        # Encode video and workflow preview
-        with open(video_path, 'rb') as f:
-            video_bytes = f.read()
-        with open(workflow_path, 'rb') as f:
-            workflow_bytes = f.read()
-
-        # Resize and compress the workflow preview
-        if video_index == 0:
-            workflow_bytes = resize_and_compress_image(workflow_bytes, target_width, target_height)
-
-        video_b64 = base64.b64encode(video_bytes).decode('utf-8')
-        workflow_b64 = base64.b64encode(workflow_bytes).decode('utf-8')
-
-        print("runpod-worker-comfy - Video and workflow preview processed successfully")
-        return {
-            "status": "success",
-            "video": video_b64,
-            "workflow_preview": workflow_b64
-        }
-    else:
-        missing = []
-        if not os.path.exists(video_path):
-            missing.append("video")
-        if not os.path.exists(workflow_path):
-            missing.append("workflow preview")
+    missing = []
+    if not os.path.exists(video_path):
+        missing.append("video")
+    if not os.path.exists(workflow_path):
+        missing.append("workflow preview")
+    if missing:
         print(f"runpod-worker-comfy - Could not find: {', '.join(missing)}")
+        return None, None, f"Could not find files: {', '.join(missing)}"
+    return video_path, workflow_path, None
+
+def process_output_files(video_path, workflow_path, job_id, target_width, target_height, video_index=None,
+                         output_mode="base64", timer=None, preview=None):
+    """Encode or upload the video and, for video 0, the workflow preview.
+
+    preview is the future from start_preview if the render was started
+    earlier; otherwise it starts here, alongside the video's encode or upload.
+    """
+    timer = timer or JobTimer()
+    if output_mode == "url":
+        return upload_outputs(video_path, workflow_path, job_id, target_width, target_height, video_index, timer,
+                              preview)
+
+    # The preview is only returned with video 0; for the others it is never read
+    if video_index == 0 and preview is None:
+        preview = start_preview(workflow_path, target_width, target_height)
+
+    # Never holds the raw file, but the str grows with the video; output_mode "url" is the bounded path
+    with timer.phase("base64"):
+        video_b64 = encode_base64_file(video_path)
+
+    workflow_b64 = None
+    if preview is not None:
+        with timer.phase("preview_resize"):
+            workflow_bytes = preview.result()
+        with timer.phase("base64"):
+            workflow_b64 = base64.b64encode(workflow_bytes).decode('utf-8')
+
+    print("runpod-worker-comfy - Video and workflow preview processed successfully")
+    return {
+        "status": "success",
+        "video": video_b64,
+        "workflow_preview": workflow_b64
+    }
+
+def build_output(result, video_index, output_mode):
+    """Shape processed outputs into the handler response"""
+    if output_mode == "url":
+        output = {
+            "video_url": result["video_upload"]["url"],
+            "video_size": result["video_upload"]["size"],
+            "video_sha256": result["video_upload"]["sha256"]
+        }
+        if result["preview_upload"]:
+            output.update({
+                "preview_url": result["preview_upload"]["url"],
+                "preview_size": result["preview_upload"]["size"],
+                "preview_sha256": result["preview_upload"]["sha256"]
+            })
+        return output
+    if video_index == 0:
         return {
-            "status": "error",
-            "message": f"Could not find files: {', '.join(missing)}"
+            "base64_video": result["video"],
+            "base64_preview": result["workflow_preview"]
         }
+    return {"base64_video": result["video"]}
+
+def build_hls_output(hls, workflow_path, job_id, target_width, target_height, video_index, timer, preview=None):
+    """Handler response for HLS output: the published segments plus, for video 0, the preview"""
+    output = {"hls": hls}
+    if video_index == 0:
+        with timer.phase("preview_resize"):
+            preview = (preview or start_preview(workflow_path, target_width, target_height)).result()
+        with timer.phase("preview_upload"):
+            output["preview_url"] = OBJECT_STORE.upload_bytes(preview, f"{job_id}/preview.jpg", "image/jpeg")["url"]
+    return output
+
+def remove_output_files(outputs):
+    """Delete the files in a history entry's outputs, e.g. those of a cancelled prompt"""
+    for node_output in outputs.values():
+        for items in node_output.values():
+            for item in items if isinstance(items, list) else []:
+                if not isinstance(item, dict) or item.get("type", "output") != "output" or "filename" not in item:
+                    continue
+                for name in (item["filename"], item.get("workflow")):
+                    if name:
+                        try:
+                            os.remove(os.path.join(COMFY_OUTPUT_PATH, item.get("subfolder", ""), name))
+                        except OSError:
+                            pass
+
+def stop_prompt(instance, prompt_id):
+    """Take a prompt no job is waiting for off its ComfyUI instance and delete whatever it wrote.
+
+    A pending prompt is removed from the queue; a running one is interrupted.
+    Interrupting only the given prompt needs a ComfyUI that accepts prompt_id on
+    /interrupt, so the queue is checked first.
+    """
+    comfy = instance.client
+    try:
+        comfy.delete_from_queue([prompt_id])
+        running = [item[1] for item in comfy.queue().get("queue_running", [])]
+        if prompt_id in running:
+            comfy.interrupt(prompt_id)
+            print(f"runpod-worker-comfy - interrupted {prompt_id}")
+            entry = comfy.wait_for_prompt(prompt_id, timeout=INTERRUPT_GRACE_S)
+        else:
+            # Still pending, or it finished meanwhile
+            entry = comfy.history(prompt_id).get(prompt_id)
+            print(f"runpod-worker-comfy - removed {prompt_id} from the queue")
+        if entry is not None:
+            remove_output_files(instance.localize(entry.get("outputs") or {}))
+            comfy.delete_history([prompt_id])
+    except (requests.RequestException, PromptLost) as e:
+        print(f"runpod-worker-comfy - Could not stop {prompt_id}: {e}")
+
+def execute_workflow(workflow, timer=None, progress=None, on_queued=None, cancel=None, free_on_oom=False,
+                     instance=None):
+    """Run a workflow on the least-loaded ComfyUI instance; returns (outputs, error).
+
+    on_queued() is called once the prompt is queued. If the cancel token fires
+    first, the prompt is stopped and the error is the token's message. With
+    free_on_oom, an instance that runs out of memory unloads its models so a
+    retry starts from a clean GPU. instance pins the workflow to one instance.
+    """
+    if cancel is not None and cancel.fired:
+        return None, cancel.message()
+    timer = timer or JobTimer()
+    timer.set_workflow(workflow)
+    def on_event(event):
+        timer.on_event(event)
+        if progress is not None:
+            progress.on_event(event)
+
+    pinned = instance is not None
+    instance = COMFY_POOL.acquire(workflow, instance)
+    try:
+        comfy = instance.client
+        # Check if ComfyUI is available; after warm-up it is known to be
+        if not instance.ready.is_set():
+            with timer.phase("server_check"):
+                ready = comfy.wait_until_ready()
+            if not ready:
+                print(f"runpod-worker-comfy - Failed to connect to server at {comfy.base_url}")
+                return None, "ComfyUI server not available"
+            print("runpod-worker-comfy - API is reachable")
+
+        # A prompt lost to a crashed or restarted ComfyUI is queued again on another healthy instance
+        reroutes = 0 if pinned else len(COMFY_POOL.instances) - 1
+        while True:
+            with timer.phase("queue"):
+                # Events are routed by prompt_id over one shared socket per instance, so other
+                # jobs' prompts and history entries can stay where they are
+                events = comfy.events()
+
+                # Queue workflow
+                try:
+                    try:
+                        queued = comfy.prompt(workflow)
+                    except requests.ConnectionError:
+                        COMFY_POOL.mark_down(instance)
+                        if not pinned and COMFY_POOL.healthy():
+                            # Another GPU's ComfyUI is up; run there while this one restarts
+                            COMFY_POOL.release(instance)
+                            instance = COMFY_POOL.acquire(workflow)
+                            comfy = instance.client
+                            events = comfy.events()
+                        # ComfyUI went away after warm-up; give it the usual time to come back
+                        elif not comfy.wait_until_ready():
+                            return None, "ComfyUI server not available"
+                        queued = comfy.prompt(workflow)
+                    prompt_id = queued["prompt_id"]
+                    print(f"runpod-worker-comfy - queued workflow with ID {prompt_id} on {comfy.host}")
+                except Exception as e:
+                    return None, f"Error queuing workflow: {str(e)}"
+            if on_queued is not None:
+                on_queued()
+
+            # Wait for completion, timing each node from its execution events
+            print("runpod-worker-comfy - waiting for video generation")
+            with timer.phase("wait"):
+                try:
+                    entry = comfy.wait_for_prompt(prompt_id, events, timeout=COMFY_JOB_TIMEOUT_S, on_event=on_event,
+                                                  stop=cancel.event if cancel is not None else None)
+                    break
+                except PromptLost as e:
+                    # Waiting out the timeout cannot help, and new work should go elsewhere until
+                    # the health monitor sees the instance answer again
+                    print(f"runpod-worker-comfy - lost {prompt_id}: {e}")
+                    COMFY_POOL.mark_down(instance)
+                    if not reroutes or not COMFY_POOL.healthy() or (cancel is not None and cancel.fired):
+                        return None, f"{COMFY_UNREACHABLE_ERROR}: {e}"
+                    reroutes -= 1
+                    COMFY_POOL.release(instance)
+                    instance = COMFY_POOL.acquire(workflow)
+                    comfy = instance.client
+                    print(f"runpod-worker-comfy - requeuing the workflow on {comfy.host}")
+        if entry is None:
+            # Otherwise the sampler keeps the GPU busy for a result nobody reads
+            with timer.phase("cancel"):
+                stop_prompt(instance, prompt_id)
+            if cancel is not None and cancel.fired:
+                return None, cancel.message()
+        else:
+            # Drop only this job's entry; clearing all of /history would break jobs still running
+            try:
+                comfy.delete_history([prompt_id])
+            except requests.RequestException as e:
+                print(f"runpod-worker-comfy - Could not delete history for {prompt_id}: {e}")
+        if entry is None:
+            return None, "Timeout waiting for video generation"
+        if not entry.get("outputs"):
+            if is_out_of_memory(entry):
+                if free_on_oom:
+                    try:
+                        comfy.free_memory()
+                        COMFY_POOL.forget_models(instance)
+                    except requests.RequestException as e:
+                        print(f"runpod-worker-comfy - Could not free ComfyUI memory: {e}")
+                return None, f"{OUT_OF_MEMORY_ERROR}: {execution_error_message(entry)}"
+            return None, f"ComfyUI execution failed: {execution_error_message(entry)}"
+        return instance.localize(entry["outputs"]), None
+    finally:
+        COMFY_POOL.release(instance)
+
+def job_vram_budget():
+    """VRAM a job may use in GB, read from ComfyUI once"""
+    global vram_budget
+    if vram_budget is None:
+        try:
+            # The instances of one pod have the same GPUs
+            instance = (COMFY_POOL.healthy() or COMFY_POOL.instances)[0]
+            vram_budget = vram_budget_gb(instance.client.system_stats)
+        except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+            print(f"runpod-worker-comfy - Could not read VRAM size, assuming {DEFAULT_VRAM_GB} GB: {e}")
+            return DEFAULT_VRAM_GB
+    return vram_budget
+
+class SegmentError(Exception):
+    """A segment of a segmented job failed to generate"""
+
+def generate_segments(generate, segments, rife_multiplier, timer, write):
+    """Generate segments in turn and cross-fade them into write(frames, width, height, fps).
+
+    The segments are independent generations, so the cross-fades are
+    transitions between separate clips.
+
+    A segment is only generated once the frames before its overlap have been
+    written, so a streaming writer publishes the start of the video while
+    later segments are still generating. Returns (write's result, preview_path, error).
+    """
+    paths = []
+    previews = []
+    generating = 0.0
+
+    def segment_frames():
+        nonlocal generating
+        for segment in segments:
+            start = time.perf_counter()
+            video_path, preview_path, error = generate(segment.index)
+            generating += time.perf_counter() - start
+            if error:
+                raise SegmentError(f"Segment {segment.index + 1}/{len(segments)}: {error}")
+            paths.append(video_path)
+            previews.append(preview_path)
+            yield read_frames(video_path)
+
+    started = time.perf_counter()
+    try:
+        frames = crossfade(segment_frames(), output_overlap(SEGMENT_OVERLAP_FRAMES, rife_multiplier))
+        try:
+            first = next(frames)
+            result = write(itertools.chain([first], frames), *video_info(paths[0]))
+        except SegmentError as e:
+            return None, None, str(e)
+        except (OSError, RuntimeError) as e:
+            return None, None, f"Stitching segments failed: {e}"
+        timer.add_phase("stitch", time.perf_counter() - started - generating)
+        print(f"runpod-worker-comfy - stitched {len(paths)} segments")
+        return result, previews[0], None
+    finally:
+        # Segment videos are intermediate; the first segment's preview stands for the job
+        for path in paths + previews[1:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def stream_hls(frames, width, height, fps, job_id, on_progress=None):
+    """Encode frames to HLS, uploading each segment as soon as ffmpeg finishes it.
+
+    Each segment is announced through on_progress as {"status": "segment", ...}
+    with its presigned URL. The playlist is uploaded last, rewritten to point at
+    the segments' presigned URLs so that it plays from a private bucket; it
+    stops playing once they expire (PRESIGNED_URL_EXPIRY_S). Returns the
+    output's "hls" section.
+    """
+    directory = os.path.join(COMFY_OUTPUT_PATH, "hls", job_id)
+    index = itertools.count()
+    urls = {}
+
+    def publish(name, path, seconds):
+        if name == PLAYLIST_NAME:
+            path = rewrite_playlist(path, urls, os.path.join(directory, f"presigned_{name}"))
+        item = {"name": name, "url": OBJECT_STORE.upload_file(path, f"{job_id}/hls/{name}", content_type(name))["url"]}
+        urls[name] = item["url"]
+        if seconds is not None:
+            item.update(index=next(index), duration_s=seconds)
+            if on_progress is not None:
+                on_progress(dict(item, status="segment"))
+        return item
 
-def validate_frame_count(num_frames):
-    """Ensure frame count follows HunyuanVideo requirements"""
-    if (num_frames - 1) % 4 != 0:
-        # Round up to next valid frame count
-        num_frames = ((num_frames - 1) // 4 * 4) + 5
-    return num_frames
-
-def adjust_frame_count_to_fit(num_frames, base_width, base_height):
-    pixels_per_frame = base_width * base_height
-    max_possible_frames = MAX_GENERATION_TOTAL // pixels_per_frame
-
-    adjusted_frames = ((max_possible_frames - 1) // 4 * 4) + 1
-
-    return adjusted_frames
-
-def handler(job):
+    try:
+        return encode_hls(frames, directory, width, height, fps, publish)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+active_jobs = 0
+active_jobs_lock = threading.Lock()
+first_job_pending = True
+
+def warm_up_instance(instance):
+    """Wait for one ComfyUI instance, then run a tiny workflow so its models are loaded before the first job"""
+    comfy = instance.client
+    ready = comfy.wait_until_ready(retries=int(WARMUP_READY_TIMEOUT_S / 0.05), delay=50)
+    record = {"host": comfy.host, "comfy_ready_s": round(time.time() - BOOT_TIME, 3), "ready": ready}
+    if not ready:
+        print(f"runpod-worker-comfy - ComfyUI at {comfy.host} not ready after {WARMUP_READY_TIMEOUT_S}s")
+        COMFY_POOL.mark_down(instance)
+        write_record(record, BOOT_EVENT)
+        return False
+    instance.ready.set()
+    record["vram_budget_gb"] = round(job_vram_budget(), 2)
+    print(f"runpod-worker-comfy - ComfyUI at {comfy.host} ready {record['comfy_ready_s']}s after boot, warming up")
+
+    timer = JobTimer()
+    with timer.phase("warmup"):
+        outputs, error = execute_workflow(TEMPLATES[COMFY_WORKFLOW].render(WARMUP_PARAMS), timer, instance=instance)
+    if error:
+        # Jobs can still run; they will pay for the model loads instead
+        print(f"runpod-worker-comfy - warm-up failed: {error}")
+    else:
+        video_path, workflow_path, _ = find_output_files(outputs)
+        for path in (video_path, workflow_path):
+            if path:
+                os.remove(path)
+    timings = timer.to_dict()
+    record.update(warmup_ok=not error, warmup_s=timings["phases"]["warmup"],
+                  cold_start_s=round(time.time() - BOOT_TIME, 3), by_class=timings["by_class"])
+    if error:
+        record["error"] = error
+    print(f"runpod-worker-comfy - warm-up took {record['warmup_s']}s, cold start {record['cold_start_s']}s")
+    write_record(record, BOOT_EVENT)
+    return True
+
+def warm_up():
+    """Warm up every ComfyUI instance at once; the worker takes jobs if any of them came up"""
+    if len(COMFY_POOL.instances) == 1:
+        return warm_up_instance(COMFY_POOL.instances[0])
+    with ThreadPoolExecutor(max_workers=len(COMFY_POOL.instances), thread_name_prefix="warmup") as pool:
+        ready = list(pool.map(warm_up_instance, COMFY_POOL.instances))
+    print(f"runpod-worker-comfy - {sum(ready)} of {len(ready)} ComfyUI instances ready")
+    return any(ready)
+
+# Cancel tokens of running jobs by job id, for cancel_job
+cancel_tokens = {}
+
+def cancel_job(job_id):
+    """Stop a running job; it returns {"error": ..., "status": "cancelled"}. False if it is not running"""
+    token = cancel_tokens.get(job_id)
+    if token is None:
+        return False
+    print(f"runpod-worker-comfy - cancelling job {job_id}")
+    token.cancel()
+    return True
+
+def handler(job, on_progress=None):
     """Main handler function"""
+    global active_jobs, first_job_pending
+    timeout = (job.get("input") or {}).get("execution_timeout", EXECUTION_TIMEOUT_S or None)
+    if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+        return {"error": "execution_timeout must be a positive number of seconds"}
+    cancel = CancelToken(timeout).start()
+    cancel_tokens[job.get("id")] = cancel
+    with active_jobs_lock:
+        active_jobs += 1
+        overlapping = active_jobs > 1
+        first_job, first_job_pending = first_job_pending, False
+    stats_before = COMFY_POOL.stats()
+    # Resetting the peak would clobber the reading of a job already running
+    memory = PeakMemory().start(reset=not overlapping)
+    timer = JobTimer()
+    try:
+        if "clips" in (job.get("input") or {}):
+            output = run_batch(job, timer, on_progress, cancel)
+        else:
+            output = run_job(job, timer, on_progress, cancel=cancel)
+    finally:
+        cancel.close()
+        cancel_tokens.pop(job.get("id"), None)
+        with active_jobs_lock:
+            active_jobs -= 1
+    if cancel.fired and "error" in output:
+        # Whichever step noticed first, report the cancellation itself
+        output = dict(output, error=cancel.message(), status=cancel.reason)
+        print(f"runpod-worker-comfy - {output['error']}")
+
+    timings = timer.to_dict()
+    overhead = COMFY_POOL.stats_since(stats_before)
+    total_ms = sum(values["total_ms"] for values in overhead.values())
+    calls = sum(values["calls"] for values in overhead.values())
+    print(f"runpod-worker-comfy - control plane: {calls} calls, {total_ms:.1f} ms {json.dumps(overhead)}")
+    memory_report = memory.report()
+    print(f"runpod-worker-comfy - memory: {json.dumps(memory_report)}")
+    record = {
+        "job_id": job.get("id"),
+        "status": "error" if "error" in output else "success",
+        "cached": bool(output.get("cached")),
+        "overlapping": overlapping,
+        "first_job": first_job,
+        "variant": output.get("variant"),
+        "timings": timings,
+        "control_plane": overhead,
+        "memory": memory_report,
+    }
+    if first_job:
+        record["boot_to_result_s"] = round(time.time() - BOOT_TIME, 3)
+    write_record(record)
+    return dict(output, timings=timings)
+
+batch_pool = ThreadPoolExecutor(max_workers=MAX_BATCH_CLIPS, thread_name_prefix="clip")
+
+def run_batch(job, timer, on_progress=None, cancel=None):
+    """Generate every clip of a batch job; returns {"clips": [clip outputs in order]}.
+
+    Each clip is the job input without "clips", updated with the clip's own
+    fields, so a shared prompt or size is given once. A clip's prompt is
+    queued right behind the previous one's, so ComfyUI runs them back to back
+    with the models loaded and repeated text encodes cached, while earlier
+    clips' outputs are encoded or uploaded. A clip's video_index is its
+    position, so only clip 0 gets a preview. The job fails only if every clip
+    does.
+    """
+    job_input = job["input"]
+    clips = job_input["clips"]
+    if not isinstance(clips, list) or not clips or not all(isinstance(clip, dict) for clip in clips):
+        return {"error": "clips must be a non-empty list of objects"}
+    if len(clips) > MAX_BATCH_CLIPS:
+        return {"error": f"{len(clips)} clips is more than the {MAX_BATCH_CLIPS} a batch may hold"}
+    shared = {key: value for key, value in job_input.items() if key != "clips"}
+
+    def clip_progress(index):
+        if on_progress is None:
+            return None
+        return lambda message: on_progress(dict(message, clip=index, clips=len(clips)))
+
+    timers = [JobTimer() for _ in clips]
+    futures = []
+    with timer.phase("batch"):
+        for index, clip in enumerate(clips):
+            # A clip's position decides its video_index, whatever the clip says
+            clip_job = {"id": f"{job['id']}-{index}", "input": {**shared, **clip, "video_index": index}}
+            queued = threading.Event()
+            future = batch_pool.submit(run_job, clip_job, timers[index], clip_progress(index), queued.set, cancel)
+            future.add_done_callback(lambda _, queued=queued: queued.set())
+            futures.append(future)
+            # The next clip's prompt goes in right behind this one
+            queued.wait()
+        outputs = []
+        for future in futures:
+            # One clip raising must not take the rest of the batch down with it
+            try:
+                outputs.append(future.result())
+            except Exception as e:
+                outputs.append({"error": f"Unexpected error: {str(e)}"})
+
+    for index, (output, clip_timer) in enumerate(zip(outputs, timers)):
+        output["timings"] = clip_timer.to_dict()
+        write_record({
+            "job_id": f"{job['id']}-{index}",
+            "batch_id": job["id"],
+            "status": "error" if "error" in output else "success",
+            "cached": bool(output.get("cached")),
+            "variant": output.get("variant"),
+            "timings": output["timings"],
+        })
+    failed = [index for index, output in enumerate(outputs) if "error" in output]
+    print(f"runpod-worker-comfy - batch of {len(clips)} clips, {len(failed)} failed")
+    if len(failed) == len(clips):
+        return {"error": f"Every clip failed; clip 0: {outputs[0]['error']}", "clips": outputs}
+    return {"clips": outputs}
+
+def run_job(job, timer, on_progress=None, on_queued=None, cancel=None):
+    """Generate one video and return the handler output"""
     try:
         job_input = job["input"]
         if not job_input or "prompt" not in job_input:
@@ -187,37 +682,88 @@ def handler(job):
 
         prompt = prompt + " The scene appears to be real life footage with a hyper-realistic art style."
 
-        # Calculate optimal generation dimensions
+        # Calculate optimal generation dimensions and the longest clip the lowest-memory variant can sample
+        budget = job_vram_budget()
         try:
-            base_width, base_height = calculate_generation_dimensions(target_width, target_height)
+            plan = plan_generation(target_width, target_height, job_input.get("num_frames", 17),
+                                   frame_limit=frame_limit(PROFILES[-1][1], budget, MAX_GENERATION_FRAMES))
         except ValueError as e:
             return {"error": str(e)}
+        base_width, base_height, num_frames = plan.base_width, plan.base_height, plan.num_frames
+        if num_frames < 1:
+            return {"error": f"{base_width}x{base_height} does not fit in {budget:.1f} GB of VRAM"}
+
+        # With segmented set, a clip longer than one generation can hold runs as overlapping
+        # segments instead of being cut short. Each segment is generated on its own, so the
+        # result is a run of clips joined by cross-fades, not one continuous take
+        segments = None
+        if job_input.get("segmented") and validate_frame_count(plan.requested_frames) > plan.max_frames:
+            try:
+                segments = plan_segments(plan.requested_frames, plan.max_frames)
+            except ValueError as e:
+                return {"error": str(e)}
+            if len(segments) > MAX_SEGMENTS:
+                return {"error": f"{plan.requested_frames} frames needs {len(segments)} segments, more than {MAX_SEGMENTS}"}
+            num_frames = segments[0].num_frames
+        timer.set_bucket(base_width, base_height, num_frames)
+
+        # Fastest variant the memory model expects to fit
+        variant, estimate = choose_variant(PROFILES, base_width, base_height, num_frames, budget)
 
-        num_frames = validate_frame_count(job_input.get("num_frames", 17))
         fps = job_input.get("fps", 24)
         num_inference_steps = job_input.get("num_inference_steps", 15)
         guidance_scale = job_input.get("guidance_scale", 10)
         flow_shift = job_input.get("flow_shift", 8)
+        negative_prompt = job_input.get("negative_prompt", "")
         video_index = job_input.get("video_index", None)
-
-        # Validate total size
-        if base_width * base_height * num_frames > MAX_GENERATION_TOTAL:
-            print(f"runpod-worker-comfy - Total size exceeds maximum allowed: {base_width}x{base_height}x{num_frames}")
-            print(f"runpod-worker-comfy - Adjusting frame count to fit maximum size: previous={num_frames}")
-            num_frames = adjust_frame_count_to_fit(num_frames, base_width, base_height)
+        output_mode = job_input.get("output_mode", OUTPUT_MODE)
+        if output_mode not in OUTPUT_MODES:
+            return {"error": f"Invalid output_mode: {output_mode} (expected one of {', '.join(OUTPUT_MODES)})"}
+        if output_mode in ("url", "hls") and OBJECT_STORE is None:
+            return {"error": f"output_mode '{output_mode}' requires BUCKET_ENDPOINT_URL to be configured"}
+        cache_mode = job_input.get("result_cache", "use")
+        if cache_mode not in CACHE_MODES:
+            return {"error": f"Invalid result_cache: {cache_mode} (expected one of {', '.join(CACHE_MODES)})"}
+        tier = job_input.get("tier")
+        if tier is not None and tier not in TIERS:
+            return {"error": f"Invalid tier: {tier} (expected one of {', '.join(TIERS)})"}
+        deadline_seconds = job_input.get("deadline_seconds")
+        if deadline_seconds is not None and (not isinstance(deadline_seconds, (int, float)) or deadline_seconds <= 0):
+            return {"error": "deadline_seconds must be a positive number"}
+
+        # With a tier or deadline, steps, TeaCache, RIFE and upscaling come from the cost model
+        template = TEMPLATES[variant]
+        capabilities = template_capabilities(template.workflow)
+        settings = {"steps": num_inference_steps, "teacache": 0.0,
+                    "rife_multiplier": capabilities["rife_multiplier"], "upscale": capabilities["upscale"]}
+        quality = None
+        if tier is not None or deadline_seconds is not None:
+            # The cost model predicts one generation; a segmented job's deadline is shared between segments
+            segment_deadline = deadline_seconds / len(segments) if segments and deadline_seconds else deadline_seconds
+            quality = choose_settings(COST_MODEL, {
+                "base_width": base_width, "base_height": base_height, "num_frames": num_frames,
+                "target_width": target_width, "target_height": target_height,
+            }, capabilities, tier, segment_deadline)
+            quality.update(tier=tier, deadline_seconds=deadline_seconds)
+            settings = quality["settings"]
+            num_inference_steps = settings["steps"]
+            print(f"runpod-worker-comfy - planned {json.dumps(settings)}, predicted {quality['predicted_seconds']}s")
+        timer.set_settings(dict(settings, base_width=base_width, base_height=base_height, num_frames=num_frames,
+                                target_width=target_width, target_height=target_height,
+                                segments=len(segments) if segments else 1))
+        extras = {"quality": quality} if quality else {}
+
+        if segments:
+            print(f"runpod-worker-comfy - {plan.requested_frames} frames in {len(segments)} segments: "
+                  f"{[segment.num_frames for segment in segments]}")
+        elif num_frames != validate_frame_count(plan.requested_frames):
+            print(f"runpod-worker-comfy - Total size exceeds maximum allowed: {base_width}x{base_height}x{validate_frame_count(plan.requested_frames)}")
             print(f"runpod-worker-comfy - Adjusted frame count: new={num_frames}")
 
-        # Check if ComfyUI is available
-        if not check_server(f"http://{COMFY_HOST}"):
-            return {"error": "ComfyUI server not available"}
-
-        # Clear history
-        requests.post(f"http://{COMFY_HOST}/history", json={"clear": True})
-
-        # Prepare and update workflow
-        generator = HunyuanGenerator()
-        workflow = generator.update_workflow({
+        # Render the workflow from the compiled template
+        params = {
             "prompt": prompt,
+            "negative_prompt": negative_prompt,
             "base_width": base_width,
             "base_height": base_height,
             "target_width": target_width,
@@ -227,43 +773,195 @@ def handler(job):
             "num_inference_steps": num_inference_steps,
             "guidance_scale": guidance_scale,
             "flow_shift": flow_shift
-        })
-
-        # Queue workflow
+        }
+        def render(template, segment=None):
+            workflow = template.render(params if segment is None else dict(params, num_frames=segment.num_frames))
+            if segment is not None:
+                workflow = segment_workflow(workflow, segment)
+            return apply_settings(workflow, settings, fps) if quality else workflow
+        with timer.phase("template_render"):
+            workflows = [render(template, segment) for segment in segments] if segments else [render(template)]
+        workflow = {"segments": workflows, "overlap": SEGMENT_OVERLAP_FRAMES} if segments else workflows[0]
+        extras["variant"] = {"name": variant, "estimated_vram_gb": round(estimate, 2),
+                             "vram_budget_gb": round(budget, 2), "oom_retries": 0}
+        if segments:
+            extras["segments"] = {"count": len(segments), "frames": [segment.num_frames for segment in segments],
+                                  "overlap_frames": SEGMENT_OVERLAP_FRAMES,
+                                  "total_frames": segments[-1].start + segments[-1].num_frames,
+                                  # Segments are independent generations cross-faded together
+                                  "continuous": False}
+
+        # Serve repeats of a deterministic workflow from the result cache, and let
+        # identical requests already in flight finish instead of generating twice
+        # HLS is encoded from the generated frames and published as it goes, not served from a stored file
+        use_cache = RESULT_CACHE is not None and cache_mode != "bypass" and output_mode != "hls"
+        cache_key = workflow_key(workflow) if use_cache else None
+        lease = None
+        if use_cache:
+            if cache_mode == "refresh":
+                RESULT_CACHE.invalidate(cache_key)
+            with timer.phase("cache_lookup"):
+                cached, lease = RESULT_CACHE.acquire(cache_key, COMFY_JOB_TIMEOUT_S,
+                                                     stop=cancel.event if cancel is not None else None)
+            if cancel is not None and cancel.fired:
+                # Cancelled while an identical request was still generating
+                if lease is not None:
+                    lease.release()
+                return {"error": cancel.message()}
+            if cached:
+                print(f"runpod-worker-comfy - result cache hit {cache_key}")
+                result = process_output_files(cached.video_path, cached.preview_path, job["id"],
+                                              target_width, target_height, video_index, output_mode, timer)
+                return dict(build_output(result, video_index, output_mode), cached=True, **extras)
+
+        predicted_stages = COST_MODEL.predict(timer.settings)["stages"]
+        def generate(index):
+            """Run one workflow (or segment) to its output files; after running out of memory,
+            free ComfyUI's memory and retry on the next lower-memory variant"""
+            segment = segments[index] if segments else None
+            workflow = workflows[index]
+            # An earlier segment ran out of memory and moved the job to a lower-memory variant
+            if extras["variant"]["name"] != variant:
+                workflow = render(TEMPLATES[extras["variant"]["name"]], segment)
+            progress = None
+            if on_progress is not None:
+                # The estimate covers the segments still to come
+                later = sum(predicted_stages.values()) * (len(segments) - index - 1) if segments else 0
+                def emit(message):
+                    if segments:
+                        message.update(segment=index, segments=len(segments))
+                        message["eta_s"] = round(message["eta_s"] + later * progress.pace, 1)
+                    on_progress(message)
+                progress = ProgressTracker(workflow, predicted_stages, emit)
+            frames = segment.num_frames if segment else num_frames
+            fallbacks = VARIANTS[VARIANTS.index(extras["variant"]["name"]) + 1:]
+            # ComfyUI frees its memory after running out only if there is a variant left to retry on
+            outputs, error = execute_workflow(workflow, timer, progress, on_queued, cancel, free_on_oom=bool(fallbacks))
+            while error and error.startswith(OUT_OF_MEMORY_ERROR) and fallbacks:
+                fallback = fallbacks.pop(0)
+                print(f"runpod-worker-comfy - {error}; retrying on {fallback}")
+                with timer.phase("template_render"):
+                    workflow = render(TEMPLATES[fallback], segment)
+                extras["variant"].update(name=fallback, oom_retries=extras["variant"]["oom_retries"] + 1,
+                                         estimated_vram_gb=round(estimate_gb(dict(PROFILES)[fallback], base_width,
+                                                                             base_height, frames), 2))
+                outputs, error = execute_workflow(workflow, timer, progress, cancel=cancel, free_on_oom=bool(fallbacks))
+            if error:
+                return None, None, error
+            embedding_hits = embedding_cache_hits(outputs)
+            if embedding_hits:
+                print(f"runpod-worker-comfy - embedding cache: {json.dumps(embedding_hits)}")
+            with timer.phase("output_read"):
+                return find_output_files(outputs)
+        def write_hls(frames, width, height, fps):
+            return stream_hls(frames, width, height, fps, job["id"], on_progress)
+        def write_mp4(frames, width, height, fps):
+            stitched_path = os.path.join(COMFY_OUTPUT_PATH, f"{job['id']}_stitched.mp4")
+            try:
+                write_frames(stitched_path, frames, width, height, fps)
+            except BaseException:
+                # A later segment failed or the job was cancelled; drop the partial file
+                if os.path.exists(stitched_path):
+                    os.remove(stitched_path)
+                raise
+            return stitched_path
+        hls = None
+        preview = None
         try:
-            queued = queue_workflow(workflow)
-            prompt_id = queued["prompt_id"]
-            print(f"runpod-worker-comfy - queued workflow with ID {prompt_id}")
-        except Exception as e:
-            return {"error": f"Error queuing workflow: {str(e)}"}
-
-        # Poll for completion
-        print("runpod-worker-comfy - waiting for video generation")
-        retries = 0
-        while retries < COMFY_POLLING_MAX_RETRIES:
-            history = get_history(prompt_id)
-
-            if prompt_id in history and history[prompt_id].get("outputs"):
-                # Process output video with target dimensions
-                result = process_output_video(history[prompt_id]["outputs"], job["id"], target_width, target_height, video_index)
-                if result["status"] == "success":
-                    if video_index == 0:
-                        return {
-                            "base64_video": result["video"],
-                            "base64_preview": result["workflow_preview"]
-                        }
-                    else:
-                        return {"base64_video": result["video"]}
-                else:
-                    return {"error": result["message"]}
-
-            time.sleep(COMFY_POLLING_INTERVAL_MS / 1000)
-            retries += 1
-
-        return {"error": "Timeout waiting for video generation"}
+            if segments:
+                result, workflow_path, error = generate_segments(generate, segments, settings["rife_multiplier"], timer,
+                                                                 write_hls if output_mode == "hls" else write_mp4)
+                video_path, hls = (None, result) if output_mode == "hls" else (result, None)
+            else:
+                video_path, workflow_path, error = generate(0)
+                if not error and video_index == 0:
+                    # Render the preview while the video is encoded
+                    preview = start_preview(workflow_path, target_width, target_height)
+                if not error and output_mode == "hls":
+                    with timer.phase("hls"):
+                        try:
+                            hls = write_hls(read_frames(video_path), *video_info(video_path))
+                        except (OSError, RuntimeError) as e:
+                            error = f"HLS encoding failed: {e}"
+            if error:
+                return {"error": error}
+            if use_cache:
+                with timer.phase("cache_store"):
+                    RESULT_CACHE.put(cache_key, video_path, workflow_path, {"job_id": job["id"]})
+        finally:
+            if lease:
+                lease.release()
+
+        if hls is not None:
+            return dict(build_hls_output(hls, workflow_path, job["id"], target_width, target_height, video_index, timer,
+                                         preview), **extras)
+
+        # Process output video with target dimensions
+        result = process_output_files(video_path, workflow_path, job["id"], target_width, target_height, video_index,
+                                      output_mode, timer, preview)
+        return dict(build_output(result, video_index, output_mode), **extras)
 
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}"}
 
+job_pool = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="job")
+
+def stream_handler(job):
+    """Generator handler: progress messages while the job runs, then the handler output"""
+    updates = queue.Queue()
+    future = job_pool.submit(handler, job, updates.put)
+    try:
+        while not future.done() or not updates.empty():
+            try:
+                yield updates.get(timeout=0.5)
+            except queue.Empty:
+                pass
+    finally:
+        # Closed before the result, e.g. RunPod dropped the job; stop generating for it
+        if not future.done():
+            cancel_job(job.get("id"))
+    yield future.result()
+
+async def async_handler(job):
+    """Run handler in a thread, leaving the loop free for the next job and for RunPod stopping this one"""
+    try:
+        return await asyncio.to_thread(handler, job)
+    except asyncio.CancelledError:
+        cancel_job(job.get("id"))
+        raise
+
+async def async_stream_handler(job):
+    """stream_handler for a worker running several jobs at once"""
+    messages = stream_handler(job)
+    try:
+        while True:
+            message = await asyncio.to_thread(next, messages, None)
+            if message is None:
+                return
+            yield message
+    except (asyncio.CancelledError, GeneratorExit):
+        cancel_job(job.get("id"))
+        raise
+
+def concurrency_modifier(current_concurrency):
+    return MAX_CONCURRENCY
+
+def serverless_config():
+    """The runpod.serverless.start config for this worker's settings"""
+    # RunPod stops a job (/cancel, or its timeout) by cancelling the task running it. Only the
+    # async handlers see that, and a sync handler would block the loop that delivers it, so
+    # they are used even for one job at a time
+    config = {"handler": async_stream_handler if STREAM_PROGRESS else async_handler}
+    if STREAM_PROGRESS:
+        # /status and /runsync still return the result, as the last entry of the aggregated list
+        config["return_aggregate_stream"] = True
+    if MAX_CONCURRENCY > 1:
+        config["concurrency_modifier"] = concurrency_modifier
+    return config
+
 if __name__ == "__main__":
-    runpod.serverless.start({"handler": handler})
\ No newline at end of file
+    # Take jobs only once ComfyUI is up and the models are loaded
+    if WARMUP and not warm_up():
+        sys.exit(1)
+    COMFY_POOL.start_monitor()
+    runpod.serverless.start(serverless_config())
\ No newline at end of file
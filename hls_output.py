@@ -0,0 +1,175 @@
+"""HLS output with fragmented MP4 segments, published while the video is still encoding.
+
+Frames are piped into ffmpeg, which cuts a segment every HLS_SEGMENT_SECONDS
+(a keyframe is forced at each cut) and appends it to an event playlist once
+it is complete. A SegmentWatcher polls the playlist and hands each new segment,
+after the init segment, to a publish callback. The callback can copy the
+segment to object storage or announce it in a streamed handler update. A
+client can start playback after the first segment instead of waiting for the
+whole file.
+
+ffmpeg's playlist names segments relative to itself. When each segment is
+published under its own URL (e.g. presigned), rewrite_playlist points the
+playlist at those URLs before it is published.
+
+Segments are H.264 rather than the templates' H.265 so that browsers can play
+them through Media Source Extensions.
+"""
+import os
+import subprocess
+import threading
+
+from video_segments import ffmpeg_binary
+
+HLS_SEGMENT_SECONDS = float(os.environ.get("HLS_SEGMENT_SECONDS", "1.0"))
+HLS_POLL_INTERVAL_S = float(os.environ.get("HLS_POLL_INTERVAL_S", "0.1"))
+HLS_CRF = int(os.environ.get("HLS_CRF", "23"))
+PLAYLIST_NAME = "playlist.m3u8"
+INIT_NAME = "init.mp4"
+CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".mp4": "video/mp4", ".m4s": "video/iso.segment"}
+
+
+def content_type(name):
+    return CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+
+
+class HlsWriter:
+    """Pipe RGB frames into ffmpeg writing an HLS event playlist of fMP4 segments"""
+
+    def __init__(self, directory, width, height, fps, segment_seconds=HLS_SEGMENT_SECONDS, crf=HLS_CRF):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frames = 0
+        gop = max(1, round(fps * segment_seconds))
+        self.process = subprocess.Popen([
+            ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-c:v", "libx264", "-preset", "veryfast", "-tune", "zerolatency", "-crf", str(crf),
+            "-pix_fmt", "yuv420p", "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+            "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "event",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", INIT_NAME,
+            "-hls_flags", "independent_segments+temp_file",
+            "-hls_segment_filename", os.path.join(directory, "segment_%05d.m4s"),
+            os.path.join(directory, PLAYLIST_NAME),
+        ], stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+        self.frames += 1
+
+    def close(self):
+        """Finish the playlist; raises RuntimeError if ffmpeg failed"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        stderr = self.process.stderr.read().decode(errors="replace")
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {self.process.returncode}: {stderr.strip()}")
+
+
+def read_playlist(path):
+    """(init segment name or None, [(segment name, seconds)], ended) from an HLS playlist"""
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None, [], False
+    init = None
+    segments = []
+    duration = None
+    for line in lines:
+        if line.startswith("#EXT-X-MAP:"):
+            init = line.split('URI="', 1)[1].split('"', 1)[0]
+        elif line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#") and duration is not None:
+            segments.append((line, duration))
+            duration = None
+    return init, segments, "#EXT-X-ENDLIST" in lines
+
+
+def rewrite_playlist(path, uris, rewritten_path):
+    """Copy the playlist at path to rewritten_path with segment and init names replaced by uris[name]"""
+    with open(path) as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("#EXT-X-MAP:"):
+            name = line.split('URI="', 1)[1].split('"', 1)[0]
+            lines[i] = line.replace(f'URI="{name}"', f'URI="{uris[name]}"')
+        elif line and not line.startswith("#"):
+            lines[i] = uris[line]
+    with open(rewritten_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return rewritten_path
+
+
+class SegmentWatcher:
+    """Publish segments as ffmpeg adds them to the playlist.
+
+    publish(name, path, seconds) is called from the watcher thread for the init
+    segment (seconds None), then for each media segment in order, and last for
+    the finished playlist (seconds None). Its return values are collected.
+    """
+
+    def __init__(self, directory, publish, interval=HLS_POLL_INTERVAL_S):
+        self.directory = directory
+        self.publish = publish
+        self.interval = interval
+        self.init = None
+        self.segments = []
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="hls-watcher")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        if self.error is not None:
+            return
+        try:
+            init, segments, _ = read_playlist(os.path.join(self.directory, PLAYLIST_NAME))
+            if init and self.init is None:
+                self.init = self.publish(init, os.path.join(self.directory, init), None)
+            if self.init is None:
+                return
+            for name, seconds in segments[len(self.segments):]:
+                self.segments.append(self.publish(name, os.path.join(self.directory, name), seconds))
+        except Exception as e:
+            # Publishing failed (e.g. an upload); report it when the stream is finished
+            self.error = e
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def finish(self):
+        """Publish what is left once ffmpeg has exited; returns init, segments and playlist"""
+        self.stop()
+        self.poll()
+        if self.error is not None:
+            raise RuntimeError(f"Publishing HLS segments failed: {self.error}")
+        playlist = self.publish(PLAYLIST_NAME, os.path.join(self.directory, PLAYLIST_NAME), None)
+        return {"playlist": playlist, "init": self.init, "segments": self.segments}
+
+
+def encode_hls(frames, directory, width, height, fps, publish, segment_seconds=HLS_SEGMENT_SECONDS):
+    """Encode frames to HLS in directory, publishing segments as they are finished"""
+    writer = HlsWriter(directory, width, height, fps, segment_seconds)
+    watcher = SegmentWatcher(directory, publish).start()
+    try:
+        try:
+            for frame in frames:
+                writer.write(frame)
+        finally:
+            writer.close()
+    except BaseException:
+        watcher.stop()
+        raise
+    return watcher.finish()
@@ -0,0 +1,250 @@
+"""asyncio client for the HunyuanVideo RunPod endpoint.
+
+Submits many jobs with a cap on how many are in flight, picks /runsync for
+jobs expected to finish within RunPod's synchronous window and /run plus
+polling otherwise, and polls with exponential backoff and full jitter so a
+batch of clients does not hit /status in lockstep. A job's timeout covers
+submitting and polling, and a job still running when it passes is cancelled. Outputs are written
+straight to disk: inline base64 is decoded in slices, URLs are streamed.
+Cancelling the task running a job also cancels the job on the endpoint.
+With on_progress, jobs are followed through /stream instead, so the
+worker's progress messages (node, sampler step, ETA) and, with
+output_mode "hls", each published segment reach the caller as they are
+produced.
+
+    async with HunyuanClient(endpoint, api_key, max_concurrency=4) as client:
+        results = await client.run_many(inputs, output_dir="videos")
+
+Works against mock_runpod.py for offline runs; see benchmarks/bench_client.py.
+"""
+import asyncio
+import binascii
+import os
+import random
+import time
+from collections import namedtuple
+
+import aiohttp
+
+from job_progress import final_output, is_update
+
+DEFAULT_ENDPOINT = os.environ.get("RUNPOD_ENDPOINT_URL", "https://api.runpod.ai/v2/lgm5rz8ogoqvgp")
+# RunPod holds /runsync requests for about 90 s before answering with the job still in progress
+RUNSYNC_HOLD_S = 90
+# Jobs expected to take longer than this go straight to /run
+RUNSYNC_MAX_SECONDS = 60
+POLL_INITIAL_S = 0.25
+POLL_MAX_S = 8.0
+DECODE_CHUNK_CHARS = 4 * 256 * 1024
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+
+# files maps output names ("video", "preview") to paths on disk; output keeps everything else
+JobResult = namedtuple("JobResult", "job_id status output files error delay_s execution_s")
+
+# Output fields written to disk: inline key, URL key, file name suffix
+OUTPUT_FILES = (
+    ("video", "base64_video", "video_url", ".mp4"),
+    ("preview", "base64_preview", "preview_url", "_preview.jpg"),
+)
+
+
+def write_base64(data, path, chunk_chars=DECODE_CHUNK_CHARS):
+    """Decode a base64 string to a file slice by slice instead of all at once"""
+    if chunk_chars % 4:
+        raise ValueError("chunk_chars must be a multiple of 4")
+    written = 0
+    with open(path, "wb") as f:
+        for start in range(0, len(data), chunk_chars):
+            chunk = binascii.a2b_base64(data[start:start + chunk_chars])
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def backoff_delays(initial=POLL_INITIAL_S, maximum=POLL_MAX_S, rng=random):
+    """Exponential backoff with full jitter: uniform(0, min(maximum, initial * 2**n))"""
+    ceiling = initial
+    while True:
+        yield rng.uniform(0, ceiling)
+        ceiling = min(ceiling * 2, maximum)
+
+
+class HunyuanClient:
+    def __init__(self, endpoint=DEFAULT_ENDPOINT, api_key=None, max_concurrency=4,
+                 runsync_max_seconds=RUNSYNC_MAX_SECONDS, poll_initial=POLL_INITIAL_S, poll_max=POLL_MAX_S,
+                 session=None):
+        self.endpoint = endpoint.rstrip("/")
+        self.api_key = api_key if api_key is not None else os.environ.get("RUNPOD_API_KEY")
+        self.runsync_max_seconds = runsync_max_seconds
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = session
+        self._owns_session = session is None
+
+    async def __aenter__(self):
+        if self._session is None:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._session = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=None, sock_connect=10))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method, path, **kwargs):
+        async with self._session.request(method, f"{self.endpoint}/{path}", **kwargs) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    # -- endpoint operations ------------------------------------------------
+
+    async def submit(self, job_input):
+        """Queue a job with /run; returns its id"""
+        return (await self._request("POST", "run", json={"input": job_input}))["id"]
+
+    async def run_sync(self, job_input):
+        """Run a job with /runsync; the status may still be in progress if it outlived RunPod's wait"""
+        return await self._request("POST", "runsync", json={"input": job_input},
+                                   timeout=aiohttp.ClientTimeout(total=RUNSYNC_HOLD_S + 30))
+
+    async def status(self, job_id):
+        return await self._request("GET", f"status/{job_id}")
+
+    async def stream(self, job_id):
+        """Status plus the messages the job yielded since the last call"""
+        return await self._request("GET", f"stream/{job_id}")
+
+    async def cancel(self, job_id):
+        return await self._request("POST", f"cancel/{job_id}")
+
+    async def wait(self, job_id, timeout=None, on_progress=None, deadline=None):
+        """Poll /status with jittered exponential backoff until the job finishes.
+
+        With on_progress, /stream is polled instead and on_progress(job_id,
+        message) is called for every progress or segment message; the backoff restarts
+        whenever messages arrive. deadline, a time.monotonic() value, bounds the
+        wait instead of timeout.
+        """
+        if deadline is None and timeout:
+            deadline = time.monotonic() + timeout
+        delays = backoff_delays(self.poll_initial, self.poll_max)
+        while True:
+            if on_progress is None:
+                status = await self.status(job_id)
+            else:
+                status = await self.stream(job_id)
+                messages = [item.get("output") for item in status.get("stream") or []]
+                for message in filter(is_update, messages):
+                    on_progress(job_id, message)
+                if messages:
+                    delays = backoff_delays(self.poll_initial, self.poll_max)
+            if status.get("status") in TERMINAL_STATUSES:
+                return status if on_progress is None else await self.status(job_id)
+            delay = next(delays)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                # One last look at the deadline itself rather than giving up a backoff step early
+                delay = deadline - time.monotonic()
+                if delay <= 0:
+                    raise asyncio.TimeoutError(f"Job {job_id} still {status.get('status')} at its deadline")
+            await asyncio.sleep(delay)
+
+    # -- outputs ------------------------------------------------------------
+
+    async def _download(self, url, path):
+        # Presigned URLs must not carry the endpoint's Authorization header
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                with open(path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                        f.write(chunk)
+
+    async def save_outputs(self, job_id, output, output_dir):
+        """Write the video and preview to output_dir; returns (files, remaining output)"""
+        files = {}
+        remaining = dict(output)
+        os.makedirs(output_dir, exist_ok=True)
+        for name, inline_key, url_key, suffix in OUTPUT_FILES:
+            path = os.path.join(output_dir, f"{job_id}{suffix}")
+            if inline_key in remaining:
+                data = remaining.pop(inline_key)
+                await asyncio.to_thread(write_base64, data, path)
+                files[name] = path
+            elif url_key in remaining:
+                await self._download(remaining[url_key], path)
+                files[name] = path
+        return files, remaining
+
+    # -- jobs ---------------------------------------------------------------
+
+    async def run(self, job_input, output_dir=None, expected_seconds=None, timeout=None, on_progress=None):
+        """Run one job to completion, honouring the client's concurrency cap.
+
+        Jobs expected to take at most runsync_max_seconds use /runsync and skip
+        polling entirely when they finish in time, unless progress is wanted or
+        timeout is shorter than RunPod's /runsync hold. A /runsync reply still
+        in progress carries the job id, which is polled like a /run job. timeout
+        covers submitting and polling; a job still running when it passes is
+        cancelled on the endpoint, as is the job of a cancelled task. The worker
+        also stops generating at the timeout, unless job_input sets its own
+        execution_timeout.
+        """
+        if timeout is not None:
+            job_input = dict({"execution_timeout": timeout}, **job_input)
+        async with self._semaphore:
+            deadline = time.monotonic() + timeout if timeout else None
+            job_id = None
+            try:
+                # Until /runsync answers there is no job id to cancel, so it must not outlast the deadline
+                runsync = (expected_seconds is not None and expected_seconds <= self.runsync_max_seconds
+                           and on_progress is None and (timeout is None or timeout > RUNSYNC_HOLD_S + 30))
+                if runsync:
+                    status = await self.run_sync(job_input)
+                    job_id = status.get("id")
+                    if status.get("status") not in TERMINAL_STATUSES:
+                        status = await self.wait(job_id, deadline=deadline)
+                else:
+                    job_id = await self.submit(job_input)
+                    status = await self.wait(job_id, on_progress=on_progress, deadline=deadline)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                if job_id is not None:
+                    await asyncio.shield(self._cancel_quietly(job_id))
+                raise
+            return await self._result(job_id, status, output_dir)
+
+    async def _cancel_quietly(self, job_id):
+        try:
+            await self.cancel(job_id)
+        except aiohttp.ClientError as e:
+            print(f"hunyuan-client - could not cancel {job_id}: {e}")
+
+    async def _result(self, job_id, status, output_dir):
+        output = final_output(status.get("output"))
+        error = status.get("error")
+        if isinstance(output, dict) and "error" in output:
+            error = output["error"]
+        files = {}
+        if isinstance(output, dict) and output_dir is not None and status.get("status") == "COMPLETED":
+            files, output = await self.save_outputs(job_id, output, output_dir)
+        delay, execution = status.get("delayTime"), status.get("executionTime")
+        return JobResult(job_id, status.get("status"), output, files, error,
+                         delay / 1000 if delay is not None else None,
+                         execution / 1000 if execution is not None else None)
+
+    async def run_many(self, inputs, output_dir=None, expected_seconds=None, timeout=None, on_progress=None):
+        """Run every input with at most max_concurrency in flight; results keep input order.
+
+        A job that raises (network failure, timeout) yields the exception in its
+        slot instead of aborting the batch.
+        """
+        return await asyncio.gather(
+            *(self.run(job_input, output_dir, expected_seconds, timeout, on_progress) for job_input in inputs),
+            return_exceptions=True)
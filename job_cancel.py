@@ -0,0 +1,51 @@
+"""Stopping a job when it is cancelled or runs past its execution timeout.
+
+Each job gets a CancelToken. It fires when the job's execution timeout passes
+or when something calls cancel(), e.g. the handler noticing that RunPod
+stopped consuming a streaming job. Waits on ComfyUI watch the token's event,
+so a fired token ends them within a fraction of a second. The handler then
+takes the prompt off ComfyUI's queue or interrupts it, so the GPU is free for
+the next job instead of finishing a video nobody will read.
+"""
+import threading
+
+TIMEOUT = "timeout"
+CANCELLED = "cancelled"
+
+
+class CancelToken:
+    """Fires on cancel() or once timeout seconds have passed after start()"""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self.event = threading.Event()
+        self.reason = None
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        if self.timeout is not None:
+            self._timer = threading.Timer(self.timeout, self.cancel, args=(TIMEOUT,))
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def cancel(self, reason=CANCELLED):
+        with self._lock:
+            # The first reason wins; a cancel after the timeout is still a timeout
+            if self.reason is None:
+                self.reason = reason
+        self.event.set()
+
+    @property
+    def fired(self):
+        return self.event.is_set()
+
+    def message(self):
+        if self.reason == TIMEOUT:
+            return f"Job exceeded its execution timeout of {self.timeout:g}s"
+        return "Job was cancelled"
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
@@ -0,0 +1,108 @@
+"""Progress messages with a remaining-time estimate for streaming jobs.
+
+The handler feeds ComfyUI's websocket events to a ProgressTracker, which
+turns them into messages like
+
+    {"status": "progress", "node": "3", "class_type": "HyVideoSampler",
+     "stage": "sampler", "step": 6, "steps": 15, "elapsed_s": 41.2, "eta_s": 88.0}
+
+The estimate starts from the cost model's per-stage prediction for the job.
+Once the sampler has run a few steps, its measured seconds per step replace
+the prediction for the rest of the sampler, and the ratio of measured to
+predicted pace is applied to the stages still to come.
+"""
+import os
+import time
+
+from cost_model import NODE_STAGES
+
+# Minimum seconds between sampler step messages; node changes are always sent
+PROGRESS_INTERVAL_S = float(os.environ.get("PROGRESS_INTERVAL_S", "1.0"))
+# Order the cost model's stages run in within one job
+STAGE_ORDER = ("fixed", "sampler", "decode", "upscale", "interpolate", "encode", "post")
+
+
+def final_output(output):
+    """The result from a job's output, whether or not it was streamed.
+
+    Streaming handlers started with return_aggregate_stream report every
+    message they yielded as a list; the result is the last one.
+    """
+    if isinstance(output, list):
+        return output[-1] if output else None
+    return output
+
+
+def is_progress(message):
+    return isinstance(message, dict) and message.get("status") == "progress"
+
+
+def is_update(message):
+    """A streamed message other than the result: progress, or an HLS segment just published"""
+    return isinstance(message, dict) and message.get("status") in ("progress", "segment")
+
+
+class ProgressTracker:
+    """Turns one prompt's execution events into progress messages"""
+
+    def __init__(self, workflow, predicted_stages, emit, interval=PROGRESS_INTERVAL_S):
+        self.class_types = {node_id: node.get("class_type") for node_id, node in workflow.items()}
+        self.predicted = dict.fromkeys(STAGE_ORDER, 0.0)
+        self.predicted.update(predicted_stages)
+        self.emit = emit
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.node = None
+        self.stage = "fixed"
+        self.stage_started = self.started
+        self.step = 0
+        self.steps = None
+        # Measured over predicted time, learned from the sampler's step rate
+        self.pace = 1.0
+        self.last_sent = 0.0
+
+    def on_event(self, event):
+        """Feed one decoded websocket event"""
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        now = time.perf_counter()
+        if event_type == "executing" and data.get("node") is not None:
+            self.node = data["node"]
+            stage = NODE_STAGES.get(self.class_types.get(self.node), "fixed")
+            # Loaders and helpers ComfyUI runs late count towards the stage already underway
+            if STAGE_ORDER.index(stage) > STAGE_ORDER.index(self.stage):
+                self.stage, self.stage_started = stage, now
+            self.step, self.steps = 0, None
+            self._send(now)
+        elif event_type == "progress" and data.get("node") == self.node:
+            self.step, self.steps = data.get("value", 0), data.get("max")
+            if self.step == self.steps or now - self.last_sent >= self.interval:
+                self._send(now)
+
+    def eta_seconds(self, now):
+        """Predicted seconds until the job's result is ready"""
+        index = STAGE_ORDER.index(self.stage)
+        in_stage = now - self.stage_started
+        if self.stage == "sampler" and self.step and self.steps:
+            per_step = in_stage / self.step
+            if self.predicted["sampler"] > 0:
+                self.pace = per_step * self.steps / self.predicted["sampler"]
+            current = per_step * (self.steps - self.step)
+        else:
+            current = max(0.0, self.predicted[self.stage] * self.pace - in_stage)
+        later = sum(self.predicted[stage] for stage in STAGE_ORDER[index + 1:]) * self.pace
+        return current + later
+
+    def _send(self, now):
+        self.last_sent = now
+        message = {
+            "status": "progress",
+            "node": self.node,
+            "class_type": self.class_types.get(self.node),
+            "stage": self.stage,
+            "elapsed_s": round(now - self.started, 2),
+            "eta_s": round(self.eta_seconds(now), 1),
+        }
+        if self.steps:
+            message.update(step=self.step, steps=self.steps)
+        self.emit(message)
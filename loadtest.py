@@ -0,0 +1,290 @@
+"""Headless load test for the HunyuanVideo endpoint.
+
+Replays a prompt and parameter matrix against a RunPod endpoint, either with a
+fixed number of jobs in flight (--concurrency) or at an open-loop arrival rate
+(--rate jobs/second, Poisson or uniform gaps), and reports:
+
+- p50/p95/p99 of queue latency (RunPod delayTime: waiting plus worker boot),
+  execution latency (executionTime) and client-observed end-to-end latency
+- throughput over the run's wall time
+- cold starts (the first job each workerId ran)
+- cost: billed execution seconds x COST_PER_SECOND. RunPod also bills worker
+  boot, which is inside delayTime and not broken out
+
+Results go to a JSON file (summary plus one record per job) and optionally a
+CSV. Run fully offline against mock_runpod.py workers backed by mock_comfy.py:
+
+    python loadtest.py --mock --workers 2 --speed 0.01 --jobs 12 --concurrency 4
+    python loadtest.py --endpoint https://api.runpod.ai/v2/<id> --matrix sweep.json --rate 0.05
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from job_progress import final_output
+
+COST_PER_SECOND = 0.00053  # Cost per second of generation
+DEFAULT_ENDPOINT = os.environ.get("RUNPOD_ENDPOINT_URL", "https://api.runpod.ai/v2/lgm5rz8ogoqvgp")
+POLLING_INTERVAL = 0.5
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+
+# The sweeps recorded in bestSettings, at the resolution they were tuned for
+DEFAULT_MATRIX = {
+    "base": {"target_width": 960, "target_height": 544, "num_frames": 73, "fps": 24},
+    "prompts": ["A cute korean woman aiming a rifle at a wolf. Real life footage."],
+    "matrix": {
+        "num_inference_steps": [10, 15, 20, 25],
+        "guidance_scale": [6, 10, 14],
+        "flow_shift": [4, 8, 12],
+    },
+}
+
+
+def expand_matrix(spec):
+    """Every combination of the matrix values, for every prompt, on top of base"""
+    keys = sorted(spec.get("matrix", {}))
+    inputs = []
+    for prompt in spec.get("prompts") or [spec.get("base", {}).get("prompt", "")]:
+        for values in itertools.product(*(spec["matrix"][key] for key in keys)):
+            inputs.append(dict(spec.get("base", {}), prompt=prompt, **dict(zip(keys, values))))
+    return inputs
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile; None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_summary(values):
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+class EndpointClient:
+    def __init__(self, endpoint, api_key=None, poll_interval=POLLING_INTERVAL, job_timeout=None):
+        self.endpoint = endpoint.rstrip("/")
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def run(self, index, job_input):
+        """Submit one job and poll it to completion; returns its record"""
+        record = {"index": index, "params": {k: v for k, v in job_input.items() if k != "prompt"},
+                  "submitted_at": time.time()}
+        start = time.monotonic()
+        try:
+            response = self.session.post(f"{self.endpoint}/run", json={"input": job_input}, timeout=30)
+            response.raise_for_status()
+            record["job_id"] = job_id = response.json()["id"]
+            while True:
+                response = self.session.get(f"{self.endpoint}/status/{job_id}", timeout=30)
+                response.raise_for_status()
+                status = response.json()
+                if status.get("status") in TERMINAL_STATUSES:
+                    break
+                if self.job_timeout and time.monotonic() - start > self.job_timeout:
+                    self.session.post(f"{self.endpoint}/cancel/{job_id}", timeout=30)
+                    status = dict(status, status="TIMED_OUT", error="Client timeout")
+                    break
+                time.sleep(self.poll_interval)
+        except (requests.RequestException, KeyError, ValueError) as e:
+            status = {"status": "CLIENT_ERROR", "error": str(e)}
+        record["end_to_end_s"] = round(time.monotonic() - start, 3)
+        record["status"] = status.get("status")
+        record["worker_id"] = status.get("workerId")
+        if status.get("delayTime") is not None:
+            record["queue_s"] = status["delayTime"] / 1000
+        if status.get("executionTime") is not None:
+            record["execution_s"] = status["executionTime"] / 1000
+        output = final_output(status.get("output"))
+        if isinstance(output, dict):
+            # Keep the size of the payload, not the payload
+            record["output_bytes"] = len(json.dumps(output))
+            if isinstance(output.get("timings"), dict):
+                record["handler_total_s"] = output["timings"].get("total_s")
+        if status.get("error") or (isinstance(output, dict) and output.get("error")):
+            record["error"] = status.get("error") or output.get("error")
+        return record
+
+
+def run_closed_loop(client, inputs, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda item: client.run(*item), enumerate(inputs)))
+
+
+def run_open_loop(client, inputs, rate, arrival, seed=0):
+    rng = random.Random(seed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=min(len(inputs), 256)) as pool:
+        next_arrival = time.monotonic()
+        for item in enumerate(inputs):
+            delay = next_arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(client.run, *item))
+            gap = rng.expovariate(rate) if arrival == "poisson" else 1 / rate
+            next_arrival += gap
+        return [future.result() for future in futures]
+
+
+def mark_cold_starts(records):
+    """Flag the first job each worker ran; returns the cold-start count"""
+    seen = set()
+    started = [r for r in records if r.get("worker_id") and r.get("queue_s") is not None]
+    for record in sorted(started, key=lambda r: r["submitted_at"] + r["queue_s"]):
+        record["cold_start"] = record["worker_id"] not in seen
+        seen.add(record["worker_id"])
+    return len(seen)
+
+
+def summarize(records, wall_s, cost_per_second):
+    completed = [r for r in records if r["status"] == "COMPLETED"]
+    cold_starts = mark_cold_starts(records)
+    billed_s = sum(r.get("execution_s", 0) for r in records)
+    return {
+        "jobs": len(records),
+        "completed": len(completed),
+        "failed": len(records) - len(completed),
+        "wall_s": round(wall_s, 3),
+        "throughput_jobs_per_min": round(len(completed) / wall_s * 60, 3) if wall_s else None,
+        "latency_s": {
+            "queue": latency_summary([r["queue_s"] for r in completed if "queue_s" in r]),
+            "execution": latency_summary([r["execution_s"] for r in completed if "execution_s" in r]),
+            "end_to_end": latency_summary([r["end_to_end_s"] for r in completed]),
+        },
+        "cold_starts": cold_starts,
+        "workers_seen": len({r["worker_id"] for r in records if r.get("worker_id")}),
+        "cost": {
+            "cost_per_second": cost_per_second,
+            "billed_execution_s": round(billed_s, 3),
+            "usd": round(billed_s * cost_per_second, 4),
+            "usd_per_completed_job": round(billed_s * cost_per_second / len(completed), 4) if completed else None,
+        },
+    }
+
+
+def write_csv(path, records):
+    fields = ["index", "job_id", "status", "worker_id", "cold_start", "queue_s", "execution_s", "end_to_end_s",
+              "handler_total_s", "output_bytes", "error", "params"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(dict(record, params=json.dumps(record["params"], sort_keys=True)))
+
+
+def print_summary(summary):
+    print(f"\n{summary['completed']}/{summary['jobs']} completed in {summary['wall_s']:.1f}s "
+          f"({summary['throughput_jobs_per_min']} jobs/min), {summary['cold_starts']} cold starts "
+          f"across {summary['workers_seen']} workers")
+    for name, values in summary["latency_s"].items():
+        if values:
+            print(f"  {name:>10}: p50 {values['p50']:8.2f}s  p95 {values['p95']:8.2f}s  p99 {values['p99']:8.2f}s")
+    cost = summary["cost"]
+    print(f"  cost: ${cost['usd']:.4f} for {cost['billed_execution_s']:.1f} billed seconds "
+          f"(${cost['usd_per_completed_job']} per job)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test a HunyuanVideo RunPod endpoint")
+    parser.add_argument("--endpoint", default=DEFAULT_ENDPOINT, help="Endpoint base URL, .../v2/<endpoint_id>")
+    parser.add_argument("--matrix", help="JSON file with base, prompts and matrix keys (default: bestSettings sweeps)")
+    parser.add_argument("--jobs", type=int, help="Number of jobs; the matrix is cycled or truncated to fit")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=1, help="Jobs kept in flight (closed loop)")
+    load.add_argument("--rate", type=float, help="Arrival rate in jobs/second (open loop)")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--poll-interval", type=float, default=POLLING_INTERVAL)
+    parser.add_argument("--job-timeout", type=float, help="Cancel jobs still running after this many seconds")
+    parser.add_argument("--cost-per-second", type=float, default=COST_PER_SECOND)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="loadtest_results.json")
+    parser.add_argument("--csv", help="Also write one row per job to this CSV")
+    mock = parser.add_argument_group("offline mode")
+    mock.add_argument("--mock", action="store_true", help="Run against in-process mock RunPod and ComfyUI servers")
+    mock.add_argument("--workers", type=int, default=1)
+    mock.add_argument("--speed", type=float, default=0.01, help="Multiplier applied to every simulated delay")
+    mock.add_argument("--cold-start", type=float, default=60.0, help="Simulated worker boot seconds")
+    mock.add_argument("--idle-timeout", type=float, default=5.0)
+    mock.add_argument("--worker-concurrency", type=int, default=1, help="Jobs each mock worker runs at once")
+    mock.add_argument("--stream", action="store_true", help="Mock workers use the streaming handler")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    spec = DEFAULT_MATRIX
+    if args.matrix:
+        with open(args.matrix) as f:
+            spec = json.load(f)
+    inputs = expand_matrix(spec)
+    if args.jobs:
+        inputs = list(itertools.islice(itertools.cycle(inputs), args.jobs))
+
+    server = None
+    endpoint = args.endpoint
+    if args.mock:
+        from mock_runpod import MockRunpodServer
+        server = MockRunpodServer.with_mock_workers(args.workers, speed=args.speed, cold_start_s=args.cold_start,
+                                                    idle_timeout_s=args.idle_timeout,
+                                                    concurrency=args.worker_concurrency,
+                                                    stream=args.stream).start()
+        endpoint = server.url
+    client = EndpointClient(endpoint, os.environ.get("RUNPOD_API_KEY"), args.poll_interval, args.job_timeout)
+
+    mode = f"rate {args.rate}/s ({args.arrival})" if args.rate else f"concurrency {args.concurrency}"
+    print(f"Running {len(inputs)} jobs against {endpoint} at {mode}")
+    start = time.monotonic()
+    try:
+        if args.rate:
+            records = run_open_loop(client, inputs, args.rate, args.arrival, args.seed)
+        else:
+            records = run_closed_loop(client, inputs, args.concurrency)
+    finally:
+        if server is not None:
+            server.stop()
+    summary = summarize(records, time.monotonic() - start, args.cost_per_second)
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "endpoint": endpoint,
+        "load": {"concurrency": None if args.rate else args.concurrency, "rate": args.rate,
+                 "arrival": args.arrival if args.rate else None},
+        "summary": summary,
+        "jobs": records,
+    }
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    if args.csv:
+        write_csv(args.csv, records)
+    print_summary(summary)
+    print(f"Results written to {args.out}")
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,96 @@
+"""Peak GPU memory estimate per workflow variant, used to route each job.
+
+Sampling sets the peak: the transformer weights kept on the GPU plus
+activations that grow linearly with the number of latent tokens (sageattn
+never materializes the attention matrix). A latent token covers 16x16 pixels
+(8x VAE downscale, 2x2 patches) and 4 frames, with the first frame on its own:
+
+    tokens = (width / 16) * (height / 16) * ((num_frames - 1) / 4 + 1)
+
+Resident weights depend on the loader's quantization (fp8 is half of bf16)
+and on block swapping, which leaves only the unswapped blocks on the GPU. The
+constants are calibrated to bestSettings: the fp8 variant without block
+swapping fits 960x544x81 on a 24 GB card, and not 85 frames.
+"""
+import math
+import os
+from collections import namedtuple
+
+# Overrides the card's reported VRAM, e.g. to leave room for another process
+VRAM_BUDGET_GB = os.environ.get("VRAM_BUDGET_GB")
+MEMORY_HEADROOM_GB = float(os.environ.get("MEMORY_HEADROOM_GB", "0"))
+# Assumed when ComfyUI cannot report the card's size
+DEFAULT_VRAM_GB = 24.0
+# HunyuanVideo is trained on clips up to this length; memory may allow less. This replaced
+# the static MAX_GENERATION_TOTAL pixel-volume cap, which allowed 109 frames at 960x544
+DEFAULT_MAX_GENERATION_FRAMES = 129
+
+# 13B parameters; keyed by HyVideoModelLoader quantization ("disabled" keeps base_precision)
+TRANSFORMER_GB = {"disabled": 25.6, "fp8_e4m3fn": 12.8, "fp8_e4m3fn_fast": 12.8, "fp8_scaled": 12.8}
+# VAE, text embeddings, CUDA context and allocator slack
+RESIDENT_OVERHEAD_GB = 1.5
+GB_PER_TOKEN = 2.2e-4
+# A double-stream block holds about twice the weights of a single-stream one
+DOUBLE_BLOCKS = 20
+SINGLE_BLOCKS = 40
+
+MemoryProfile = namedtuple("MemoryProfile", "quantization swapped_fraction")
+
+
+def variant_profile(workflow):
+    """Memory-relevant settings of a workflow's transformer loader"""
+    loaders = [node for node in workflow.values() if node.get("class_type") == "HyVideoModelLoader"]
+    if not loaders:
+        return MemoryProfile("disabled", 0.0)
+    inputs = loaders[0]["inputs"]
+    swapped = 0.0
+    if inputs.get("auto_cpu_offload"):
+        swapped = 1.0
+    elif isinstance(inputs.get("block_swap_args"), list):
+        swap = workflow[inputs["block_swap_args"][0]]["inputs"]
+        double = min(DOUBLE_BLOCKS, swap.get("double_blocks_to_swap", 0))
+        single = min(SINGLE_BLOCKS, swap.get("single_blocks_to_swap", 0))
+        swapped = (2 * double + single) / (2 * DOUBLE_BLOCKS + SINGLE_BLOCKS)
+    return MemoryProfile(inputs.get("quantization", "disabled"), swapped)
+
+
+def latent_tokens(width, height, num_frames):
+    return math.ceil(width / 16) * math.ceil(height / 16) * ((num_frames - 1) // 4 + 1)
+
+
+def estimate_gb(profile, width, height, num_frames):
+    """Predicted peak VRAM in GB for sampling width x height x num_frames"""
+    weights = TRANSFORMER_GB.get(profile.quantization, TRANSFORMER_GB["disabled"]) * (1 - profile.swapped_fraction)
+    return weights + RESIDENT_OVERHEAD_GB + GB_PER_TOKEN * latent_tokens(width, height, num_frames)
+
+
+def max_frames(profile, width, height, budget_gb):
+    """Largest 4k+1 frame count that fits budget_gb, or 0 if not even one frame does"""
+    per_latent_frame = GB_PER_TOKEN * latent_tokens(width, height, 1)
+    fixed = estimate_gb(profile, width, height, 1) - per_latent_frame
+    latent_frames = int((budget_gb - fixed) / per_latent_frame)
+    return (latent_frames - 1) * 4 + 1 if latent_frames > 0 else 0
+
+
+def frame_limit(profile, budget_gb, max_generation_frames=DEFAULT_MAX_GENERATION_FRAMES):
+    """plan_generation's frame_limit: the longest clip profile samples within budget_gb, capped"""
+    def limit(width, height):
+        return min(max_generation_frames, max_frames(profile, width, height, budget_gb))
+    return limit
+
+
+def choose_variant(profiles, width, height, num_frames, budget_gb):
+    """First (name, estimate) in profiles, fastest first, that fits; the last one if none does"""
+    estimates = [(name, estimate_gb(profile, width, height, num_frames)) for name, profile in profiles]
+    for name, estimate in estimates:
+        if estimate <= budget_gb:
+            return name, estimate
+    return estimates[-1]
+
+
+def vram_budget_gb(read_system_stats):
+    """VRAM available to a job in GB: VRAM_BUDGET_GB, or the first device in ComfyUI's /system_stats"""
+    if VRAM_BUDGET_GB:
+        return float(VRAM_BUDGET_GB) - MEMORY_HEADROOM_GB
+    devices = read_system_stats().get("devices") or []
+    return devices[0]["vram_total"] / 1024 ** 3 - MEMORY_HEADROOM_GB
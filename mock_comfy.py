@@ -0,0 +1,694 @@
+"""Stand-in ComfyUI server for running the worker without a GPU.
+
+Implements the part of the ComfyUI API the handler talks to (/prompt, /history,
+/queue, /interrupt, /free, /view, /system_stats and the /ws event stream) and
+"executes" queued workflows by walking their nodes in dependency order with
+configurable per-node delays. Every VHS_VideoCombine node writes a placeholder
+video plus PNG preview to the output directory, exactly where the real node
+would put them; with encode_videos the video is a real, small h265 clip with
+one frame per output frame (sampler frames, times the RIFE multiplier).
+
+    python mock_comfy.py --port 8188 --output-dir /tmp/comfy-output --speed 0.01
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from cost_model import teacache_speedup
+from memory_model import estimate_gb, variant_profile
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Rough wall-clock seconds per node on a 4090 for a 960x544x73 job
+DEFAULT_NODE_SECONDS = {
+    "HyVideoModelLoader": 8.0,
+    "HyVideoVAELoader": 1.0,
+    "DownloadAndLoadHyVideoTextEncoder": 12.0,
+    "HyVideoTextEncode": 2.0,
+    "HyVideoDecode": 20.0,
+    "UpscaleModelLoader": 0.5,
+    "ImageUpscaleWithModel": 15.0,
+    "Image Resize": 2.0,
+    "Image Lucy Sharpen": 3.0,
+    "RIFE VFI": 10.0,
+    "VHS_VideoCombine": 6.0,
+}
+SAMPLER_STEP_SECONDS = 4.0
+SAMPLER_CLASSES = {"HyVideoSampler"}
+# Workload the node table is for, used when node times scale with the job
+REFERENCE_PIXEL_FRAMES = 960 * 544 * 73
+REFERENCE_OUTPUT_PIXEL_FRAMES = 1280 * 720 * 73
+GENERATION_CLASSES = {"HyVideoDecode", "ImageUpscaleWithModel", "Image Resize", "Image Lucy Sharpen"}
+# With cache_models, loader outputs are reused across prompts as ComfyUI does, and these
+# nodes pay extra the first time they run (weights moved to the GPU, kernels compiled)
+MODEL_LOADER_CLASSES = {"HyVideoModelLoader", "HyVideoVAELoader", "DownloadAndLoadHyVideoTextEncoder",
+                        "UpscaleModelLoader"}
+FIRST_USE_SECONDS = {"HyVideoSampler": 6.0, "HyVideoDecode": 3.0, "ImageUpscaleWithModel": 2.0, "RIFE VFI": 3.0}
+# Frame size of encode_videos clips, whatever the workflow's resolution
+ENCODED_VIDEO_SIZE = (160, 96)
+
+
+def ws_frame(payload, opcode=0x1):
+    """Build a single unmasked server-to-client websocket frame"""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 1 << 16:
+        header += bytes([126]) + struct.pack("!H", length)
+    else:
+        header += bytes([127]) + struct.pack("!Q", length)
+    return header + payload
+
+
+def read_exact(rfile, count):
+    data = rfile.read(count)
+    if len(data) < count:
+        raise ConnectionError("websocket closed")
+    return data
+
+
+def ws_read_frame(rfile):
+    """Read one client frame, returning (opcode, payload)"""
+    first, second = read_exact(rfile, 2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", read_exact(rfile, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", read_exact(rfile, 8))[0]
+    mask = read_exact(rfile, 4) if second & 0x80 else None
+    payload = read_exact(rfile, length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def png_bytes(width, height):
+    """Encode a small gradient as an RGB PNG using only the standard library"""
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)
+        for x in range(width):
+            rows += bytes((x * 255 // max(width - 1, 1), y * 255 // max(height - 1, 1), 128))
+
+    def chunk(tag, data):
+        return struct.pack("!I", len(data)) + tag + data + struct.pack("!I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    ihdr = struct.pack("!IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(bytes(rows), 6)) + chunk(b"IEND", b"")
+
+
+class WebSocketClient:
+    """Server side of one /ws connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send_json(self, message):
+        self.send(ws_frame(json.dumps(message).encode("utf-8")))
+
+    def send(self, frame):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.connection.sendall(frame)
+            except OSError:
+                self.closed = True
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                try:
+                    self.connection.sendall(ws_frame(b"", opcode=0x8))
+                except OSError:
+                    pass
+
+
+class MockComfy:
+    """In-memory ComfyUI state plus the thread that executes queued prompts"""
+
+    def __init__(self, output_dir, speed=1.0, node_seconds=None, step_seconds=SAMPLER_STEP_SECONDS,
+                 video_bytes=256 * 1024, scale_workload=False, boot_seconds=0.0, cache_models=False,
+                 vram_gb=24.0, memory_scale=None, encode_videos=False):
+        self.output_dir = output_dir
+        self.speed = speed
+        self.node_seconds = dict(DEFAULT_NODE_SECONDS, **(node_seconds or {}))
+        self.step_seconds = step_seconds
+        self.video_bytes = video_bytes
+        # Scale node times by resolution, frames, TeaCache and RIFE multiplier instead of using them as is
+        self.scale_workload = scale_workload
+        # The API answers 503 until ComfyUI has "started"
+        self.ready_at = time.monotonic() + boot_seconds * speed
+        self.cache_models = cache_models
+        # With memory_scale, a sampler whose memory_model estimate times memory_scale exceeds
+        # vram_gb fails with a CUDA out-of-memory error
+        self.vram_gb = vram_gb
+        self.memory_scale = memory_scale
+        self.encode_videos = encode_videos
+        self.loaded = set()
+        self.used = set()
+        self.lock = threading.Condition()
+        self.pending = []
+        self.running = None
+        self.interrupted = False
+        self.history = {}
+        self.clients = {}
+        # Open HTTP and websocket connections, dropped when the server stops
+        self.connections = set()
+        self.prompt_number = 0
+        self.interrupts = 0
+        self.file_counter = 0
+        self.embedded = set()
+        # Wall time spent executing prompts, i.e. how long the "GPU" was busy
+        self.busy_seconds = 0.0
+        os.makedirs(output_dir, exist_ok=True)
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    # -- client bookkeeping -------------------------------------------------
+
+    def add_client(self, client_id, client):
+        with self.lock:
+            self.clients.setdefault(client_id, []).append(client)
+            remaining = len(self.pending) + (1 if self.running else 0)
+        client.send_json({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": remaining}}, "sid": client_id}})
+
+    def remove_client(self, client_id, client):
+        with self.lock:
+            clients = self.clients.get(client_id, [])
+            if client in clients:
+                clients.remove(client)
+
+    def emit(self, client_id, event_type, data):
+        with self.lock:
+            targets = list(self.clients.get(client_id, []))
+        for client in targets:
+            client.send_json({"type": event_type, "data": data})
+
+    # -- API operations -----------------------------------------------------
+
+    def queue_prompt(self, workflow, client_id):
+        prompt_id = str(uuid.uuid4())
+        with self.lock:
+            number = self.prompt_number
+            self.prompt_number += 1
+            self.pending.append((number, prompt_id, workflow, {"client_id": client_id}))
+            self.lock.notify_all()
+        return {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+    def queue_state(self):
+        with self.lock:
+            running = [list(self.running)] if self.running else []
+            pending = [list(item) for item in self.pending]
+        return {"queue_running": running, "queue_pending": pending}
+
+    def delete_pending(self, prompt_ids):
+        with self.lock:
+            self.pending = [item for item in self.pending if item[1] not in prompt_ids]
+
+    def clear_pending(self):
+        with self.lock:
+            self.pending = []
+
+    def interrupt(self, prompt_id=None):
+        """Like ComfyUI, a prompt_id only interrupts that prompt, and only while it is running"""
+        with self.lock:
+            if self.running and prompt_id in (None, self.running[1]):
+                self.interrupted = True
+                self.interrupts += 1
+
+    def get_history(self, prompt_id=None):
+        with self.lock:
+            if prompt_id is None:
+                return dict(self.history)
+            if prompt_id in self.history:
+                return {prompt_id: self.history[prompt_id]}
+            return {}
+
+    def clear_history(self):
+        with self.lock:
+            self.history = {}
+
+    def delete_history(self, prompt_ids):
+        with self.lock:
+            for prompt_id in prompt_ids:
+                self.history.pop(prompt_id, None)
+
+    # -- execution ----------------------------------------------------------
+
+    def _work(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.lock.wait()
+                self.running = self.pending.pop(0)
+                self.interrupted = False
+            number, prompt_id, workflow, extra = self.running
+            client_id = extra.get("client_id")
+            started = time.monotonic()
+            messages = []
+            outputs = {}
+            status_str = "success"
+            scales = workload_scales(workflow) if self.scale_workload else {}
+            cached = [node_id for node_id in execution_order(workflow) if self._model_key(workflow[node_id]) in self.loaded]
+            try:
+                self._emit_logged(messages, client_id, "execution_start", {"prompt_id": prompt_id, "timestamp": _now_ms()})
+                self._emit_logged(messages, client_id, "execution_cached", {"nodes": cached, "prompt_id": prompt_id, "timestamp": _now_ms()})
+                for node_id in execution_order(workflow):
+                    if node_id in cached:
+                        continue
+                    if self._is_interrupted():
+                        status_str = "error"
+                        self._emit_logged(messages, client_id, "execution_interrupted", {
+                            "prompt_id": prompt_id, "node_id": node_id,
+                            "node_type": workflow[node_id].get("class_type"), "executed": list(outputs),
+                            "timestamp": _now_ms()})
+                        break
+                    node = workflow[node_id]
+                    self.emit(client_id, "executing", {"node": node_id, "display_node": node_id, "prompt_id": prompt_id})
+                    needed = self._sampler_memory_gb(workflow, node)
+                    if needed > self.vram_gb:
+                        status_str = "error"
+                        self._emit_logged(messages, client_id, "execution_error", {
+                            "prompt_id": prompt_id, "node_id": node_id, "node_type": node.get("class_type"),
+                            "executed": list(outputs), "exception_type": "torch.OutOfMemoryError",
+                            "exception_message": f"Allocation on device failed: needed {needed:.1f} GB, "
+                                                 f"{self.vram_gb:.1f} GB total",
+                            "traceback": [], "current_inputs": {}, "current_outputs": {}, "timestamp": _now_ms()})
+                        break
+                    output = self._run_node(prompt_id, client_id, node_id, node, scales.get(node.get("class_type"), 1.0),
+                                            workflow)
+                    if output is not None:
+                        outputs[node_id] = output
+                        self.emit(client_id, "executed", {"node": node_id, "display_node": node_id, "output": output, "prompt_id": prompt_id})
+                else:
+                    self.emit(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+                    self._emit_logged(messages, client_id, "execution_success", {"prompt_id": prompt_id, "timestamp": _now_ms()})
+            finally:
+                with self.lock:
+                    self.history[prompt_id] = {
+                        "prompt": [number, prompt_id, workflow, extra, list(outputs)],
+                        "outputs": outputs,
+                        "status": {"status_str": status_str, "completed": status_str == "success", "messages": messages},
+                    }
+                    self.running = None
+                    self.busy_seconds += time.monotonic() - started
+
+    def _emit_logged(self, messages, client_id, event_type, data):
+        messages.append([event_type, data])
+        self.emit(client_id, event_type, data)
+
+    def is_booted(self):
+        return time.monotonic() >= self.ready_at
+
+    def _model_key(self, node):
+        if not self.cache_models or node.get("class_type") not in MODEL_LOADER_CLASSES:
+            return None
+        return json.dumps(node, sort_keys=True)
+
+    def free_memory(self):
+        with self.lock:
+            self.loaded = set()
+
+    def _sampler_memory_gb(self, workflow, node):
+        if self.memory_scale is None or node.get("class_type") not in SAMPLER_CLASSES:
+            return 0.0
+        inputs = node.get("inputs", {})
+        estimate = estimate_gb(variant_profile(workflow), inputs.get("width", 0), inputs.get("height", 0),
+                               inputs.get("num_frames", 1))
+        return estimate * self.memory_scale
+
+    def _is_interrupted(self):
+        with self.lock:
+            return self.interrupted
+
+    def _sleep(self, seconds):
+        time.sleep(seconds * self.speed)
+
+    def _run_node(self, prompt_id, client_id, node_id, node, scale=1.0, workflow=None):
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        if self.cache_models:
+            if self._model_key(node):
+                self.loaded.add(self._model_key(node))
+            if class_type in FIRST_USE_SECONDS and class_type not in self.used:
+                self.used.add(class_type)
+                self._sleep(FIRST_USE_SECONDS[class_type])
+        if class_type in SAMPLER_CLASSES:
+            steps = int(inputs.get("steps", 1))
+            for step in range(1, steps + 1):
+                if self._is_interrupted():
+                    return None
+                self._sleep(self.step_seconds * scale)
+                self.emit(client_id, "progress", {"value": step, "max": steps, "prompt_id": prompt_id, "node": node_id})
+            return None
+        if class_type == "HyVideoCachedTextEncode":
+            return self._cached_text_encode(inputs)
+        self._sleep(self.node_seconds.get(class_type, 0.1) * scale)
+        if class_type == "VHS_VideoCombine":
+            return self._write_video(inputs, workflow)
+        return None
+
+    def _cached_text_encode(self, inputs):
+        # A miss pays for loading and running the encoder, a hit for reading a small file
+        key = json.dumps(inputs, sort_keys=True)
+        with self.lock:
+            hit = key in self.embedded
+            self.embedded.add(key)
+        if hit:
+            self._sleep(0.05)
+        else:
+            self._sleep(self.node_seconds["DownloadAndLoadHyVideoTextEncoder"] + self.node_seconds["HyVideoTextEncode"])
+        return {"embedding_cache": [{"hit": hit}]}
+
+    def _write_video(self, inputs, workflow=None):
+        with self.lock:
+            self.file_counter += 1
+            counter = self.file_counter
+        prefix = inputs.get("filename_prefix", "ComfyUI")
+        video_name = f"{prefix}_{counter:05}.mp4"
+        preview_name = f"{prefix}_{counter:05}.png"
+        if self.encode_videos:
+            self._encode_video(os.path.join(self.output_dir, video_name), workflow or {}, inputs.get("frame_rate", 24))
+        else:
+            block = hashlib.sha256(video_name.encode()).digest() * 2048
+            with open(os.path.join(self.output_dir, video_name), "wb") as f:
+                remaining = self.video_bytes
+                while remaining > 0:
+                    f.write(block[:remaining])
+                    remaining -= len(block)
+        with open(os.path.join(self.output_dir, preview_name), "wb") as f:
+            f.write(png_bytes(64, 36))
+        return {"gifs": [{
+            "filename": video_name,
+            "subfolder": "",
+            "type": "output",
+            "format": inputs.get("format", "video/h264-mp4"),
+            "frame_rate": inputs.get("frame_rate", 24),
+            "workflow": preview_name,
+            "fullpath": os.path.join(self.output_dir, video_name),
+        }]}
+
+
+    def _encode_video(self, path, workflow, fps):
+        # Each frame is flat grey-blue, its red channel set by the sampler seed and green by
+        # the frame index, so stitched clips can be checked frame by frame
+        import numpy as np
+        from video_segments import write_frames
+
+        order = execution_order(workflow)
+        sampler = next((workflow[node_id]["inputs"] for node_id in order
+                        if workflow[node_id].get("class_type") in SAMPLER_CLASSES), {})
+        frames = int(sampler.get("num_frames", 1))
+        for node_id in order:
+            if workflow[node_id].get("class_type") == "RIFE VFI":
+                frames = (frames - 1) * int(workflow[node_id]["inputs"].get("multiplier", 2)) + 1
+        width, height = ENCODED_VIDEO_SIZE
+        seed = int(sampler.get("seed", 0))
+
+        def generate():
+            for index in range(frames):
+                frame = np.full((height, width, 3), 128, dtype=np.uint8)
+                frame[..., 0] = seed * 37 % 256
+                frame[..., 1] = index % 256
+                yield frame
+        write_frames(path, generate(), width, height, fps)
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def workload_scales(workflow):
+    """Per-class time multipliers for a workflow relative to the node table's 960x544x73 job"""
+    samplers = [node for node in workflow.values() if node.get("class_type") in SAMPLER_CLASSES]
+    if not samplers:
+        return {}
+    sampler = samplers[0]["inputs"]
+    frames = sampler.get("num_frames", 73)
+    generation = sampler.get("width", 960) * sampler.get("height", 544) * frames / REFERENCE_PIXEL_FRAMES
+    output = generation * REFERENCE_PIXEL_FRAMES / REFERENCE_OUTPUT_PIXEL_FRAMES
+    multiplier = 1
+    for node in workflow.values():
+        inputs = node.get("inputs", {})
+        if node.get("class_type") == "Image Resize":
+            pixels = inputs.get("resize_width", 1280) * inputs.get("resize_height", 720)
+            output = pixels * frames / REFERENCE_OUTPUT_PIXEL_FRAMES
+        elif node.get("class_type") == "RIFE VFI":
+            multiplier = inputs.get("multiplier", 2)
+    threshold = 0.0
+    if isinstance(sampler.get("teacache_args"), list):
+        threshold = workflow[sampler["teacache_args"][0]]["inputs"].get("rel_l1_thresh", 0.0)
+    scales = dict.fromkeys(GENERATION_CLASSES, generation)
+    scales.update({
+        "HyVideoSampler": generation / teacache_speedup(threshold),
+        # RIFE inserts multiplier - 1 frames per frame; the encoder sees all of them
+        "RIFE VFI": output * (multiplier - 1),
+        "VHS_VideoCombine": output * multiplier / 2,
+    })
+    return scales
+
+
+def execution_order(workflow):
+    """Order node ids so every node runs after the nodes it links to"""
+    order = []
+    visited = set()
+
+    def visit(node_id):
+        if node_id in visited or node_id not in workflow:
+            return
+        visited.add(node_id)
+        for value in workflow[node_id].get("inputs", {}).values():
+            if isinstance(value, list) and len(value) == 2 and isinstance(value[0], str):
+                visit(value[0])
+        order.append(node_id)
+
+    for node_id in workflow:
+        visit(node_id)
+    return order
+
+
+def make_handler(comfy):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with comfy.lock:
+                comfy.connections.add(self.connection)
+
+        def finish(self):
+            with comfy.lock:
+                comfy.connections.discard(self.connection)
+            super().finish()
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_bytes(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length))
+
+        def do_GET(self):
+            if not comfy.is_booted():
+                return self._send_json({"error": "starting"}, status=503)
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/ws":
+                return self._websocket(query.get("clientId", [str(uuid.uuid4())])[0])
+            if url.path == "/":
+                return self._send_bytes(b"<html>mock ComfyUI</html>", "text/html")
+            if url.path == "/history":
+                return self._send_json(comfy.get_history())
+            if url.path.startswith("/history/"):
+                return self._send_json(comfy.get_history(url.path[len("/history/"):]))
+            if url.path == "/queue":
+                return self._send_json(comfy.queue_state())
+            if url.path == "/system_stats":
+                return self._send_json({
+                    "system": {"os": "posix", "python_version": "mock", "embedded_python": False},
+                    "devices": [{"name": "mock", "type": "cuda", "index": 0,
+                                 "vram_total": int(comfy.vram_gb * 1024 ** 3), "vram_free": int(comfy.vram_gb * 1024 ** 3),
+                                 "torch_vram_total": 0, "torch_vram_free": 0}],
+                })
+            if url.path == "/view":
+                filename = os.path.basename(query.get("filename", [""])[0])
+                subfolder = query.get("subfolder", [""])[0]
+                path = os.path.join(comfy.output_dir, subfolder, filename)
+                if not filename or not os.path.isfile(path):
+                    return self._send_json({"error": "not found"}, status=404)
+                with open(path, "rb") as f:
+                    return self._send_bytes(f.read(), "application/octet-stream")
+            return self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            if not comfy.is_booted():
+                return self._send_json({"error": "starting"}, status=503)
+            url = urlparse(self.path)
+            try:
+                payload = self._read_json()
+            except json.JSONDecodeError:
+                return self._send_json({"error": "invalid json"}, status=400)
+            if url.path == "/prompt":
+                workflow = payload.get("prompt")
+                if not isinstance(workflow, dict):
+                    return self._send_json({"error": {"type": "no_prompt", "message": "No prompt provided"}}, status=400)
+                return self._send_json(comfy.queue_prompt(workflow, payload.get("client_id")))
+            if url.path == "/history":
+                if payload.get("clear"):
+                    comfy.clear_history()
+                if "delete" in payload:
+                    comfy.delete_history(payload["delete"])
+                return self._send_json({})
+            if url.path == "/queue":
+                if payload.get("clear"):
+                    comfy.clear_pending()
+                if "delete" in payload:
+                    comfy.delete_pending(payload["delete"])
+                return self._send_json({})
+            if url.path == "/interrupt":
+                comfy.interrupt(payload.get("prompt_id"))
+                return self._send_json({})
+            if url.path == "/free":
+                if payload.get("unload_models") or payload.get("free_memory"):
+                    comfy.free_memory()
+                return self._send_json({})
+            return self._send_json({"error": "not found"}, status=404)
+
+        def _websocket(self, client_id):
+            key = self.headers.get("Sec-WebSocket-Key")
+            if not key:
+                return self._send_json({"error": "expected websocket upgrade"}, status=400)
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.wfile.flush()
+            client = WebSocketClient(self.connection)
+            comfy.add_client(client_id, client)
+            try:
+                while True:
+                    opcode, payload = ws_read_frame(self.rfile)
+                    if opcode == 0x8:
+                        break
+                    if opcode == 0x9:
+                        client.send(ws_frame(payload, opcode=0xA))
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                comfy.remove_client(client_id, client)
+                client.close()
+                self.close_connection = True
+
+    return Handler
+
+
+class MockComfyServer:
+    """Run a MockComfy behind a threaded HTTP server, e.g. from a benchmark"""
+
+    def __init__(self, host="127.0.0.1", port=0, **kwargs):
+        output_dir = kwargs.pop("output_dir")
+        self.comfy = MockComfy(output_dir, **kwargs)
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.comfy))
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        # Like a ComfyUI process exiting, drop keep-alive connections and event streams too
+        with self.comfy.lock:
+            connections = list(self.comfy.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stand-in ComfyUI server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--output-dir", default=os.environ.get("COMFY_OUTPUT_PATH", "/tmp/mock-comfy-output"))
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--step-seconds", type=float, default=SAMPLER_STEP_SECONDS)
+    parser.add_argument("--video-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--boot-seconds", type=float, default=0.0, help="Answer 503 for this long after starting")
+    parser.add_argument("--cache-models", action="store_true",
+                        help="Reuse loader outputs across prompts and charge first-use model load time")
+    parser.add_argument("--scale-workload", action="store_true",
+                        help="Scale node times with resolution, frames, TeaCache and RIFE multiplier")
+    parser.add_argument("--vram-gb", type=float, default=24.0, help="VRAM reported in /system_stats")
+    parser.add_argument("--memory-scale", type=float, default=None,
+                        help="Fail samplers whose estimated VRAM times this exceeds --vram-gb")
+    parser.add_argument("--encode-videos", action="store_true",
+                        help="Write real h265 clips with one frame per output frame instead of filler bytes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = MockComfyServer(args.host, args.port, output_dir=args.output_dir, speed=args.speed,
+                             step_seconds=args.step_seconds, video_bytes=args.video_bytes,
+                             scale_workload=args.scale_workload, boot_seconds=args.boot_seconds,
+                             cache_models=args.cache_models, vram_gb=args.vram_gb,
+                             memory_scale=args.memory_scale, encode_videos=args.encode_videos)
+    print(f"mock-comfy - listening on http://{server.address}, writing outputs to {args.output_dir}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
@@ -0,0 +1,377 @@
+"""Stand-in RunPod serverless endpoint for running load tests offline.
+
+Implements the endpoint API the clients use (/run, /runsync, /status, /stream,
+/cancel, /health under /v2/<endpoint_id>/) on top of a pool of simulated workers. Each
+worker calls a handler function; a worker that has never run, or has sat idle
+longer than the idle timeout, first pays a simulated cold start. Status
+responses carry delayTime and executionTime in milliseconds and the workerId,
+as RunPod's do. Generator handlers are streamed: /stream returns the messages
+yielded since the last call, and the final output is the aggregated list, as
+with return_aggregate_stream.
+
+By default every worker gets its own MockComfyServer and its own copy of
+handler.py pointed at it, the way each real worker has its own GPU and ComfyUI:
+
+    python mock_runpod.py --port 8000 --workers 2 --speed 0.01
+    python loadtest.py --endpoint http://127.0.0.1:8000/v2/mock
+"""
+import argparse
+import importlib.util
+import inspect
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from mock_comfy import MockComfyServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Rough time for a real worker to pull the image, boot ComfyUI and load models
+DEFAULT_COLD_START_S = 60.0
+DEFAULT_IDLE_TIMEOUT_S = 5.0
+RUNSYNC_WAIT_S = 90.0
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT")
+
+_load_lock = threading.Lock()
+
+
+def load_handler(comfy_host, output_dir, name, env=None, entry="handler"):
+    """Import a private copy of handler.py bound to one ComfyUI instance.
+
+    handler.py reads its configuration at import time, so each worker's copy is
+    executed with that worker's COMFY_HOST and COMFY_OUTPUT_PATH in the
+    environment. entry names the handler function to return, e.g.
+    "stream_handler"; with entry=None the module itself is returned.
+    """
+    overrides = {
+        "COMFY_HOST": comfy_host,
+        "COMFY_OUTPUT_PATH": output_dir,
+        "COMFY_WORKFLOW_DIR": os.environ.get("COMFY_WORKFLOW_DIR", os.path.join(ROOT, "workflows")),
+        "COMFY_WORKFLOW": os.environ.get("COMFY_WORKFLOW", "small_model_no_block_swapping"),
+    }
+    overrides.update(env or {})
+    with _load_lock:
+        saved = {key: os.environ.get(key) for key in overrides}
+        os.environ.update(overrides)
+        try:
+            spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, "handler.py"))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    return getattr(module, entry) if entry else module
+
+
+class MockJob:
+    def __init__(self, job_input):
+        self.id = f"mock-{uuid.uuid4()}"
+        self.input = job_input
+        self.status = "IN_QUEUE"
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.worker_id = None
+        self.output = None
+        self.error = None
+        self.stream = []
+        self.streamed = 0
+        self.done = threading.Event()
+
+    def take_stream(self):
+        """Messages yielded since the last call, as /stream returns them"""
+        new = self.stream[self.streamed:]
+        self.streamed = len(self.stream)
+        return [{"output": message} for message in new]
+
+    def to_status(self):
+        status = {"id": self.id, "status": self.status}
+        if self.started is not None:
+            status["delayTime"] = int((self.started - self.submitted) * 1000)
+            status["workerId"] = self.worker_id
+        if self.finished is not None and self.started is not None:
+            status["executionTime"] = int((self.finished - self.started) * 1000)
+        if self.output is not None:
+            status["output"] = self.output
+        if self.error is not None:
+            status["error"] = self.error
+        return status
+
+
+class MockWorker:
+    def __init__(self, worker_id, handler):
+        self.id = worker_id
+        self.handler = handler
+        self.warm = False
+        self.last_active = 0.0
+        self.active = 0
+        self.cold_starts = 0
+        self.boot_lock = threading.Lock()
+
+
+class MockEndpoint:
+    """Job queue plus worker threads that pull from it"""
+
+    def __init__(self, handlers, cold_start_s=DEFAULT_COLD_START_S, idle_timeout_s=DEFAULT_IDLE_TIMEOUT_S, speed=1.0,
+                 concurrency=1):
+        self.cold_start_s = cold_start_s
+        self.idle_timeout_s = idle_timeout_s
+        self.speed = speed
+        self.lock = threading.Condition()
+        self.pending = deque()
+        self.jobs = {}
+        self.workers = [MockWorker(f"mock-worker-{i}", handler) for i, handler in enumerate(handlers)]
+        # concurrency > 1 mirrors a handler started with a concurrency_modifier
+        for worker in self.workers:
+            for _ in range(concurrency):
+                threading.Thread(target=self._work, args=(worker,), daemon=True).start()
+
+    def submit(self, job_input):
+        job = MockJob(job_input)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.pending.append(job)
+            self.lock.notify()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == "IN_QUEUE":
+                self.pending.remove(job)
+            if job.status not in TERMINAL_STATUSES:
+                # A streaming handler is closed at its next message, as RunPod stops consuming
+                # it; a plain handler runs on and its result is discarded
+                job.status = "CANCELLED"
+                job.done.set()
+            return job
+
+    def health(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            busy = sum(1 for worker in self.workers if worker.active)
+        return {
+            "jobs": {"inQueue": counts.get("IN_QUEUE", 0), "inProgress": counts.get("IN_PROGRESS", 0),
+                     "completed": counts.get("COMPLETED", 0), "failed": counts.get("FAILED", 0),
+                     "cancelled": counts.get("CANCELLED", 0)},
+            "workers": {"running": busy, "idle": len(self.workers) - busy,
+                        "coldStarts": sum(worker.cold_starts for worker in self.workers)},
+        }
+
+    def _work(self, worker):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.lock.wait()
+                job = self.pending.popleft()
+                job.status = "IN_PROGRESS"
+                idle = worker.active == 0 and time.monotonic() - worker.last_active > self.idle_timeout_s
+                worker.active += 1
+            # RunPod counts worker boot as part of the job's delay time
+            with worker.boot_lock:
+                if not worker.warm or idle:
+                    worker.cold_starts += 1
+                    time.sleep(self.cold_start_s * self.speed)
+                    worker.warm = True
+            job.started = time.monotonic()
+            job.worker_id = worker.id
+            try:
+                output = worker.handler({"id": job.id, "input": job.input})
+                if inspect.isgenerator(output):
+                    output = self._stream(job, output)
+                error = _output_error(output)
+            except Exception as e:
+                output, error = None, f"Handler raised: {e}"
+            with self.lock:
+                job.finished = time.monotonic()
+                worker.last_active = job.finished
+                worker.active -= 1
+                if job.status != "CANCELLED":
+                    if error is not None:
+                        job.status, job.error = "FAILED", error
+                    else:
+                        job.status, job.output = "COMPLETED", output
+                job.done.set()
+
+    def _stream(self, job, messages):
+        try:
+            for message in messages:
+                with self.lock:
+                    if job.status == "CANCELLED":
+                        break
+                    job.stream.append(message)
+                # RunPod stops the job at the first message carrying an error
+                if _output_error(message) is not None:
+                    break
+        finally:
+            messages.close()
+        return list(job.stream)
+
+
+def _output_error(output):
+    if isinstance(output, list):
+        return next((error for error in map(_output_error, output) if error is not None), None)
+    return output.get("error") if isinstance(output, dict) else None
+
+
+def make_handler(endpoint):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length))
+
+        def _route(self):
+            # /v2/<endpoint_id>/<operation>[/<job_id>]
+            parts = urlparse(self.path).path.strip("/").split("/")
+            if len(parts) < 3 or parts[0] != "v2":
+                return None, None
+            return parts[2], parts[3] if len(parts) > 3 else None
+
+        def do_GET(self):
+            operation, job_id = self._route()
+            if operation == "health":
+                return self._send_json(endpoint.health())
+            if operation == "status" and job_id:
+                job = endpoint.get(job_id)
+                if job is None:
+                    return self._send_json({"error": "job not found"}, status=404)
+                return self._send_json(job.to_status())
+            if operation == "stream" and job_id:
+                job = endpoint.get(job_id)
+                if job is None:
+                    return self._send_json({"error": "job not found"}, status=404)
+                with endpoint.lock:
+                    stream = job.take_stream()
+                return self._send_json({"id": job.id, "status": job.status, "stream": stream})
+            return self._send_json({"error": "not found"}, status=404)
+
+        def do_POST(self):
+            operation, job_id = self._route()
+            try:
+                payload = self._read_json()
+            except json.JSONDecodeError:
+                return self._send_json({"error": "invalid json"}, status=400)
+            if operation in ("run", "runsync"):
+                if "input" not in payload:
+                    return self._send_json({"error": "missing input"}, status=400)
+                job = endpoint.submit(payload["input"])
+                if operation == "runsync":
+                    job.done.wait(RUNSYNC_WAIT_S)
+                    return self._send_json(job.to_status())
+                return self._send_json({"id": job.id, "status": job.status})
+            if operation == "cancel" and job_id:
+                job = endpoint.cancel(job_id)
+                if job is None:
+                    return self._send_json({"error": "job not found"}, status=404)
+                return self._send_json({"id": job.id, "status": job.status})
+            return self._send_json({"error": "not found"}, status=404)
+
+    return Handler
+
+
+class MockRunpodServer:
+    """Run a MockEndpoint behind a threaded HTTP server"""
+
+    def __init__(self, endpoint, host="127.0.0.1", port=0, endpoint_id="mock"):
+        self.endpoint = endpoint
+        self.endpoint_id = endpoint_id
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(endpoint))
+        self.httpd.daemon_threads = True
+        self.comfy_servers = []
+
+    @classmethod
+    def with_mock_workers(cls, workers, speed=1.0, cold_start_s=DEFAULT_COLD_START_S,
+                          idle_timeout_s=DEFAULT_IDLE_TIMEOUT_S, host="127.0.0.1", port=0, concurrency=1,
+                          stream=False, **comfy_kwargs):
+        """One MockComfyServer plus one handler.py copy per worker; stream uses the generator handler"""
+        comfy_servers, handlers = [], []
+        for i in range(workers):
+            output_dir = tempfile.mkdtemp(prefix=f"mock-runpod-{i}-")
+            comfy_server = MockComfyServer(output_dir=output_dir, speed=speed, **comfy_kwargs).start()
+            comfy_servers.append(comfy_server)
+            handlers.append(load_handler(comfy_server.address, output_dir, f"mock_runpod_handler_{i}",
+                                         entry="stream_handler" if stream else "handler"))
+        server = cls(MockEndpoint(handlers, cold_start_s, idle_timeout_s, speed, concurrency), host, port)
+        server.comfy_servers = comfy_servers
+        return server
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v2/{self.endpoint_id}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for comfy_server in self.comfy_servers:
+            comfy_server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stand-in RunPod serverless endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiplier applied to every simulated delay")
+    parser.add_argument("--cold-start", type=float, default=DEFAULT_COLD_START_S, help="Simulated worker boot seconds")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT_S,
+                        help="Idle seconds after which a worker scales down and cold starts again")
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs each worker runs at once")
+    parser.add_argument("--stream", action="store_true", help="Use the streaming handler, as the worker image does")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = MockRunpodServer.with_mock_workers(args.workers, speed=args.speed, cold_start_s=args.cold_start,
+                                                idle_timeout_s=args.idle_timeout, host=args.host, port=args.port,
+                                                concurrency=args.concurrency, stream=args.stream)
+    print(f"mock-runpod - {args.workers} workers, endpoint {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
@@ -0,0 +1,97 @@
+"""S3-compatible object store for returning outputs as presigned URLs.
+
+Configured with the same environment variables as RunPod's rp_upload helper
+(BUCKET_ENDPOINT_URL, BUCKET_ACCESS_KEY_ID, BUCKET_SECRET_ACCESS_KEY) plus
+BUCKET_NAME. Any S3-compatible endpoint works, including a local MinIO or
+`moto_server` for offline testing:
+
+    moto_server -p 5000 &
+    BUCKET_ENDPOINT_URL=http://127.0.0.1:5000 BUCKET_NAME=outputs \
+    BUCKET_ACCESS_KEY_ID=test BUCKET_SECRET_ACCESS_KEY=test python handler.py
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+
+UPLOAD_PART_SIZE = int(os.environ.get("UPLOAD_PART_SIZE_MB", "8")) * 1024 * 1024
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "8"))
+PRESIGNED_URL_EXPIRY_S = int(os.environ.get("PRESIGNED_URL_EXPIRY_S", "3600"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ObjectStore:
+    """Uploads files with parallel multipart transfers and hands back presigned GET URLs"""
+
+    def __init__(self, endpoint_url, bucket, access_key_id=None, secret_access_key=None, region=None,
+                 part_size=UPLOAD_PART_SIZE, concurrency=UPLOAD_CONCURRENCY, url_expiry=PRESIGNED_URL_EXPIRY_S,
+                 create_bucket=False):
+        self.bucket = bucket
+        self.url_expiry = url_expiry
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+            config=Config(signature_version="s3v4", max_pool_connections=concurrency + 4,
+                          retries={"max_attempts": 5, "mode": "standard"}),
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=concurrency,
+            use_threads=True,
+        )
+        # Hashing runs alongside the upload instead of before it
+        self._hash_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="object-store-hash")
+        if create_bucket:
+            self.ensure_bucket()
+
+    @classmethod
+    def from_env(cls):
+        """Build a store from BUCKET_* variables, or None if no endpoint is configured"""
+        endpoint_url = os.environ.get("BUCKET_ENDPOINT_URL")
+        if not endpoint_url:
+            return None
+        return cls(
+            endpoint_url,
+            os.environ.get("BUCKET_NAME", "hunyuan-outputs"),
+            access_key_id=os.environ.get("BUCKET_ACCESS_KEY_ID"),
+            secret_access_key=os.environ.get("BUCKET_SECRET_ACCESS_KEY"),
+            region=os.environ.get("BUCKET_REGION", "us-east-1"),
+            create_bucket=os.environ.get("BUCKET_CREATE", "false").lower() == "true",
+        )
+
+    def ensure_bucket(self):
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except self.client.exceptions.ClientError:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def presigned_url(self, key):
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_expiry)
+
+    def upload_file(self, path, key, content_type):
+        """Multipart-upload a file; returns its url, size and sha256"""
+        digest = self._hash_pool.submit(sha256_file, path)
+        self.client.upload_file(path, self.bucket, key, ExtraArgs={"ContentType": content_type},
+                                Config=self.transfer_config)
+        return {"url": self.presigned_url(key), "size": os.path.getsize(path), "sha256": digest.result(), "key": key}
+
+    def upload_bytes(self, data, key, content_type):
+        """Upload a small in-memory object; returns its url, size and sha256"""
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+        return {"url": self.presigned_url(key), "size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "key": key}
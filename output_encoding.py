@@ -0,0 +1,99 @@
+"""Base64 encoding of job outputs without reading them whole, and per-job peak RSS tracking.
+
+Output files are streamed through a fixed-size buffer (a multiple of 3 bytes,
+so each chunk encodes independently) into a buffer preallocated to the exact
+encoded size. The inline result still costs the payload string plus one
+transient copy of it, and the RunPod SDK serializes the returned output once
+more when sending it, so inline memory grows with the video; only
+output_mode "url", which uploads from disk, keeps the working set flat.
+"""
+import binascii
+import os
+import resource
+
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+
+def base64_encoded_size(size):
+    return 4 * ((size + 2) // 3)
+
+
+def _iter_base64_chunks(path, chunk_size):
+    if chunk_size % 3:
+        raise ValueError("chunk_size must be a multiple of 3")
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            filled = 0
+            # Short reads would break 3-byte alignment mid-file; top the buffer up
+            while filled < chunk_size:
+                count = f.readinto(view[filled:])
+                if not count:
+                    break
+                filled += count
+            if not filled:
+                return
+            yield binascii.b2a_base64(view[:filled], newline=False)
+            if filled < chunk_size:
+                return
+
+
+def encode_base64_file(path, chunk_size=BASE64_CHUNK_SIZE) -> str:
+    """Base64-encode a file to a str without holding the raw file in memory"""
+    payload = bytearray(base64_encoded_size(os.path.getsize(path)))
+    position = 0
+    for chunk in _iter_base64_chunks(path, chunk_size):
+        payload[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    if position != len(payload):
+        # The file changed size while we read it
+        del payload[position:]
+    return payload.decode("ascii")
+
+
+def _read_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class PeakMemory:
+    """Peak resident memory of this process over one job.
+
+    On Linux the kernel's high-water mark (VmHWM) is reset at the start of the
+    job through /proc/self/clear_refs, so the reading covers only this job.
+    Elsewhere it falls back to ru_maxrss, which is the lifetime peak.
+    """
+
+    def __init__(self):
+        self.per_job = False
+        self.start_rss_kb = None
+
+    def start(self, reset=True):
+        """Begin measuring; with reset=False (another job is running) the reading is not per job"""
+        self.per_job = False
+        if reset:
+            try:
+                with open("/proc/self/clear_refs", "w") as f:
+                    f.write("5")
+                self.per_job = True
+            except OSError:
+                pass
+        self.start_rss_kb = _read_status_kb("VmRSS")
+        return self
+
+    def report(self):
+        peak_kb = _read_status_kb("VmHWM") if self.per_job else None
+        if peak_kb is None:
+            # ru_maxrss is in kB on Linux
+            peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report = {"peak_rss_mb": round(peak_kb / 1024, 1), "per_job": self.per_job}
+        if self.start_rss_kb is not None:
+            report["start_rss_mb"] = round(self.start_rss_kb / 1024, 1)
+        return report
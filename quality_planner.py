@@ -0,0 +1,129 @@
+"""Pick generation settings that fit a deadline or a named quality tier.
+
+The knobs are the ones bestSettings tuned: sampler steps, the TeaCache
+threshold, the RIFE frame multiplier and RealESRGAN upscaling on or off. Every
+combination the template supports gets a quality score reflecting those
+notes (15 steps is the sweet spot, TeaCache 0.12 is free, 0.2 and up visibly
+degrades) and a predicted time from the cost model. A tier caps quality; a
+deadline picks the best-scoring combination predicted to finish in time, or
+the fastest one when nothing does.
+"""
+import itertools
+
+from workflow_templates import add_node, bypass_node, find_nodes, patch_workflow
+
+TIERS = {
+    "draft": {"steps": 10, "teacache": 0.2, "rife_multiplier": 1, "upscale": False},
+    "fast": {"steps": 10, "teacache": 0.12, "rife_multiplier": 2, "upscale": True},
+    "standard": {"steps": 15, "teacache": 0.12, "rife_multiplier": 2, "upscale": True},
+    "quality": {"steps": 20, "teacache": 0.0, "rife_multiplier": 2, "upscale": True},
+}
+
+STEP_OPTIONS = (10, 15, 20, 25)
+TEACACHE_OPTIONS = (0.0, 0.12, 0.15, 0.2, 0.25)
+# Steps: 10 pretty good, 15 better, 20 little improvement, 25 very little
+STEP_QUALITY = {10: 2.0, 15: 3.0, 20: 3.3, 25: 3.4}
+# TeaCache: up to 0.12 no loss, 0.15 slight loss, 0.2 and 0.25 a lot of loss
+TEACACHE_PENALTY = {0.0: 0.0, 0.12: 0.0, 0.15: 0.3, 0.2: 1.0, 0.25: 1.2}
+NO_UPSCALE_PENALTY = 0.8
+NO_INTERPOLATION_PENALTY = 0.5
+
+
+def quality_score(settings):
+    score = STEP_QUALITY.get(settings["steps"], 0.0) - TEACACHE_PENALTY.get(settings["teacache"], 2.0)
+    if not settings["upscale"]:
+        score -= NO_UPSCALE_PENALTY
+    if settings["rife_multiplier"] == 1:
+        score -= NO_INTERPOLATION_PENALTY
+    return round(score, 3)
+
+
+def template_capabilities(workflow):
+    """Which knobs a template supports, and its default RIFE multiplier"""
+    rife = find_nodes(workflow, "RIFE VFI")
+    return {
+        "upscale": bool(find_nodes(workflow, "ImageUpscaleWithModel")),
+        "rife_multiplier": int(workflow[rife[0]]["inputs"].get("multiplier", 2)) if rife else 1,
+        "teacache": bool(find_nodes(workflow, "HyVideoSampler")),
+    }
+
+
+def candidates(capabilities):
+    upscale_options = (True, False) if capabilities["upscale"] else (False,)
+    rife_options = (capabilities["rife_multiplier"], 1) if capabilities["rife_multiplier"] > 1 else (1,)
+    teacache_options = TEACACHE_OPTIONS if capabilities["teacache"] else (0.0,)
+    for steps, teacache, multiplier, upscale in itertools.product(STEP_OPTIONS, teacache_options, rife_options,
+                                                                  upscale_options):
+        yield {"steps": steps, "teacache": teacache, "rife_multiplier": multiplier, "upscale": upscale}
+
+
+def _fit_tier(tier, capabilities):
+    settings = dict(TIERS[tier])
+    if not capabilities["upscale"]:
+        settings["upscale"] = False
+    if settings["rife_multiplier"] > 1:
+        settings["rife_multiplier"] = capabilities["rife_multiplier"]
+    if not capabilities["teacache"]:
+        settings["teacache"] = 0.0
+    return settings
+
+
+def choose_settings(model, job, capabilities, tier=None, deadline_seconds=None):
+    """Settings for a job, with predicted time and score.
+
+    job holds base_width, base_height, num_frames, target_width and
+    target_height. Without a deadline the tier's settings are used as is; with
+    one, the best combination scoring no higher than the tier that is
+    predicted to finish in time is used.
+    """
+    ceiling = quality_score(_fit_tier(tier, capabilities)) if tier else None
+    if deadline_seconds is None:
+        options = [_fit_tier(tier or "standard", capabilities)]
+    else:
+        options = [c for c in candidates(capabilities) if ceiling is None or quality_score(c) <= ceiling]
+    scored = []
+    for settings in options:
+        prediction = model.predict(dict(job, **settings))
+        scored.append((settings, prediction, quality_score(settings)))
+    fitting = [s for s in scored if deadline_seconds is None or s[1]["total_s"] <= deadline_seconds]
+    if fitting:
+        # Best quality, then fastest
+        settings, prediction, score = max(fitting, key=lambda s: (s[2], -s[1]["total_s"]))
+    else:
+        settings, prediction, score = min(scored, key=lambda s: s[1]["total_s"])
+    return {
+        "settings": settings,
+        "predicted_seconds": prediction["total_s"],
+        "predicted_stages": prediction["stages"],
+        "quality_score": score,
+        "deadline_met": deadline_seconds is None or prediction["total_s"] <= deadline_seconds,
+    }
+
+
+def apply_settings(workflow, settings, fps):
+    """Rewrite a rendered workflow for TeaCache, RIFE and upscale choices.
+
+    Steps are a template placeholder and are filled at render time. Dropping
+    RIFE lowers the output frame rate by the template's multiplier so the clip
+    keeps its duration.
+    """
+    capabilities = template_capabilities(workflow)
+    if settings["teacache"]:
+        workflow, teacache_id = add_node(workflow, "HyVideoTeaCache", {"rel_l1_thresh": settings["teacache"]})
+        workflow = patch_workflow(workflow, [
+            ((sampler_id, "inputs", "teacache_args"), [teacache_id, 0])
+            for sampler_id in find_nodes(workflow, "HyVideoSampler")
+        ])
+    for rife_id in find_nodes(workflow, "RIFE VFI"):
+        if settings["rife_multiplier"] == 1:
+            workflow = bypass_node(workflow, rife_id, "frames")
+        else:
+            workflow = patch_workflow(workflow, [((rife_id, "inputs", "multiplier"), settings["rife_multiplier"])])
+    frame_rate = fps * settings["rife_multiplier"] / capabilities["rife_multiplier"]
+    workflow = patch_workflow(workflow, [
+        ((combine_id, "inputs", "frame_rate"), frame_rate) for combine_id in find_nodes(workflow, "VHS_VideoCombine")
+    ])
+    if not settings["upscale"]:
+        for upscale_id in find_nodes(workflow, "ImageUpscaleWithModel"):
+            workflow = bypass_node(workflow, upscale_id, "image")
+    return workflow
@@ -0,0 +1,207 @@
+"""Content-addressed cache of generated videos.
+
+Every template pins the sampler seed, so a fully rendered workflow determines
+its output. Entries are keyed by the sha256 of the workflow's canonical JSON
+and hold ComfyUI's raw outputs (video plus preview frame), so a hit goes
+through the normal output processing (inline base64 or upload) without
+touching the GPU.
+
+The cache lives in a directory, typically on a network volume shared by all
+workers (RESULT_CACHE_DIR). Entries are written to a temporary directory and
+renamed into place, so readers never see a partial entry. Least recently used
+entries are evicted once the cache exceeds RESULT_CACHE_MAX_GB. Identical
+requests that arrive while an entry is being generated are coalesced through
+a lock file per key: the first caller generates, the others wait for its entry.
+The holder touches its lock file while it generates, so only a lock left by a
+dead worker goes stale, however long the generation takes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")
+RESULT_CACHE_MAX_BYTES = int(float(os.environ.get("RESULT_CACHE_MAX_GB", "20")) * 1024 ** 3)
+# A lock file not touched for this long belongs to a dead worker; holders touch theirs every third of it
+RESULT_CACHE_LOCK_STALE_S = int(os.environ.get("RESULT_CACHE_LOCK_STALE_S", "1800"))
+LOCK_POLL_INTERVAL_S = 0.5
+
+CACHE_MODES = ("use", "bypass", "refresh")
+
+CacheEntry = namedtuple("CacheEntry", "key video_path preview_path meta")
+
+
+def workflow_key(workflow):
+    """Stable hash of a rendered workflow"""
+    canonical = json.dumps(workflow, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class Lease:
+    """Exclusive right to generate one key, backed by a lock file touched every heartbeat_s while held"""
+
+    def __init__(self, path, heartbeat_s=None):
+        self.path = path
+        self._released = threading.Event()
+        if heartbeat_s:
+            threading.Thread(target=self._heartbeat, args=(heartbeat_s,), daemon=True, name="cache-lease").start()
+
+    def _heartbeat(self, interval):
+        while not self._released.wait(interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def release(self):
+        self._released.set()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ResultCache:
+    def __init__(self, directory, max_bytes=RESULT_CACHE_MAX_BYTES, lock_stale_s=RESULT_CACHE_LOCK_STALE_S):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock_stale_s = lock_stale_s
+        self._evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from RESULT_CACHE_DIR, or None if caching is not configured"""
+        return cls(RESULT_CACHE_DIR) if RESULT_CACHE_DIR else None
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Look up a complete entry and mark it recently used"""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as f:
+                meta = json.load(f)
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            return None
+        video_path = os.path.join(entry_dir, meta["video"])
+        preview_path = os.path.join(entry_dir, meta["preview"])
+        if not (os.path.exists(video_path) and os.path.exists(preview_path)):
+            return None
+        return CacheEntry(key, video_path, preview_path, meta)
+
+    def put(self, key, video_path, preview_path, meta=None):
+        """Store a finished generation's files under key"""
+        entry_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key}.", dir=os.path.dirname(entry_dir))
+        try:
+            video_name = "video" + os.path.splitext(video_path)[1]
+            preview_name = "preview" + os.path.splitext(preview_path)[1]
+            _link_or_copy(video_path, os.path.join(staging, video_name))
+            _link_or_copy(preview_path, os.path.join(staging, preview_name))
+            meta = dict(meta or {}, video=video_name, preview=preview_name, created=time.time())
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            try:
+                os.rename(staging, entry_dir)
+            except OSError:
+                # Another worker stored the same key first; keep theirs
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+        return self.get(key)
+
+    def invalidate(self, key):
+        entry_dir = self._entry_dir(key)
+        # Rename first so concurrent readers never see a half-deleted entry
+        doomed = os.path.join(os.path.dirname(entry_dir), f".{key}.deleted.{uuid.uuid4().hex}")
+        try:
+            os.rename(entry_dir, doomed)
+        except FileNotFoundError:
+            return False
+        shutil.rmtree(doomed, ignore_errors=True)
+        return True
+
+    def _entries(self):
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_dir() and not entry.name.startswith("."):
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    yield entry.stat().st_mtime, size, entry.name
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        with self._evict_lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if self.invalidate(key):
+                    total -= size
+
+    # -- request coalescing -------------------------------------------------
+
+    def _try_lock(self, key):
+        path = os.path.join(self.directory, f".{key}.lock")
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > self.lock_stale_s:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        os.close(fd)
+        return Lease(path, self.lock_stale_s / 3)
+
+    def acquire(self, key, wait_timeout, stop=None):
+        """Return (entry, None) on a hit, or (None, lease) when this caller should generate.
+
+        While another caller holds the key's lock, wait for its entry to appear.
+        If it does not within wait_timeout, give up coalescing and return
+        (None, None) so the caller generates without a lease. Setting the stop
+        event (a threading.Event) also ends the wait with (None, None).
+        """
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            entry = self.get(key)
+            if entry:
+                return entry, None
+            lease = self._try_lock(key)
+            if lease:
+                # The previous holder may have finished between get() and the lock
+                entry = self.get(key)
+                if entry:
+                    lease.release()
+                    return entry, None
+                return None, lease
+            if time.monotonic() >= deadline:
+                return None, None
+            if stop is None:
+                time.sleep(LOCK_POLL_INTERVAL_S)
+            elif stop.wait(LOCK_POLL_INTERVAL_S):
+                return None, None
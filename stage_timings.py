@@ -0,0 +1,198 @@
+"""Per-job stage timings: the handler's own phases plus every ComfyUI node.
+
+Handler phases are timed with JobTimer.phase(). Node timings come from the
+execution events ComfyUI pushes over the websocket: a node starts when its
+`executing` event arrives and ends when the next node (or the end of the
+prompt) does, so each node's time includes the gap until ComfyUI reports the
+next one. Nodes served from ComfyUI's cache are listed with cached=True. When
+the websocket is unavailable and the handler falls back to polling, no node
+timings are recorded.
+
+Each job's timings are returned under the `timings` key and written as one
+JSON line to stdout and, when TIMINGS_LOG_PATH is set, appended to that file.
+Run this module on collected JSON lines to find the slowest stage per
+resolution and frame-count bucket:
+
+    python stage_timings.py timings.jsonl [more.jsonl ...]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+TIMINGS_LOG_PATH = os.environ.get("TIMINGS_LOG_PATH")
+RECORD_EVENT = "job_timings"
+# One per worker: ComfyUI readiness, warm-up and cold-start seconds
+BOOT_EVENT = "worker_boot"
+
+_log_lock = threading.Lock()
+
+
+def bucket_label(width, height, num_frames):
+    return f"{width}x{height}x{num_frames}"
+
+
+class JobTimer:
+    """Collects phase and node timings for one job, relative to its start"""
+
+    def __init__(self, workflow=None):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.nodes = []
+        self.class_types = {}
+        self.bucket = None
+        self.settings = None
+        self._current = None
+        if workflow is not None:
+            self.set_workflow(workflow)
+
+    def _now(self):
+        return time.perf_counter() - self.started
+
+    def set_workflow(self, workflow):
+        self.class_types = {node_id: node.get("class_type") for node_id, node in workflow.items()}
+
+    def set_bucket(self, width, height, num_frames):
+        self.bucket = {"width": width, "height": height, "num_frames": num_frames,
+                       "label": bucket_label(width, height, num_frames)}
+
+    def set_settings(self, settings):
+        """Record the generation settings the cost model is fitted against"""
+        self.settings = dict(settings)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a handler phase; repeated phases accumulate"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    # -- ComfyUI execution events --------------------------------------------
+
+    def _close_node(self, now):
+        if self._current is not None:
+            self._current["end_s"] = round(now, 4)
+            self._current["seconds"] = round(now - self._current["start_s"], 4)
+            self._current = None
+
+    def on_event(self, event):
+        """Feed one decoded websocket event"""
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        now = self._now()
+        if event_type == "executing":
+            self._close_node(now)
+            node_id = data.get("node")
+            if node_id is not None:
+                self._current = {"node_id": node_id, "class_type": self.class_types.get(node_id),
+                                 "start_s": round(now, 4)}
+                self.nodes.append(self._current)
+        elif event_type == "execution_cached":
+            for node_id in data.get("nodes") or []:
+                self.nodes.append({"node_id": node_id, "class_type": self.class_types.get(node_id),
+                                   "cached": True, "seconds": 0.0})
+        elif event_type == "progress" and self._current is not None and data.get("node") == self._current["node_id"]:
+            self._current["steps"] = data.get("max")
+        elif event_type in ("execution_success", "execution_error", "execution_interrupted"):
+            self._close_node(now)
+
+    # -- reporting -----------------------------------------------------------
+
+    def to_dict(self):
+        by_class = defaultdict(float)
+        for node in self.nodes:
+            if "seconds" in node and not node.get("cached"):
+                by_class[node["class_type"] or "unknown"] += node["seconds"]
+        timings = {
+            "total_s": round(self._now(), 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "nodes": self.nodes,
+            "by_class": {name: round(seconds, 4) for name, seconds in by_class.items()},
+        }
+        if self.bucket:
+            timings["bucket"] = self.bucket
+        if self.settings:
+            timings["settings"] = self.settings
+        return timings
+
+
+def write_record(record, event=RECORD_EVENT):
+    """Emit one job's timings as a JSON line on stdout and in TIMINGS_LOG_PATH"""
+    line = json.dumps(dict(record, event=event), separators=(",", ":"))
+    print(line, flush=True)
+    if TIMINGS_LOG_PATH:
+        with _log_lock, open(TIMINGS_LOG_PATH, "a") as f:
+            f.write(line + "\n")
+
+
+def read_records(paths, event=RECORD_EVENT):
+    """Yield timing records from JSON-lines files, skipping unrelated log lines"""
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("event") == event:
+                    yield record
+
+
+def aggregate(records):
+    """Mean seconds per stage for each bucket, with the slowest stage called out"""
+    buckets = defaultdict(lambda: {"jobs": 0, "stages": defaultdict(float)})
+    for record in records:
+        timings = record.get("timings") or {}
+        label = (timings.get("bucket") or {}).get("label", "unknown")
+        bucket = buckets[label]
+        bucket["jobs"] += 1
+        for name, seconds in timings.get("phases", {}).items():
+            bucket["stages"][f"phase:{name}"] += seconds
+        for name, seconds in timings.get("by_class", {}).items():
+            bucket["stages"][f"node:{name}"] += seconds
+    report = {}
+    for label, bucket in sorted(buckets.items()):
+        means = {name: total / bucket["jobs"] for name, total in bucket["stages"].items()}
+        # The wait phase covers every node; leave it out when picking the slowest stage
+        candidates = {name: seconds for name, seconds in means.items() if name != "phase:wait"} or means
+        report[label] = {
+            "jobs": bucket["jobs"],
+            "mean_s": {name: round(seconds, 3) for name, seconds in sorted(means.items(), key=lambda x: -x[1])},
+            "slowest": max(candidates, key=candidates.get) if candidates else None,
+        }
+    return report
+
+
+def boot_summary(records):
+    """Mean and worst cold-start figures over worker_boot records"""
+    summary = {"workers": 0}
+    for name in ("comfy_ready_s", "warmup_s", "cold_start_s"):
+        values = [record[name] for record in records if record.get(name) is not None]
+        summary["workers"] = max(summary["workers"], len(values))
+        if values:
+            summary[name] = {"mean": round(sum(values) / len(values), 3), "max": round(max(values), 3)}
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize job timing JSON lines by resolution/frame bucket")
+    parser.add_argument("paths", nargs="+", help="JSON-lines files (worker logs work too)")
+    args = parser.parse_args()
+    report = aggregate(read_records(args.paths))
+    boots = list(read_records(args.paths, BOOT_EVENT))
+    if boots:
+        report["worker_boot"] = boot_summary(boots)
+    json.dump(report, sys.stdout, indent=2)
+    print()
@@ -4,11 +4,46 @@
 TCMALLOC="$(ldconfig -p | grep -Po "libtcmalloc.so.\d" | head -n 1)"
 export LD_PRELOAD="${TCMALLOC}"
 
-echo "runpod-worker-hunyuan: Starting ComfyUI"
-python3 /comfyui/main.py --disable-auto-launch --disable-metadata &
+# Cold-start metrics are measured from here
+export WORKER_BOOT_TIME="$(date +%s.%N)"
 
-#echo "runpod-worker-hunyuan: Sleeping for 1 second"
-#sleep 1
+if [ "${MULTI_GPU:-false}" = "true" ]; then
+    COMFY_BASE_PORT="${COMFY_BASE_PORT:-8188}"
 
+    # Run ComfyUI on one GPU, restarting it whenever it exits; the handler dispatches
+    # around an instance while it is down
+    run_comfy() {
+        local gpu="$1" port="$2"
+        shift 2
+        while true; do
+            CUDA_VISIBLE_DEVICES="${gpu}" python3 /comfyui/main.py --disable-auto-launch --disable-metadata --port "${port}" "$@"
+            echo "runpod-worker-hunyuan: ComfyUI on GPU ${gpu} exited with $?, restarting"
+            sleep 1
+        done
+    }
+
+    GPUS=($(nvidia-smi --query-gpu=index --format=csv,noheader 2>/dev/null))
+    [ "${#GPUS[@]}" -eq 0 ] && GPUS=(0)
+
+    # One ComfyUI per GPU, each with its own port, and output and temp folders, since
+    # ComfyUI numbers output files and clears its temp folder without regard to other processes
+    HOSTS=()
+    FOLDERS=()
+    for gpu in "${GPUS[@]}"; do
+        port=$((COMFY_BASE_PORT + gpu))
+        echo "runpod-worker-hunyuan: Starting ComfyUI on GPU ${gpu}, port ${port}"
+        run_comfy "${gpu}" "${port}" --output-directory "${COMFY_OUTPUT_PATH}/gpu${gpu}" \
+            --temp-directory "/comfyui/gpu${gpu}" &
+        HOSTS+=("127.0.0.1:${port}")
+        FOLDERS+=("gpu${gpu}")
+    done
+    export COMFY_HOSTS="$(IFS=,; echo "${HOSTS[*]}")"
+    export COMFY_OUTPUT_SUBFOLDERS="$(IFS=,; echo "${FOLDERS[*]}")"
+else
+    echo "runpod-worker-hunyuan: Starting ComfyUI"
+    python3 /comfyui/main.py --disable-auto-launch --disable-metadata &
+fi
+
+# The handler waits for ComfyUI and warms up the models before taking jobs
 echo "runpod-worker-hunyuan: Starting RunPod Handler"
-python3 -u /handler.py
\ No newline at end of file
+python3 -u /handler.py
@@ -8,6 +8,7 @@ import cv2
 from datetime import datetime
 import tempfile
 from dotenv import load_dotenv
+from job_progress import final_output, is_progress
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +29,8 @@ PROMPT_PATH = "prompts/exec.txt"  # Path to prompt file
 COST_PER_SECOND = 0.00053  # Cost per second of generation
 RUNPOD_ENDPOINT = "https://api.runpod.ai/v2/lgm5rz8ogoqvgp/run"  # HunyuanVideo endpoint
 RUNPOD_STATUS_ENDPOINT = "https://api.runpod.ai/v2/lgm5rz8ogoqvgp/status"  # Status endpoint
+RUNPOD_STREAM_ENDPOINT = "https://api.runpod.ai/v2/lgm5rz8ogoqvgp/stream"  # Progress messages
+RUNPOD_CANCEL_ENDPOINT = "https://api.runpod.ai/v2/lgm5rz8ogoqvgp/cancel"  # Cancel endpoint
 INPUT_CONFIG_PATH = "inputs/default.json"  # Path to input configuration
 OUTPUT_CSV_PATH = "generation_stats.csv"  # Path to output CSV file
 VIDEO_OUTPUT_DIR = "videos"  # Directory to save output videos
@@ -111,26 +114,42 @@ def display_video(video_data: bytes):
         # Clean up the temporary file
         os.unlink(temp_path)
 
-def wait_for_completion(job_id: str) -> dict:
-    """Poll the status endpoint until job is complete."""
-    while True:
-        response = requests.get(
-            f"{RUNPOD_STATUS_ENDPOINT}/{job_id}",
-            headers=HEADERS
-        )
-
-        if response.status_code != 200:
-            raise Exception(f"Status check failed with code {response.status_code}: {response.text}")
-
-        status_data = response.json()
-        status = status_data.get("status")
-
-        if status == "COMPLETED":
-            return status_data.get("output", {})
-        elif status in ["FAILED", "CANCELLED"]:
-            raise Exception(f"Job {job_id} {status.lower()}: {status_data.get('error', 'Unknown error')}")
+def show_progress(message: dict):
+    """Print one progress message on a single updating line."""
+    step = f" step {message['step']}/{message['steps']}" if message.get("steps") else ""
+    print(f"\r{message.get('class_type') or message.get('stage')}{step}, "
+          f"{message['elapsed_s']:.0f}s elapsed, about {message['eta_s']:.0f}s left   ", end="", flush=True)
 
-        time.sleep(POLLING_INTERVAL)
+def wait_for_completion(job_id: str) -> dict:
+    """Follow the job's progress stream until it is complete; Ctrl-C cancels the job."""
+    try:
+        while True:
+            response = requests.get(
+                f"{RUNPOD_STREAM_ENDPOINT}/{job_id}",
+                headers=HEADERS
+            )
+
+            if response.status_code != 200:
+                raise Exception(f"Status check failed with code {response.status_code}: {response.text}")
+
+            status_data = response.json()
+            status = status_data.get("status")
+            for item in status_data.get("stream") or []:
+                if is_progress(item.get("output")):
+                    show_progress(item["output"])
+
+            if status == "COMPLETED":
+                print()
+                # The stream only carries new messages; the result is in the job's status
+                response = requests.get(f"{RUNPOD_STATUS_ENDPOINT}/{job_id}", headers=HEADERS)
+                return final_output(response.json().get("output")) or {}
+            elif status in ["FAILED", "CANCELLED"]:
+                raise Exception(f"Job {job_id} {status.lower()}: {status_data.get('error', 'Unknown error')}")
+
+            time.sleep(POLLING_INTERVAL)
+    except KeyboardInterrupt:
+        requests.post(f"{RUNPOD_CANCEL_ENDPOINT}/{job_id}", headers=HEADERS)
+        raise Exception(f"Job {job_id} cancelled")
 
 def sanitize_filename(config: dict) -> str:
     """Create a safe filename from config data."""
@@ -186,6 +205,12 @@ def main():
                 print("\nGeneration successful!")
                 print(f"Generation took {duration:.2f} seconds")
                 print(f"Estimated cost: ${cost:.4f}")
+                if "timings" in result:
+                    timings = result["timings"]
+                    stages = dict(timings.get("by_class", {}), **timings.get("phases", {}))
+                    stages.pop("wait", None)
+                    print("Slowest stages: " + ", ".join(
+                        f"{name} {seconds:.1f}s" for name, seconds in sorted(stages.items(), key=lambda x: -x[1])[:5]))
 
                 # Save statistics
                 stats = {
@@ -203,9 +228,15 @@ def main():
                 save_generation_stats(stats)
 
                 # Save and display video and preview if they're in the response
+                video_data = None
                 if "base64_video" in result:
-                    print("\nDisplaying generated video (press 'q' to close)")
                     video_data = base64.b64decode(result["base64_video"])
+                elif "video_url" in result:
+                    # output_mode "url": the worker uploaded the video instead of inlining it
+                    video_data = requests.get(result["video_url"]).content
+
+                if video_data is not None:
+                    print("\nDisplaying generated video (press 'q' to close)")
 
                     # Save video
                     output_filename = os.path.join(VIDEO_OUTPUT_DIR, sanitize_filename(config))
@@ -217,8 +248,12 @@ def main():
                     display_video(video_data)
 
                     # Save preview if available
+                    preview_data = None
                     if "base64_preview" in result:
                         preview_data = base64.b64decode(result["base64_preview"])
+                    elif "preview_url" in result:
+                        preview_data = requests.get(result["preview_url"]).content
+                    if preview_data is not None:
                         preview_filename = output_filename.replace('.mp4', '_preview.png')
                         preview_path = os.path.join(PREVIEW_OUTPUT_DIR, os.path.basename(preview_filename))
                         with open(preview_path, 'wb') as f:
@@ -0,0 +1,168 @@
+"""Long videos generated as overlapping segments and cross-faded into one file.
+
+A job asking for more frames than one generation can hold (the memory model's
+limit for the lowest-memory variant, capped at MAX_GENERATION_FRAMES) is split
+into segments of equal length that share SEGMENT_OVERLAP_FRAMES generation
+frames with their neighbours. Each segment runs through the whole workflow,
+sharpen, upscale, RIFE and encode included, so ComfyUI's peak memory is that
+of one segment however long the video. The segment files are then decoded
+one at a time through an ffmpeg pipe, the shared frames are blended linearly
+from one segment into the next, and the result is encoded through a second
+pipe; only the overlapping frames are held in memory.
+
+Segments are not continuations of each other. Each is a separate
+text-to-video generation of the same prompt with its own seed, since the
+templates' sampler has no way to start from another clip's last frames, so
+the overlap is a dissolve between unrelated shots rather than a seamless
+cut: the output is a sequence of clips, not one continuous take.
+"""
+import math
+import os
+import shutil
+from collections import deque, namedtuple
+
+import numpy as np
+
+from dimension_planner import validate_frame_count
+from workflow_templates import find_nodes, patch_workflow
+
+SEGMENT_OVERLAP_FRAMES = int(os.environ.get("SEGMENT_OVERLAP_FRAMES", "8"))
+# Matches the templates' VHS_VideoCombine settings
+STITCH_CODEC = "libx265"
+STITCH_CRF = 30
+
+Segment = namedtuple("Segment", "index start num_frames")
+
+
+def plan_segments(total_frames, max_frames, overlap=SEGMENT_OVERLAP_FRAMES):
+    """Segments of at most max_frames each covering total_frames, neighbours sharing overlap frames.
+
+    Every segment but the last has the same valid (4k+1) length; the last is
+    as short as covering total_frames allows, so the stitched clip is at most
+    a few frames longer than asked for.
+    """
+    if max_frames - 1 <= overlap:
+        raise ValueError(f"Segments of {max_frames} frames cannot overlap by {overlap}")
+    total_frames = validate_frame_count(total_frames)
+    if total_frames <= max_frames:
+        return [Segment(0, 0, total_frames)]
+    count = math.ceil((total_frames - overlap) / (max_frames - overlap))
+    length = min(max_frames, validate_frame_count(math.ceil((total_frames + overlap * (count - 1)) / count)))
+    segments = []
+    start = 0
+    while start + length < total_frames:
+        segments.append(Segment(len(segments), start, length))
+        start += length - overlap
+    last = validate_frame_count(max(total_frames - start, overlap + 1))
+    segments.append(Segment(len(segments), start, last))
+    return segments
+
+
+def segment_workflow(workflow, segment):
+    """A segment's workflow: every segment after the first samples with its own seed.
+
+    Nothing of the previous segment is passed in, so each segment is an
+    independent generation of the prompt.
+    """
+    return patch_workflow(workflow, [
+        ((node_id, "inputs", "seed"), workflow[node_id]["inputs"].get("seed", 0) + segment.index)
+        for node_id in find_nodes(workflow, "HyVideoSampler")
+    ])
+
+
+def crossfade(segments, overlap):
+    """Join frame iterables, blending each one's last overlap frames into the next one's first.
+
+    segments yields one iterable of equally shaped uint8 arrays per segment
+    and is consumed lazily, so at most overlap frames are held at once.
+    """
+    tail = []
+    for frames in segments:
+        held = deque()
+        for frame in _blend_into(tail, iter(frames)):
+            # Blended frames can be part of the next overlap too when segments are short
+            held.append(frame)
+            if len(held) > overlap:
+                yield held.popleft()
+        tail = list(held)
+    yield from tail
+
+
+def _blend_into(tail, frames):
+    for i, previous in enumerate(tail):
+        frame = next(frames, None)
+        if frame is None:
+            # The segment is shorter than the overlap; keep what is left of the previous one
+            yield from tail[i:]
+            return
+        weight = (i + 1) / (len(tail) + 1)
+        yield (previous * (1 - weight) + frame * weight).round().astype(np.uint8)
+    yield from frames
+
+
+def output_overlap(overlap, rife_multiplier):
+    """Output frames spanned by overlap generation frames once RIFE has interpolated them"""
+    return (overlap - 1) * rife_multiplier + 1 if overlap else 0
+
+
+def ffmpeg_binary():
+    """ffmpeg from FFMPEG_BINARY, the PATH, or the one bundled with imageio-ffmpeg"""
+    binary = os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def _ffmpeg_env():
+    os.environ.setdefault("IMAGEIO_FFMPEG_EXE", ffmpeg_binary())
+
+
+def video_info(path):
+    """(width, height, fps) of a video file"""
+    import imageio_ffmpeg
+    _ffmpeg_env()
+    reader = imageio_ffmpeg.read_frames(path)
+    meta = next(reader)
+    reader.close()
+    width, height = meta["size"]
+    return width, height, meta["fps"]
+
+
+def read_frames(path):
+    """Decode a video into RGB uint8 arrays, one frame at a time"""
+    import imageio_ffmpeg
+    _ffmpeg_env()
+    reader = imageio_ffmpeg.read_frames(path)
+    width, height = next(reader)["size"]
+    try:
+        for data in reader:
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        reader.close()
+
+
+def write_frames(path, frames, width, height, fps, output_params=None):
+    """Encode RGB uint8 arrays into a video through an ffmpeg pipe; returns the frame count"""
+    import imageio_ffmpeg
+    _ffmpeg_env()
+    if output_params is None:
+        output_params = ["-crf", str(STITCH_CRF), "-tag:v", "hvc1", "-x265-params", "log-level=error"]
+    writer = imageio_ffmpeg.write_frames(path, (width, height), fps=fps, codec=STITCH_CODEC, quality=None,
+                                         macro_block_size=2, output_params=output_params)
+    writer.send(None)
+    count = 0
+    try:
+        for frame in frames:
+            writer.send(np.ascontiguousarray(frame))
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def stitch_videos(paths, output_path, overlap_frames):
+    """Cross-fade segment videos sharing overlap_frames output frames into output_path"""
+    width, height, fps = video_info(paths[0])
+    return write_frames(output_path, crossfade((read_frames(path) for path in paths), overlap_frames),
+                        width, height, fps)
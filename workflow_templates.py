@@ -0,0 +1,194 @@
+"""Workflow templates compiled once per process.
+
+Templates in workflows/ are ComfyUI API-format JSON with `|name|` placeholders,
+either bare (`"width": |base_width|`) or as a whole string value
+(`"prompt": "|prompt|"`). Each template is parsed once into a workflow dict plus
+an index of the JSON paths every placeholder occupies. Rendering a job copies
+only the containers along those paths and shares every other node with the
+compiled template, so rendered workflows must be treated as read-only; use
+patch_workflow() to change further inputs.
+"""
+import glob
+import json
+import os
+import re
+
+PLACEHOLDER = re.compile(r"\|([A-Za-z0-9_]+)\|")
+WHOLE_PLACEHOLDER = re.compile(r"^\|([A-Za-z0-9_]+)\|$")
+# Bare placeholders are not valid JSON; quote them so the template parses
+BARE_PLACEHOLDER = re.compile(r'(?<!")(\|[A-Za-z0-9_]+\|)(?!")')
+
+# Every placeholder the handler fills for each job
+KNOWN_PLACEHOLDERS = frozenset({
+    "prompt",
+    "negative_prompt",
+    "base_width",
+    "base_height",
+    "target_width",
+    "target_height",
+    "num_frames",
+    "num_inference_steps",
+    "fps",
+    "guidance_scale",
+    "flow_shift",
+})
+
+
+class TemplateError(ValueError):
+    """A template is malformed or a render is missing parameters"""
+
+
+def _index_placeholders(node, path, slots, name):
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return
+    for key, value in items:
+        if isinstance(key, str) and PLACEHOLDER.search(key):
+            raise TemplateError(f"{name}: placeholder used as a key at {'/'.join(map(str, path + (key,)))}")
+        if isinstance(value, str):
+            match = WHOLE_PLACEHOLDER.match(value)
+            if match:
+                slots.setdefault(match.group(1), []).append(path + (key,))
+            elif PLACEHOLDER.search(value):
+                raise TemplateError(f"{name}: placeholder must be the whole value at {'/'.join(map(str, path + (key,)))}")
+        else:
+            _index_placeholders(value, path + (key,), slots, name)
+
+
+def patch_workflow(workflow, assignments):
+    """Return a copy of workflow with each (path, value) assignment applied.
+
+    Only the dicts and lists along the assigned paths are copied; everything else
+    is shared with the original.
+    """
+    root = dict(workflow)
+    copied = {(): root}
+    for path, value in assignments:
+        container = root
+        for depth, key in enumerate(path[:-1]):
+            prefix = path[:depth + 1]
+            if prefix not in copied:
+                child = container[key]
+                child = dict(child) if isinstance(child, dict) else list(child)
+                container[key] = copied[prefix] = child
+            container = copied[prefix]
+        container[path[-1]] = value
+    return root
+
+
+def find_nodes(workflow, class_type):
+    """Ids of every node of class_type, in id order"""
+    return sorted((node_id for node_id, node in workflow.items() if node.get("class_type") == class_type),
+                  key=lambda node_id: (len(node_id), node_id))
+
+
+def consumers(workflow, node_id):
+    """(consumer id, input name) for every input linked to node_id"""
+    return [(consumer_id, name)
+            for consumer_id, node in workflow.items()
+            for name, value in node.get("inputs", {}).items()
+            if isinstance(value, list) and value[:1] == [node_id]]
+
+
+def bypass_node(workflow, node_id, input_name):
+    """Return a copy of workflow without node_id, its consumers fed from its input_name link instead.
+
+    Nodes left without consumers are not executed by ComfyUI, so they can stay.
+    """
+    source = workflow[node_id]["inputs"][input_name]
+    patched = patch_workflow(workflow, [
+        ((consumer_id, "inputs", name), source) for consumer_id, name in consumers(workflow, node_id)
+    ])
+    del patched[node_id]
+    return patched
+
+
+def add_node(workflow, class_type, inputs):
+    """Return (copy of workflow with a new node, the new node's id)"""
+    node_id = str(max((int(key) for key in workflow if key.isdigit()), default=0) + 1)
+    patched = dict(workflow)
+    patched[node_id] = {"class_type": class_type, "inputs": inputs}
+    return patched, node_id
+
+
+def use_cached_text_encoder(workflow):
+    """Route text encoding through the HyVideoCachedTextEncode node.
+
+    Each HyVideoTextEncode fed by a DownloadAndLoadHyVideoTextEncoder is replaced
+    by the cached node, which takes the loader's settings as inputs and only
+    loads the encoder on a cache miss. Loaders left without consumers are
+    dropped so ComfyUI does not load the encoder up front.
+    """
+    workflow = dict(workflow)
+    replaced = set()
+    for node_id, node in list(workflow.items()):
+        if node.get("class_type") != "HyVideoTextEncode":
+            continue
+        link = node.get("inputs", {}).get("text_encoders")
+        if not isinstance(link, list) or workflow.get(link[0], {}).get("class_type") != "DownloadAndLoadHyVideoTextEncoder":
+            continue
+        inputs = {name: value for name, value in node["inputs"].items() if name != "text_encoders"}
+        inputs.update(workflow[link[0]]["inputs"])
+        workflow[node_id] = dict(node, class_type="HyVideoCachedTextEncode", inputs=inputs)
+        replaced.add(link[0])
+    for loader_id in replaced:
+        still_used = any(
+            isinstance(value, list) and value[:1] == [loader_id]
+            for node in workflow.values() for value in node.get("inputs", {}).values())
+        if not still_used:
+            del workflow[loader_id]
+    return workflow
+
+
+class WorkflowTemplate:
+    """A parsed template plus the location of each of its placeholders"""
+
+    def __init__(self, name, text, transform=None):
+        self.name = name
+        try:
+            self.workflow = json.loads(BARE_PLACEHOLDER.sub(r'"\1"', text))
+        except json.JSONDecodeError as e:
+            raise TemplateError(f"{name}: invalid JSON: {e}") from e
+        if transform is not None:
+            self.workflow = transform(self.workflow)
+        self.slots = {}
+        _index_placeholders(self.workflow, (), self.slots, name)
+        unknown = set(self.slots) - KNOWN_PLACEHOLDERS
+        if unknown:
+            raise TemplateError(f"{name}: unknown placeholders {sorted(unknown)}")
+
+    @classmethod
+    def from_file(cls, path, transform=None):
+        with open(path, "r") as f:
+            return cls(os.path.splitext(os.path.basename(path))[0], f.read(), transform)
+
+    @property
+    def placeholders(self):
+        return frozenset(self.slots)
+
+    def render(self, params: dict) -> dict:
+        """Fill every placeholder from params and return the workflow"""
+        missing = [name for name in self.slots if params.get(name) is None]
+        if missing:
+            raise TemplateError(f"{self.name}: missing values for {sorted(missing)}")
+        return patch_workflow(self.workflow, [
+            (path, params[name]) for name, paths in self.slots.items() for path in paths
+        ])
+
+
+def load_templates(directory, transform=None):
+    """Compile every *.json template in directory, keyed by file stem.
+
+    transform, if given, rewrites each parsed workflow before its placeholders
+    are indexed.
+    """
+    templates = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        template = WorkflowTemplate.from_file(path, transform)
+        templates[template.name] = template
+    if not templates:
+        raise TemplateError(f"No workflow templates found in {directory}")
+    return templates